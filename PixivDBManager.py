@@ -2,6 +2,7 @@
 # -*- coding: utf-8 -*-
 
 import codecs
+import json
 import os
 import re
 import sqlite3
@@ -75,6 +76,27 @@ class PixivDBManager(object):
             except BaseException:
                 pass
 
+            # fingerprint of the member's works when it was last processed completely
+            for column in ("work_set_hash TEXT", "work_set_count INTEGER", "work_set_max_id INTEGER"):
+                try:
+                    c.execute(f"""ALTER TABLE pixiv_master_member ADD COLUMN {column}""")
+                    self.conn.commit()
+                except BaseException:
+                    pass
+
+            # saved avatar and background of the member, with the http validators
+            c.execute("""CREATE TABLE IF NOT EXISTS pixiv_member_asset (
+                            member_id INTEGER,
+                            asset_type TEXT,
+                            url TEXT,
+                            save_name TEXT,
+                            etag TEXT,
+                            last_modified TEXT,
+                            last_update_date DATE,
+                            PRIMARY KEY (member_id, asset_type)
+                            )""")
+            self.conn.commit()
+
             c.execute("""CREATE TABLE IF NOT EXISTS pixiv_master_image (
                             image_id INTEGER PRIMARY KEY,
                             member_id INTEGER,
@@ -149,6 +171,16 @@ class PixivDBManager(object):
                             last_update_date DATE
                             )""")
 
+            # merged series payload for includeSeriesJSON, and the series updateDate it was fetched at
+            try:
+                c.execute("""ALTER TABLE pixiv_master_series ADD COLUMN series_json TEXT""")
+            except BaseException:
+                pass
+            try:
+                c.execute("""ALTER TABLE pixiv_master_series ADD COLUMN series_update_date TEXT""")
+            except BaseException:
+                pass
+
             c.execute("""CREATE TABLE IF NOT EXISTS pixiv_image_to_series (
                             series_id VARCHAR(255) REFERENCES pixiv_master_series(series_id),
                             series_order INTEGER,
@@ -222,6 +254,7 @@ class PixivDBManager(object):
             self.conn.commit()
 
             c.execute("""DROP TABLE IF EXISTS pixiv_master_member""")
+            c.execute("""DROP TABLE IF EXISTS pixiv_member_asset""")
             self.conn.commit()
 
             c.execute("""DROP TABLE IF EXISTS pixiv_master_image""")
@@ -270,7 +303,8 @@ class PixivDBManager(object):
 
             for item in listTxt:
                 c.execute(
-                    """INSERT OR IGNORE INTO pixiv_master_member VALUES(?, ?, ?, datetime('now'), '1-1-1', -1, 0, '')""",
+                    """INSERT OR IGNORE INTO pixiv_master_member (member_id, name, save_folder, created_date, last_update_date, last_image, is_deleted, member_token)
+                         VALUES(?, ?, ?, datetime('now'), '1-1-1', -1, 0, '')""",
                     (item.memberId, str(item.memberId), r"N\A"),
                 )
                 c.execute(
@@ -381,7 +415,8 @@ class PixivDBManager(object):
         print("Exporting detailed list...", end=" ")
         try:
             c = self.conn.cursor()
-            c.execute("""SELECT * FROM pixiv_master_member
+            c.execute("""SELECT member_id, name, save_folder, created_date, last_update_date, last_image, is_deleted, member_token
+                            FROM pixiv_master_member
                             WHERE is_deleted = 0
                             ORDER BY member_id""")
             filename = filename + ".csv"
@@ -548,7 +583,8 @@ class PixivDBManager(object):
                         break
 
             c.execute(
-                """INSERT OR IGNORE INTO pixiv_master_member VALUES(?, ?, ?, datetime('now'), '1-1-1', -1, 0, ?)""",
+                """INSERT OR IGNORE INTO pixiv_master_member (member_id, name, save_folder, created_date, last_update_date, last_image, is_deleted, member_token)
+                         VALUES(?, ?, ?, datetime('now'), '1-1-1', -1, 0, ?)""",
                 (member_id, str(member_id), r"N\A", member_token),
             )
             self.conn.commit()
@@ -645,6 +681,29 @@ class PixivDBManager(object):
         finally:
             c.close()
 
+    def selectMembersByMemberIds(self, member_ids):
+        '''Same as selectMemberByMemberId2() for a list of member ids, using one query per 500 ids.'''
+        try:
+            c = self.conn.cursor()
+            member_ids = [int(member_id) for member_id in member_ids]
+            save_folders = dict()
+            for start in range(0, len(member_ids), 500):
+                chunk = member_ids[start:start + 500]
+                c.execute(
+                    f"""SELECT member_id, save_folder FROM pixiv_master_member
+                    WHERE member_id IN ({",".join("?" * len(chunk))})""",
+                    chunk,
+                )
+                save_folders.update(c.fetchall())
+            return [PixivListItem(member_id, save_folders[member_id] if member_id in save_folders else "")
+                    for member_id in member_ids]
+        except BaseException:
+            print("Error at selectMembersByMemberIds():", str(sys.exc_info()))
+            print("failed")
+            raise
+        finally:
+            c.close()
+
     def printMembersByLastDownloadDate(self, difference):
         rows = self.selectMembersByLastDownloadDate(difference)
 
@@ -724,6 +783,73 @@ class PixivDBManager(object):
         finally:
             c.close()
 
+    def selectMemberWorkSet(self, member_id):
+        try:
+            c = self.conn.cursor()
+            c.execute(
+                """SELECT work_set_hash, work_set_count, work_set_max_id FROM pixiv_master_member
+                         WHERE member_id = ? AND work_set_hash IS NOT NULL""",
+                (member_id,),
+            )
+            return c.fetchone()
+        except BaseException:
+            print("Error at selectMemberWorkSet():", str(sys.exc_info()))
+            print("failed")
+            raise
+        finally:
+            c.close()
+
+    def updateMemberWorkSet(self, member_id, work_set_hash, work_set_count, work_set_max_id):
+        try:
+            c = self.conn.cursor()
+            c.execute(
+                """UPDATE pixiv_master_member
+                         SET work_set_hash = ?, work_set_count = ?, work_set_max_id = ?
+                         WHERE member_id = ?""",
+                (work_set_hash, work_set_count, work_set_max_id, member_id),
+            )
+            self.conn.commit()
+        except BaseException:
+            print("Error at updateMemberWorkSet():", str(sys.exc_info()))
+            print("failed")
+            raise
+        finally:
+            c.close()
+
+    def selectMemberAssets(self, member_id):
+        '''Return dict of asset_type => (url, save_name, etag, last_modified).'''
+        try:
+            c = self.conn.cursor()
+            c.execute(
+                """SELECT asset_type, url, save_name, etag, last_modified FROM pixiv_member_asset
+                         WHERE member_id = ?""",
+                (member_id,),
+            )
+            return {row[0]: tuple(row[1:]) for row in c.fetchall()}
+        except BaseException:
+            print("Error at selectMemberAssets():", str(sys.exc_info()))
+            print("failed")
+            raise
+        finally:
+            c.close()
+
+    def updateMemberAsset(self, member_id, asset_type, url, save_name, etag=None, last_modified=None):
+        try:
+            c = self.conn.cursor()
+            c.execute(
+                """INSERT OR REPLACE INTO pixiv_member_asset
+                         (member_id, asset_type, url, save_name, etag, last_modified, last_update_date)
+                         VALUES (?, ?, ?, ?, ?, ?, datetime('now'))""",
+                (member_id, asset_type, url, save_name, etag, last_modified),
+            )
+            self.conn.commit()
+        except BaseException:
+            print("Error at updateMemberAsset():", str(sys.exc_info()))
+            print("failed")
+            raise
+        finally:
+            c.close()
+
     def deleteMemberByMemberId(self, memberId):
         try:
             c = self.conn.cursor()
@@ -915,7 +1041,9 @@ class PixivDBManager(object):
         try:
             c = self.conn.cursor()
             c.execute(
-                """INSERT OR IGNORE INTO pixiv_master_series VALUES (?, ?, ?, ?, datetime('now'), datetime('now'))""",
+                """INSERT OR IGNORE INTO pixiv_master_series(series_id, series_title, series_type, series_description,
+                                                                 created_date, last_update_date)
+                        VALUES (?, ?, ?, ?, datetime('now'), datetime('now'))""",
                 (
                     series_id,
                     series_title,
@@ -931,6 +1059,46 @@ class PixivDBManager(object):
         finally:
             c.close()
 
+    def selectSeriesJson(self, series_id, series_update_date):
+        '''Return the saved series payload if it was fetched at the given series update date.'''
+        try:
+            c = self.conn.cursor()
+            c.execute(
+                """SELECT series_json FROM pixiv_master_series WHERE series_id = ? AND series_update_date = ?""",
+                (str(series_id), series_update_date),
+            )
+            result = c.fetchone()
+            if result is None or result[0] is None:
+                return None
+            return json.loads(result[0])
+        except BaseException:
+            print("Error at selectSeriesJson():", str(sys.exc_info()))
+            print("failed")
+            raise
+        finally:
+            c.close()
+
+    def updateSeriesJson(self, series_id, series_title, series_json, series_update_date):
+        try:
+            c = self.conn.cursor()
+            c.execute(
+                """INSERT INTO pixiv_master_series(series_id, series_title, series_type, series_json, series_update_date,
+                                                   created_date, last_update_date)
+                        VALUES (?, ?, 'manga', ?, ?, datetime('now'), datetime('now'))
+                        ON CONFLICT(series_id) DO UPDATE
+                        SET series_json = excluded.series_json,
+                            series_update_date = excluded.series_update_date,
+                            last_update_date = datetime('now')""",
+                (str(series_id), series_title, json.dumps(series_json, ensure_ascii=False), series_update_date),
+            )
+            self.conn.commit()
+        except BaseException:
+            print("Error at updateSeriesJson():", str(sys.exc_info()))
+            print("failed")
+            raise
+        finally:
+            c.close()
+
     def insertImageToSeries(self, image_id, series_id, series_order):
         try:
             c = self.conn.cursor()
@@ -1780,6 +1948,20 @@ class PixivDBManager(object):
         finally:
             c.close()
 
+    def selectSketchPostIdsByMemberId(self, member_id):
+        try:
+            c = self.conn.cursor()
+            c.execute(
+                """SELECT post_id FROM sketch_master_post WHERE member_id = ?""", (member_id,)
+            )
+            return set(row[0] for row in c.fetchall())
+        except BaseException:
+            print("Error at selectSketchPostIdsByMemberId():", str(sys.exc_info()))
+            print("failed")
+            raise
+        finally:
+            c.close()
+
     def deleteSketchPost(self, post_id, by):
         post_id = int(post_id)
         if by not in ["member_id", "post_id"]:
@@ -1904,14 +2086,17 @@ class PixivDBManager(object):
                         )""")
 
     def insertNovelPost(self, post, filename):
+        self.insertNovelPosts([(post, filename)])
+
+    def insertNovelPosts(self, posts):
+        '''Same as insertNovelPost() for a list of (post, filename), committed in one transaction.'''
         try:
             c = self.conn.cursor()
-            post_id = int(post.imageId)
-            c.execute(
+            c.executemany(
                 """INSERT OR IGNORE INTO novel_detail (user_id, post_id) VALUES(?, ?)""",
-                (post.artist.artistId, post_id),
+                [(post.artist.artistId, int(post.imageId)) for (post, _) in posts],
             )
-            c.execute(
+            c.executemany(
                 """UPDATE novel_detail
                             SET save_name = ?,
                                 created_date = ?,
@@ -1923,22 +2108,25 @@ class PixivDBManager(object):
                                 series_id = ?,
                                 series_order = ?
                             WHERE post_id = ?""",
-                (
-                    filename,
-                    post.worksDateDateTime,
-                    post.uploadDate,
-                    post.isOriginal,
-                    post.isBungei,
-                    post.language,
-                    post.xRestrict,
-                    post.seriesId,
-                    post.seriesOrder,
-                    post_id,
-                ),
+                [
+                    (
+                        filename,
+                        post.worksDateDateTime,
+                        post.uploadDate,
+                        post.isOriginal,
+                        post.isBungei,
+                        post.language,
+                        post.xRestrict,
+                        post.seriesId,
+                        post.seriesOrder,
+                        int(post.imageId),
+                    )
+                    for (post, filename) in posts
+                ],
             )
             self.conn.commit()
         except BaseException:
-            print("Error at insertSketchPost():", str(sys.exc_info()))
+            print("Error at insertNovelPosts():", str(sys.exc_info()))
             print("failed")
             raise
         finally:
@@ -1957,6 +2145,28 @@ class PixivDBManager(object):
         finally:
             c.close()
 
+    def selectNovelSaveNamesByPostIds(self, post_ids):
+        '''Return dict of post id => save_name for the downloaded novels, using one query per 500 ids.'''
+        try:
+            c = self.conn.cursor()
+            post_ids = [int(post_id) for post_id in post_ids]
+            save_names = dict()
+            for start in range(0, len(post_ids), 500):
+                chunk = post_ids[start:start + 500]
+                c.execute(
+                    f"""SELECT post_id, save_name FROM novel_detail
+                    WHERE post_id IN ({",".join("?" * len(chunk))})""",
+                    chunk,
+                )
+                save_names.update(c.fetchall())
+            return save_names
+        except BaseException:
+            print("Error at selectNovelSaveNamesByPostIds():", str(sys.exc_info()))
+            print("failed")
+            raise
+        finally:
+            c.close()
+
     ##########################################
     # VIII. Utilities                        #
     ##########################################
@@ -21,6 +21,7 @@ import common.PixivHelper as PixivHelper
 import handler.PixivArtistHandler as PixivArtistHandler
 import handler.PixivBatchHandler as PixivBatchHandler
 import handler.PixivBookmarkHandler as PixivBookmarkHandler
+import handler.PixivDownloadHandler as PixivDownloadHandler
 import handler.PixivFanboxHandler as PixivFanboxHandler
 import handler.PixivImageHandler as PixivImageHandler
 import handler.PixivListHandler as PixivListHandler
@@ -1426,6 +1427,8 @@ def main_loop(ewd, op_is_valid, selection, np_is_valid_local, args, options):
                 __errorList = list()
                 ERROR_CODE = 1
 
+            if __config__.checkNewVersion:
+                PixivHelper.report_new_version(__config__)
             if op_is_valid:  # Yavos (next 3 lines): if commandline then use it
                 selection = op
             else:
@@ -1555,6 +1558,9 @@ def doLogin(password, username):
         if len(__config__.cookie) > 0:
             result = __br__.loginUsingCookie()
 
+        if result:
+            __br__.startOAuthRefresh()
+
         # if not result:
         #     result = __br__.login(username, password)
 
@@ -1658,7 +1664,7 @@ def main():
         __br__ = PixivBrowserFactory.getBrowser(config=__config__)
 
     if __config__.checkNewVersion:
-        PixivHelper.check_version(__br__, config=__config__)
+        PixivHelper.check_version_async(__config__)
 
     selection = None
 
@@ -1766,6 +1772,9 @@ def main():
 
         if result:
             np_is_valid, op_is_valid, selection = main_loop(ewd, op_is_valid, selection, np_is_valid, args, options)
+            PixivDownloadHandler.drain_image_verification()
+            PixivDownloadHandler.close_download_list()
+            PixivDownloadHandler.drain_post_processing()
 
             if start_iv:  # Yavos: adding start_irfan_view-handling
                 PixivHelper.start_irfanview(dfilename, __config__.IrfanViewPath, start_irfan_slide, start_irfan_view)
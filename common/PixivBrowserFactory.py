@@ -4,9 +4,11 @@
 import http.client
 import http.cookiejar
 import json
+import os
 import re
 import socket
 import sys
+import threading
 import time
 import traceback
 from urllib.error import HTTPError
@@ -36,12 +38,15 @@ from model.PixivTags import PixivTags
 defaultCookieJar = None
 defaultConfig = None
 _browser = None
+_worker = threading.local()
+OAUTH_TOKEN_CACHE_FILE = "pixivutil_oauth.json"
 
 
 # pylint: disable=E1101
 class PixivBrowser(mechanize.Browser):
     _config = None
     _cache = dict()
+    _cache_lock = threading.Lock()  # the cache is shared with the worker browsers
     _max_cache = 10000  # keep n-item in memory
     _myId = 0
     _isPremium = False
@@ -58,6 +63,9 @@ class PixivBrowser(mechanize.Browser):
 
     @property
     def _oauth_manager(self):
+        if _browser is not None and self is not _browser:
+            # worker browsers share the access token of the main browser
+            return _browser._oauth_manager
         if self.__oauth_manager is None:
             proxy = None
             assert (self._config is not None)
@@ -72,33 +80,68 @@ class PixivBrowser(mechanize.Browser):
                                               self._password,
                                               proxies=proxy,
                                               refresh_token=self._config.refresh_token,
-                                              validate_ssl=self._config.enableSSLVerification)
+                                              validate_ssl=self._config.enableSSLVerification,
+                                              token_cache_file=self._get_oauth_token_cache_file(),
+                                              refresh_token_callback=self._save_oauth_refresh_token)
         return self.__oauth_manager
 
+    def _get_oauth_token_cache_file(self):
+        config_dir = os.path.dirname(os.path.abspath(self._config.configFileLocation))
+        return os.path.join(config_dir, OAUTH_TOKEN_CACHE_FILE)
+
+    def startOAuthRefresh(self):
+        '''Get the OAuth access token in background before it is needed by member info lookups.'''
+        if not self._config.refresh_token:
+            return
+        if not (self._username or self._config.username) or not (self._password or self._config.password):
+            return
+        self._oauth_manager.start_refresh_thread()
+
+    def _sync_oauth_refresh_token(self):
+        self._save_oauth_refresh_token(self._oauth_manager._refresh_token, quiet=False)
+
+    def _save_oauth_refresh_token(self, refresh_token, quiet=True):
+        '''Also called from the background refresh when the server gives a new refresh token,
+        only logged then to not print in the middle of the menu.'''
+        if refresh_token is not None and self._config.refresh_token != refresh_token:
+            if quiet:
+                PixivHelper.get_logger().info('OAuth Refresh Token is updated, updating config.ini')
+            else:
+                PixivHelper.print_and_log('info', 'OAuth Refresh Token is updated, updating config.ini')
+            self._config.refresh_token = refresh_token
+            self._config.writeConfig(path=self._config.configFileLocation)
+
     def _put_to_cache(self, key, item, expiration=3600):
         expiry = time.time() + expiration
-        self._cache[key] = (item, expiry)
-
-        # check oldest item
-        oldest_expiry = expiry
-        oldest_item = key
-        if len(self._cache) > self._max_cache:
-            for key2 in self._cache:
-                curr_expiry = self._cache[key2][1]
-                if curr_expiry < oldest_expiry:
-                    oldest_item = key2
-                    oldest_expiry = curr_expiry
-            del self._cache[oldest_item]
+        with self._cache_lock:
+            self._cache[key] = (item, expiry)
+
+            # check oldest item
+            oldest_expiry = expiry
+            oldest_item = key
+            if len(self._cache) > self._max_cache:
+                for key2 in self._cache:
+                    curr_expiry = self._cache[key2][1]
+                    if curr_expiry < oldest_expiry:
+                        oldest_item = key2
+                        oldest_expiry = curr_expiry
+                del self._cache[oldest_item]
+
+    @classmethod
+    def trim_cache(cls):
+        with cls._cache_lock:
+            cls._cache.clear()
 
     def _get_from_cache(self, key, sliding_window=3600):
-        if key in self._cache.keys():
-            (item, expiry) = self._cache.pop(key)
-            if expiry - time.time() > 0:
-                self._cache[key] = (item, expiry + sliding_window)
-                return item
+        with self._cache_lock:
+            if key in self._cache.keys():
+                (item, expiry) = self._cache.pop(key)
+                if expiry - time.time() > 0:
+                    self._cache[key] = (item, expiry + sliding_window)
+                    return item
 
-            # expired data
-            del item
+                # expired data
+                del item
 
         return None
 
@@ -137,19 +180,24 @@ class PixivBrowser(mechanize.Browser):
                 # https://stackoverflow.com/a/14512227
                 socks.setdefaultproxy(socksType, parseResult.hostname, parseResult.port,
                                       True, parseResult.username, parseResult.password)
-                socket.socket = socks.socksocket
+                # the patch is process wide, install it once so the worker browsers keep the DnsCache
+                if socket.socket is not socks.socksocket:
+                    socket.socket = socks.socksocket
 
-                # https://stackoverflow.com/a/13214222 and
-                # https://github.com/Anorov/PySocks/issues/22
-                def getaddrinfo(*args):
-                    return [(socket.AF_INET, socket.SOCK_STREAM, 6, '', (args[0], args[1]))]
-                self._orig_getaddrinfo = socket.getaddrinfo
-                socket.getaddrinfo = getaddrinfo
+                    # https://stackoverflow.com/a/13214222 and
+                    # https://github.com/Anorov/PySocks/issues/22
+                    def getaddrinfo(*args):
+                        return [(socket.AF_INET, socket.SOCK_STREAM, 6, '', (args[0], args[1]))]
+                    self._orig_getaddrinfo = socket.getaddrinfo
+                    socket.getaddrinfo = getaddrinfo
 
             else:
                 self.set_proxies(config.proxy)
                 PixivHelper.get_logger().info("Using Proxy: %s", config.proxyAddress)
 
+        # wrap the SOCKS getaddrinfo if installed above
+        PixivHelper.install_dns_cache(config.dnsCacheTTL)
+
         # self.set_handle_equiv(True)
         # self.set_handle_gzip(True)
         self.set_handle_redirect(True)
@@ -752,18 +800,13 @@ class PixivBrowser(mechanize.Browser):
                 info = self._get_from_cache(url)
                 if info is None:
                     PixivHelper.get_logger().debug("Getting member information: %s", member_id)
-                    login_response = self._oauth_manager.login()
-                    if login_response.status_code == 200:
-                        info = json.loads(login_response.text)
-                        if self._config.refresh_token != info["response"]["refresh_token"]:
-                            PixivHelper.print_and_log('info', 'OAuth Refresh Token is updated, updating config.ini')
-                            self._config.refresh_token = info["response"]["refresh_token"]
-                            self._config.writeConfig(path=self._config.configFileLocation)
+                    self._oauth_manager.ensure_login()
+                    self._sync_oauth_refresh_token()
 
                     response = self._oauth_manager.get_user_info(member_id)
                     info = json.loads(response.text)
                     self._put_to_cache(url, info)
-                    PixivHelper.get_logger().debug("reply: %s", response.text)
+                    PixivHelper.log_payload(f"OAuth user info {member_id}", response.text)
 
             artist.ParseInfo(info, False, bookmark=bookmark)
 
@@ -843,7 +886,7 @@ class PixivBrowser(mechanize.Browser):
                         response = ex.read()
                 self._put_to_cache(url, response)
 
-            PixivHelper.get_logger().debug(response)
+            PixivHelper.log_payload(url, response)
             artist = PixivArtist(member_id, response, False, offset, limit)
 
             # fix issue with member with 0 images, skip everything.
@@ -854,6 +897,7 @@ class PixivBrowser(mechanize.Browser):
             self.getMemberInfoWhitecube(member_id, artist, bookmark)
 
             if artist.haveImages and need_to_slice:
+                artist.allImageList = artist.imageList
                 artist.imageList = artist.imageList[offset:offset + limit]
 
         return (artist, response)
@@ -1044,6 +1088,13 @@ class PixivBrowser(mechanize.Browser):
     def fanboxGetPostsFromArtist(self, artist: FanboxArtist = None, next_url="") -> List[FanboxPost]:
         ''' get all posts from the supported user
         from https://fanbox.pixiv.net/api/post.listCreator?userId=1305019&limit=10 '''
+        response = self.fanboxGetPostsPageFromArtist(artist, next_url)
+        posts = artist.parsePosts(response)
+        return posts
+
+    def fanboxGetPostsPageFromArtist(self, artist: FanboxArtist = None, next_url=""):
+        ''' get the raw posts page, use artist.parsePosts() to get the posts.
+        Only the first page (empty next_url) updates the artist. '''
         self.fanbox_is_logged_in()
 
         # Issue #641
@@ -1058,7 +1109,7 @@ class PixivBrowser(mechanize.Browser):
 
             res = self.open_with_retry(req)
             response = res.read()
-            PixivHelper.get_logger().debug(response.decode('utf8'))
+            PixivHelper.log_payload(url, response)
             res.close()
 
             artist.setPages(response)
@@ -1085,13 +1136,13 @@ class PixivBrowser(mechanize.Browser):
 
         res = self.open_with_retry(req)
         response = res.read()
-        PixivHelper.get_logger().debug(response.decode('utf8'))
+        PixivHelper.log_payload(url, response)
         res.close()
-        posts = artist.parsePosts(response)
-        return posts
+        return response
 
-    def fanboxUpdatePost(self, post: FanboxPost):
-        js = self.fanboxGetPostJsonById(post.imageId, post.parent)
+    def fanboxUpdatePost(self, post: FanboxPost, js=None):
+        if js is None:
+            js = self.fanboxGetPostJsonById(post.imageId, post.parent)
         post.parsePost(js["body"])
         post.parse_post_details(js["body"])
 
@@ -1126,7 +1177,7 @@ class PixivBrowser(mechanize.Browser):
                 raise PixivException("Fanbox post not found!", PixivException.OTHER_ERROR)
             raise
         p_response = p_res.text
-        PixivHelper.get_logger().debug(p_response)
+        PixivHelper.log_payload(p_url, p_response)
         p_res.close()
         js = demjson3.decode(p_response)
         return js
@@ -1147,6 +1198,12 @@ class PixivBrowser(mechanize.Browser):
         return post
 
     def sketch_get_posts_by_artist_id(self, artist_id, max_page=0):
+        artist = self.sketch_get_artist_by_artist_id(artist_id)
+        for _ in self.sketch_get_posts_by_artist(artist_id, artist, max_page):
+            pass
+        return artist
+
+    def sketch_get_artist_by_artist_id(self, artist_id):
         # get artist info
         # https://sketch.pixiv.net/api/users/@camori.json
         url = f"https://sketch.pixiv.net/api/users/@{artist_id}.json"
@@ -1166,9 +1223,12 @@ class PixivBrowser(mechanize.Browser):
         _tzInfo = None
         if self._config.useLocalTimezone:
             _tzInfo = PixivHelper.LocalUTCOffsetTimezone()
-        artist = SketchArtist(artist_id, response, _tzInfo, self._config.dateFormat)
+        return SketchArtist(artist_id, response, _tzInfo, self._config.dateFormat)
 
-        # get artists posts
+    def sketch_get_posts_by_artist(self, artist_id, artist: SketchArtist, max_page=0, stop_post_ids=None):
+        ''' yield the posts of the artist as each page is fetched, newest first.
+        Stop getting the next page when reaching a post in stop_post_ids. '''
+        referer = f"https://sketch.pixiv.net/@{artist_id}"
         current_page = 1
         while True:
             # https://sketch.pixiv.net/api/walls/@camori/posts/public.json
@@ -1182,7 +1242,13 @@ class PixivBrowser(mechanize.Browser):
             self.handleDebugMediumPage(response_post, artist_id)
 
             PixivHelper.print_and_log("debug", f"{response_post}")
+            post_count = len(artist.posts)
             artist.parse_posts(response_post)
+            for post in artist.posts[post_count:]:
+                if stop_post_ids is not None and int(post.imageId) in stop_post_ids:
+                    PixivHelper.print_and_log("info", f"Reached post {post.imageId} already in DB, skipping older posts.")
+                    return
+                yield post
 
             current_page = current_page + 1
             if max_page != 0 and current_page > max_page:
@@ -1190,8 +1256,6 @@ class PixivBrowser(mechanize.Browser):
             if artist.next_page is None:
                 break
 
-        return artist
-
     def getPixivSketchPage(self, url, referer, x_requested_with) -> str:
         p_req = mechanize.Request(url)
         p_req.add_header('Accept', 'application/vnd.sketch-v4+json')
@@ -1257,6 +1321,11 @@ class PixivBrowser(mechanize.Browser):
         return novel_series
 
     def getNovelSeriesContent(self, novel_series, limit=MAX_LIMIT, current_page=1, order_by='asc'):
+        response = self.getNovelSeriesContentPage(novel_series.series_id, limit, current_page, order_by)
+        novel_series.parse_series_content(response, current_page)
+        return novel_series
+
+    def getNovelSeriesContentPage(self, novel_series_id, limit=MAX_LIMIT, current_page=1, order_by='asc') -> str:
         locale = ""
         if self._locale is not None and len(self._locale) > 0:
             locale = f"&lang={self._locale}"
@@ -1267,11 +1336,13 @@ class PixivBrowser(mechanize.Browser):
         params.append(f"last_order={last_order}")
         params.append(f"order_by={order_by}")
         params_str = "&".join(params)
-        novel_series_id = novel_series.series_id
         url = f"https://www.pixiv.net/ajax/novel/series_content/{novel_series_id}?{params_str}{locale}"
-        response = self.getPixivPage(url, enable_cache=True)
-        novel_series.parse_series_content(response, current_page)
-        return novel_series
+        return self.getPixivPage(url, enable_cache=True)
+
+    def getFollowedNewIllustsMaxPage(self) -> int:
+        # Non premium is only limited to 2000 images (100 page old layout, 35 new layout)
+        # Premium user might be limited to 10000 images (5000 page old layout, 167 new layout)
+        return 167 if self._isPremium else 35
 
     def getFollowedNewIllusts(self, mode="all", current_page=1) -> PixivNewIllustBookmark:
         # Issue #1028
@@ -1286,11 +1357,7 @@ class PixivBrowser(mechanize.Browser):
         PixivHelper.get_logger().info(f"Source URL: {url}")
         pb = PixivNewIllustBookmark(response)
 
-        # Non premium is only limited to 2000 images (100 page old layout, 35 new layout)
-        # Premium user might be limited to 10000 images (5000 page old layout, 167 new layout)
-        pb.isLastPage = False
-        if (self._isPremium and int(current_page) >= 167) or (not self._isPremium and int(current_page) >= 35):
-            pb.isLastPage = True
+        pb.isLastPage = int(current_page) >= self.getFollowedNewIllustsMaxPage()
 
         return pb
 
@@ -1323,6 +1390,9 @@ class PixivBrowser(mechanize.Browser):
         return result
 
 
+PixivHelper.register_memory_trim(PixivBrowser.trim_cache)
+
+
 def getBrowser(config=None, cookieJar=None):
     global defaultCookieJar
     global defaultConfig
@@ -1344,6 +1414,26 @@ def getBrowser(config=None, cookieJar=None):
     return _browser
 
 
+def getWorkerBrowser():
+    '''Return the browser for the current thread.
+    mechanize.Browser is not thread-safe, so worker threads get their own instance
+    sharing the config, cookies and login state of the main browser.'''
+    main_browser = getBrowser()
+    if threading.current_thread() is threading.main_thread():
+        return main_browser
+
+    br = getattr(_worker, "browser", None)
+    if br is None:
+        br = PixivBrowser(defaultConfig, defaultCookieJar)
+        _worker.browser = br
+    br._locale = main_browser._locale
+    br._myId = main_browser._myId
+    br._isPremium = main_browser._isPremium
+    br._xRestrict = main_browser._xRestrict
+    br._is_logged_in_to_FANBOX = main_browser._is_logged_in_to_FANBOX
+    return br
+
+
 def getExistingBrowser():
     global _browser
     if _browser is None:
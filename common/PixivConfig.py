@@ -53,6 +53,7 @@ class PixivConfig():
     '''Configuration class'''
     __logger = PixivHelper.get_logger()
     configFileLocation = "./config.ini"
+    __loaded_stat = None
 
     __items = [
         ConfigItem("Network", "useProxy", False),
@@ -64,9 +65,15 @@ class PixivConfig():
         ConfigItem("Network", "retryWait", 5),
         ConfigItem("Network", "downloadDelay", 5),
         ConfigItem("Network", "checkNewVersion", True),
+        ConfigItem("Network", "checkNewVersionInterval", 24,
+                   restriction=lambda x: int(x) >= 0),
         ConfigItem("Network", "notifyBetaVersion", True),
         ConfigItem("Network", "openNewVersion", True),
         ConfigItem("Network", "enableSSLVerification", True),
+        ConfigItem("Network", "maxConcurrentRequests", 4,
+                   restriction=lambda x: int(x) >= 1),
+        ConfigItem("Network", "dnsCacheTTL", 300,
+                   restriction=lambda x: int(x) >= 0),
 
         ConfigItem("Debug", "logLevel", "DEBUG",
                    followup=str.upper,
@@ -77,6 +84,8 @@ class PixivConfig():
         ConfigItem("Debug", "dumpTagSearchPage", False),
         ConfigItem("Debug", "debugHttp", False),
         ConfigItem("Debug", "disableLog", False),
+        ConfigItem("Debug", "logPayloadLimit", 4096, restriction=lambda x: int(x) >= 0),
+        ConfigItem("Debug", "payloadDumpDirectory", "", followup=os.path.expanduser),
         ConfigItem("Debug", "disableScreenClear", False),
 
         ConfigItem("IrfanView", "IrfanViewPath", r"C:\Program Files\IrfanView", followup=os.path.expanduser),
@@ -100,6 +109,8 @@ class PixivConfig():
         ConfigItem("Settings", "writeImageXMP", False),
         ConfigItem("Settings", "writeImageXMPPerImage", False),
         ConfigItem("Settings", "verifyImage", False),
+        ConfigItem("Settings", "verifyImageMode", "full",
+                   restriction=lambda x: x in ('fast', 'full')),
         ConfigItem("Settings", "writeUrlInDescription", False),
         ConfigItem("Settings", "stripHTMLTagsFromCaption", False),
         ConfigItem("Settings", "urlBlacklistRegex", ""),
@@ -107,6 +118,8 @@ class PixivConfig():
         ConfigItem("Settings", "setLastModified", True),
         ConfigItem("Settings", "useLocalTimezone", False),
         ConfigItem("Settings", "defaultSketchOption", ""),
+        ConfigItem("Settings", "memoryBudget", 1024,
+                   restriction=lambda x: int(x) >= 0),
 
         ConfigItem("Filename",
                    "filenameFormat",
@@ -205,6 +218,7 @@ class PixivConfig():
         ConfigItem("Ugoira", "createAvif", False),
         ConfigItem("Ugoira", "deleteUgoira", False),
         ConfigItem("Ugoira", "deleteZipFile", False),
+        ConfigItem("Ugoira", "reencodeWorkers", 0, restriction=lambda x: int(x) >= 0),
 
         ConfigItem("DownloadControl", "minFileSize", 0),
         ConfigItem("DownloadControl", "maxFileSize", 0),
@@ -214,6 +228,7 @@ class PixivConfig():
         ConfigItem("DownloadControl", "backupOldFile", False),
         ConfigItem("DownloadControl", "dayLastUpdated", 7),
         ConfigItem("DownloadControl", "checkUpdatedLimit", 0),
+        ConfigItem("DownloadControl", "skipUnchangedMember", False),
         ConfigItem("DownloadControl", "useBlacklistTags", False),
         ConfigItem("DownloadControl", "useBlacklistTitles", False),
         ConfigItem("DownloadControl", "useBlacklistTitlesRegex", False),
@@ -224,8 +239,12 @@ class PixivConfig():
         ConfigItem("DownloadControl", "skipUnknownSize", False),
         ConfigItem("DownloadControl", "enablePostProcessing", False),
         ConfigItem("DownloadControl", "postProcessingCmd", ""),
+        ConfigItem("DownloadControl", "postProcessingMaxProcesses", 2, restriction=lambda x: int(x) > 0),
+        ConfigItem("DownloadControl", "postProcessingBatchSize", 1, restriction=lambda x: int(x) > 0),
         ConfigItem("DownloadControl", "extensionFilter", ""),
         ConfigItem("DownloadControl", "downloadBuffer", 512, restriction=lambda x: int(x) > 0),
+        ConfigItem("DownloadControl", "progressRefreshRate", 10, restriction=lambda x: int(x) > 0),
+        ConfigItem("DownloadControl", "preallocateFile", False),
         ConfigItem("DownloadControl", "createPixivArchive", False),
         ConfigItem("DownloadControl", "createPixivArchiveCompressionType", "ZIP_STORED",
                    restriction=lambda algorithm: algorithm in {"ZIP_STORED", "ZIP_DEFLATED", "ZIP_BZIP2", "ZIP_LZMA"}),
@@ -249,7 +268,8 @@ class PixivConfig():
         value = f"{scheme}://{netloc}{port}"
         return {"http": value, "https": value}
 
-    def loadConfig(self, path=None):
+    def loadConfig(self, path=None, force=True):
+        '''Load the configuration from path, set force=False to skip if the file is not modified since the last load.'''
         if path is not None:
             self.configFileLocation = path
         else:
@@ -257,6 +277,12 @@ class PixivConfig():
 
         self.configFileLocation = os.path.abspath(self.configFileLocation)
 
+        file_stat = self.__get_file_stat(self.configFileLocation)
+        if not force and file_stat is not None and file_stat == self.__loaded_stat:
+            self.__logger.debug('Configuration not modified: %s', self.configFileLocation)
+            return
+        self.__loaded_stat = None
+
         print(f'Reading {self.configFileLocation} ...')
         config = configparser.RawConfigParser()
 
@@ -317,8 +343,17 @@ class PixivConfig():
             print(Fore.RED + Style.BRIGHT + 'Configurations with invalid value are set to default value.' + Style.RESET_ALL)
             self.writeConfig(error=True, path=self.configFileLocation)
 
+        self.__loaded_stat = self.__get_file_stat(self.configFileLocation)
         print('Configuration loaded.')
 
+    @staticmethod
+    def __get_file_stat(path):
+        try:
+            stat = os.stat(path)
+            return (path, stat.st_mtime_ns, stat.st_size)
+        except OSError:
+            return None
+
     # -UI01B------write config
     def writeConfig(self, error=False, path=None):
         '''Backup old config if exist and write updated config.ini'''
@@ -10,6 +10,9 @@ PIXIVUTIL_LOG_SIZE = 10485760
 PIXIVUTIL_LOG_COUNT = 10
 PIXIVUTIL_LOG_FORMAT = "%(asctime)s - %(name)s - %(levelname)s - %(message)s"
 
+# Ugoira re-encoding progress, relative to rootDirectory
+PIXIVUTIL_UGOIRA_CHECKPOINT = "ugoira_reencode.checkpoint"
+
 # Download Results
 PIXIVUTIL_NOT_OK = -1
 PIXIVUTIL_OK = 0
@@ -1,27 +1,33 @@
 # -*- coding: utf-8 -*-
 # pylint: disable=W0603
 
+import atexit
 import codecs
+import functools
+import gc
 import html
 import json
 import logging
 import logging.handlers
 import os
 import platform
+import queue
 import random
 import re
 import shlex
 import shutil
+import socket
 import subprocess
 import sys
 import tempfile
+import threading
 import time
 import traceback
-import unicodedata
 import urllib
 import urllib.parse
 import webbrowser
 import zipfile
+from concurrent.futures import ThreadPoolExecutor
 from datetime import date, datetime, timedelta, tzinfo
 from hashlib import md5, sha1, sha256
 from mmap import ACCESS_READ, mmap
@@ -39,7 +45,15 @@ from model.PixivImage import PixivImage
 from model.PixivModelFanbox import FanboxArtist, FanboxPost
 
 __logger = None
+__log_listener = None
 _config = None
+__print_lock = threading.RLock()
+_progress_renderer = None
+_memory_monitor = None
+__memory_trim_callbacks = []
+_page_size = os.sysconf("SC_PAGE_SIZE") if hasattr(os, "sysconf") else 4096
+__text_file_cache = {}
+__text_file_lock = threading.Lock()
 __re_manga_index = re.compile(r'_p(\d+)')
 __badchars__ = None
 if platform.system() == 'Windows':
@@ -59,6 +73,12 @@ else:
     ''', re.VERBOSE)
 
 __custom_sanitizer_dic__ = {}
+# unicodedata.category(c) == "Cc"
+__control_chars__ = re.compile('[\x00-\x1f\x7f-\x9f]')
+VERSION_CHECK_URL = "https://raw.githubusercontent.com/Nandaka/PixivUtil2/master/common/PixivConstant.py"
+VERSION_CHECK_CACHE_FILE = "pixivutil_version.json"
+VERSION_CHECK_TIMEOUT = 10
+__latest_version = None
 __ansi_color = re.compile(r'\x1B(?:[@-Z\\-_]|\[[0-?]*[ -/]*[@-~])')
 
 
@@ -70,6 +90,7 @@ def set_config(config):
 def get_logger(level=None, reload=False):
     '''Set up logging'''
     global __logger
+    global __log_listener
     if reload:
         __logger = None
 
@@ -93,10 +114,58 @@ def get_logger(level=None, reload=False):
                                                                   encoding="utf-8")
             __formatter__ = logging.Formatter(PixivConstant.PIXIVUTIL_LOG_FORMAT)
             __logHandler__.setFormatter(__formatter__)
-            __logger.addHandler(__logHandler__)
+
+            # the file is written by a background thread, replace the handler from the previous setup
+            stop_log_listener()
+            for handler in list(__logger.handlers):
+                __logger.removeHandler(handler)
+            log_queue = queue.SimpleQueue()
+            __log_listener = logging.handlers.QueueListener(log_queue, __logHandler__)
+            __log_listener.start()
+            __logger.addHandler(logging.handlers.QueueHandler(log_queue))
     return __logger
 
 
+def stop_log_listener():
+    '''Flush the queued log records to the file and stop the log writer thread.'''
+    global __log_listener
+    if __log_listener is not None:
+        __log_listener.stop()
+        for handler in __log_listener.handlers:
+            handler.close()
+        __log_listener = None
+
+
+atexit.register(stop_log_listener)
+
+
+def log_payload(label, payload):
+    '''Log a response body at debug level.
+
+    Bodies larger than [Debug] logPayloadLimit bytes are logged truncated with their size.
+    If [Debug] payloadDumpDirectory is set, the full body is saved there, named by its sha1.'''
+    logger = get_logger()
+    if not logger.isEnabledFor(logging.DEBUG):
+        return
+    data = payload if isinstance(payload, bytes) else str(payload).encode("utf-8")
+    limit = _config.logPayloadLimit if _config is not None else 4096
+    if limit <= 0 or len(data) <= limit:
+        logger.debug("%s: %s", label, data.decode("utf-8", errors="replace"))
+        return
+
+    saved_to = ""
+    if _config is not None and len(_config.payloadDumpDirectory) > 0:
+        digest = sha1(data).hexdigest()
+        dump_filename = os.path.join(_config.payloadDumpDirectory, f"{digest}.txt")
+        if not os.path.exists(dump_filename):
+            makeSubdirs(dump_filename)
+            with open(dump_filename, "wb") as dump:
+                dump.write(data)
+        saved_to = f", sha1={digest}, saved to {dump_filename}"
+    logger.debug("%s: %d bytes%s, truncated: %s...",
+                 label, len(data), saved_to, data[:limit].decode("utf-8", errors="ignore"))
+
+
 def set_log_level(level):
     get_logger(logging.INFO).info("Setting log level to: %s", level)
     get_logger(level).setLevel(level)
@@ -107,7 +176,15 @@ def sanitize_filename(name, rootDir=None):
     # get the absolute rootdir
     if rootDir is not None:
         rootDir = os.path.abspath(rootDir)
+    elif platform.system() == 'Windows':
+        # the name length is checked against the current directory
+        return _sanitize_filename.__wrapped__(name, rootDir)
+    return _sanitize_filename(name, rootDir)
 
+
+# the same directory names are sanitized for every image, cleared when customBadChars is changed
+@functools.lru_cache(maxsize=4096)
+def _sanitize_filename(name, rootDir):
     # Unescape '&amp;', '&lt;', and '&gt;'
     name = html.unescape(name)
 
@@ -117,14 +194,15 @@ def sanitize_filename(name, rootDir=None):
         name = value["regex"].sub(value["replace"], name)
 
     # Remove unicode control characters
-    name = "".join(c for c in name if unicodedata.category(c) != "Cc")
+    name = __control_chars__.sub("", name)
 
     # Strip leading/trailing space for each directory
     # Issue #627: remove trailing '.'
     # Ensure Windows reserved filenames are prefixed with _
     stripped_name = list()
     for item in name.split(os.sep):
-        if Path(item).is_reserved():
+        # always False for posix path
+        if os.name == 'nt' and Path(item).is_reserved():
             item = '_' + item
         stripped_name.append(item.strip(" .\t\r\n"))
     name = os.sep.join(stripped_name)
@@ -148,9 +226,7 @@ def sanitize_filename(name, rootDir=None):
     else:
         # Unix: cut filename to <= 249 bytes
         # TODO: allow macOS higher limits, HFS+ allows 255 UTF-16 chars, and APFS 255 UTF-8 chars
-        while len(name.encode('utf-8')) > 249:
-            filename, extname = os.path.splitext(name)
-            name = filename[:len(filename) - 1] + extname
+        name = trim_utf8_filename(name, 249)
         name = name.replace('\\', '/')
 
     if rootDir is not None:
@@ -162,6 +238,33 @@ def sanitize_filename(name, rootDir=None):
     return name
 
 
+def trim_utf8_filename(name, max_bytes):
+    '''Remove the characters before the extension until the name fits in max_bytes when encoded in UTF-8.
+    Same result as removing one character at a time, without re-encoding the name for each character.'''
+    while len(name.encode('utf-8')) > max_bytes:
+        filename, extname = os.path.splitext(name)
+        # filename[:n] + extname is split the same way for n >= min_size
+        sep_index = filename.rfind(os.sep)
+        min_size = sep_index + 1
+        if extname:
+            while filename[min_size] == '.':
+                min_size = min_size + 1
+            min_size = min_size + 1
+
+        size = max_bytes - len(extname.encode('utf-8'))
+        if size >= 0:
+            encoded = filename.encode('utf-8')
+            # move back to the start of the code point, UTF-8 continuation bytes are 0b10xxxxxx
+            while size > 0 and encoded[size] & 0xC0 == 0x80:
+                size = size - 1
+            trimmed = encoded[:size].decode('utf-8')
+            if len(trimmed) >= min_size - 1:
+                return trimmed + extname
+        # the extension changes from here, continue with the new split
+        name = filename[:min_size - 1] + extname
+    return name
+
+
 # Issue #277: always replace '/' and '\' with '_' for %artist%, %title%, %searchTags%, %tags%, and %original_artist%.
 def replace_path_separator(s, replacement='_'):
     return s.replace('/', replacement).replace('\\', replacement)
@@ -388,18 +491,20 @@ def calculate_group(count):
 
 def safePrint(msg, newline=True, end=None):
     """Print empty string if UnicodeError raised."""
-    if not isinstance(msg, str):
-        print(f"{msg}", end=' ')
-    for msgToken in msg.split(' '):
-        try:
-            print(msgToken, end=' ')
-        except UnicodeError:
-            print(('?' * len(msgToken)), end=' ')
+    # the message is printed per token, keep the lines from the worker threads together
+    with __print_lock:
+        if not isinstance(msg, str):
+            print(f"{msg}", end=' ')
+        for msgToken in msg.split(' '):
+            try:
+                print(msgToken, end=' ')
+            except UnicodeError:
+                print(('?' * len(msgToken)), end=' ')
 
-    if end is not None:
-        print("", end=end)
-    elif newline:
-        print("")
+        if end is not None:
+            print("", end=end)
+        elif newline:
+            print("")
 
 
 def set_console_title(title):
@@ -473,6 +578,27 @@ def open_text_file(filename, mode='r', encoding='utf-8'):
     return f
 
 
+def read_text_file_cached(filename, default=None):
+    ''' Return the content of the text file, it is only read again when the file is modified.
+    Return default if the file doesn't exist.'''
+    try:
+        stat = os.stat(filename)
+    except OSError:
+        return default
+    key = os.path.abspath(filename)
+    file_stat = (stat.st_mtime_ns, stat.st_size)
+    with __text_file_lock:
+        cached = __text_file_cache.get(key)
+    if cached is not None and cached[0] == file_stat:
+        return cached[1]
+
+    with open_text_file(filename) as reader:
+        content = reader.read()
+    with __text_file_lock:
+        __text_file_cache[key] = (file_stat, content)
+    return content
+
+
 def create_avabg_filename(artistModel, targetDir, format_src):
     filename_avatar = ""
     filename_bg = ""
@@ -770,7 +896,26 @@ def makeSubdirs(filename):
     directory = os.path.dirname(filename)
     if not os.path.exists(directory) and len(directory) > 0:
         print_and_log('info', u'Creating directory: ' + directory)
-        os.makedirs(directory)
+        os.makedirs(directory, exist_ok=True)
+
+
+def _get_readinto_stream(res):
+    '''Return the stream under the response which supports readinto(), or None.
+    mechanize's seek_wrapper keeps a copy of everything read through it, so it is skipped
+    when nothing has been read from it yet.'''
+    stream = res
+    while stream is not None:
+        if hasattr(stream, "readinto"):
+            return stream
+        if hasattr(stream, "wrapped"):
+            from mechanize._response import len_of_seekable
+            cache = getattr(stream, "_seek_wrapper__cache", None)
+            if cache is None or len_of_seekable(cache) > 0:
+                return None
+            stream = stream.wrapped
+        else:
+            stream = getattr(stream, "fp", None)
+    return None
 
 
 def download_image(url, filename, res, file_size, overwrite):
@@ -782,7 +927,7 @@ def download_image(url, filename, res, file_size, overwrite):
     # try to save to the given filename + .pixiv extension if possible
     try:
         makeSubdirs(filename)
-        save = open(filename + '.pixiv', 'wb+', 4096)
+        save = open(filename + '.pixiv', 'wb+', BUFFER_SIZE)
     except IOError as ex:
         print_and_log('error', f"Error at download_image(): Cannot save {url} to {filename}: {sys.exc_info()}", exception=ex)
         input("Press enter to continue or Ctrl+C to abort.")  # Issue #1187
@@ -791,27 +936,48 @@ def download_image(url, filename, res, file_size, overwrite):
         filename = os.path.split(url)[1]
         filename = filename.split("?")[0]
         filename = sanitize_filename(filename)
-        save = open(filename + '.pixiv', 'wb+', 4096)
+        save = open(filename + '.pixiv', 'wb+', BUFFER_SIZE)
         print_and_log('info', f'File is saved to {filename}')
 
-    # download the file
+    if file_size > 0 and _config.preallocateFile:
+        try:
+            if hasattr(os, "posix_fallocate"):
+                os.posix_fallocate(save.fileno(), 0, file_size)
+            if hasattr(os, "posix_fadvise"):
+                os.posix_fadvise(save.fileno(), 0, 0, os.POSIX_FADV_SEQUENTIAL)
+        except OSError as ex:
+            get_logger().debug("Cannot preallocate %s: %s", filename, ex)
+
+    # download the file, reusing the same buffer for every chunk
     prev = 0
     curr = 0
-    msg_len = 0
+    buffer = memoryview(bytearray(BUFFER_SIZE))
+    stream = _get_readinto_stream(res)
+    progress = get_progress_renderer()
+    progress.start(filename, file_size)
     try:
         while True:
-            save.write(res.read(BUFFER_SIZE))
-            curr = save.tell()
-            msg_len = print_progress(curr, file_size, msg_len)
+            if stream is not None:
+                read_size = stream.readinto(buffer)
+            else:
+                data = res.read(BUFFER_SIZE)
+                read_size = len(data)
+                buffer[:read_size] = data
+            if read_size:
+                save.write(buffer[:read_size])
+                curr = curr + read_size
+            progress.update(filename, curr)
 
             # check if downloaded file is complete
             if file_size > 0 and curr == file_size:
+                progress.finish(filename)
                 total_time = (datetime.now() - start_time).total_seconds()
                 print_and_log(None, f' Completed in {Fore.CYAN}{total_time}{Style.RESET_ALL}s ({Fore.RED}{speed_in_str(file_size, total_time)}{Style.RESET_ALL})')
                 break
 
             # no file size info
             elif file_size < 0 and curr == prev:
+                progress.finish(filename)
                 total_time = (datetime.now() - start_time).total_seconds()
                 print_and_log(None, f' Completed in {Fore.CYAN}{total_time}{Style.RESET_ALL}s ({Fore.RED}{speed_in_str(curr, total_time)}{Style.RESET_ALL})')
                 break
@@ -832,6 +998,7 @@ def download_image(url, filename, res, file_size, overwrite):
         raise
 
     finally:
+        progress.finish(filename)
         if save is not None:
             save.close()
 
@@ -861,7 +1028,7 @@ def download_image(url, filename, res, file_size, overwrite):
     return (curr, filename)
 
 
-def print_progress(curr, total, max_msg_length=80):
+def print_progress(curr, total, max_msg_length=80, suffix=""):
     # [12345678901234567890]
     # [████████------------]
     # [━╸                  ]
@@ -889,12 +1056,95 @@ def print_progress(curr, total, max_msg_length=80):
         # also changes, thus producing the scrolling effect.
         msg = f'\r{Fore.YELLOW}[{anim[animBarLen + 3 - pos:]:.{animBarLen}}]{Style.RESET_ALL} {size_in_str(curr)}'
 
+    msg = msg + suffix
     curr_msg_length = len(msg)
     print_and_log(None, msg.ljust(max_msg_length, " "), newline=False)
 
     return curr_msg_length if curr_msg_length > max_msg_length else max_msg_length
 
 
+class ProgressRenderer(object):
+    '''Download progress shared by all the transfers.
+
+    The status line is redrawn at most max_refresh times per second, and concurrent
+    transfers are summed into one bar. When stdout is not a terminal, a summary line
+    is printed every summary_interval seconds instead of redrawing.'''
+
+    def __init__(self, max_refresh=10, summary_interval=5, is_tty=None):
+        self.interval = 1.0 / max_refresh
+        self.summary_interval = summary_interval
+        if is_tty is None:
+            try:
+                is_tty = sys.stdout.isatty()
+            except (AttributeError, ValueError):
+                is_tty = False
+        self.is_tty = is_tty
+        self.redraw_count = 0
+        self._transfers = dict()
+        self._lock = threading.Lock()
+        self._next_draw = 0
+        self._msg_len = 0
+
+    def start(self, key, total):
+        with self._lock:
+            if not self.is_tty and len(self._transfers) == 0:
+                # no summary for the short downloads
+                self._next_draw = time.monotonic() + self.summary_interval
+            self._transfers[key] = [0, total]
+
+    def update(self, key, curr):
+        transfer = self._transfers.get(key)
+        if transfer is None:
+            return
+        transfer[0] = curr
+        if time.monotonic() >= self._next_draw:
+            self._draw()
+
+    def finish(self, key):
+        '''Draw the final state of the last transfer and remove it.'''
+        with self._lock:
+            if self.is_tty and len(self._transfers) == 1 and key in self._transfers:
+                self._render()
+            self._transfers.pop(key, None)
+
+    def _draw(self):
+        with self._lock:
+            if time.monotonic() >= self._next_draw:
+                self._render()
+
+    def _render(self):
+        if len(self._transfers) == 0:
+            return
+        curr = 0
+        total = 0
+        for (transfer_curr, transfer_total) in self._transfers.values():
+            curr = curr + transfer_curr
+            # unknown if any of the size is unknown
+            total = total + transfer_total if total >= 0 and transfer_total > 0 else -1
+        count = len(self._transfers)
+
+        self.redraw_count = self.redraw_count + 1
+        if self.is_tty:
+            self._next_draw = time.monotonic() + self.interval
+            suffix = f" ({count} files)" if count > 1 else ""
+            self._msg_len = print_progress(curr, total, self._msg_len, suffix)
+        else:
+            self._next_draw = time.monotonic() + self.summary_interval
+            if total > 0:
+                print_and_log(None, f"Downloading {count} file(s): {size_in_str(curr)} of {size_in_str(total)} ({curr * 100 // total}%)")
+            else:
+                print_and_log(None, f"Downloading {count} file(s): {size_in_str(curr)}")
+
+
+def get_progress_renderer() -> ProgressRenderer:
+    global _progress_renderer
+    if _progress_renderer is None:
+        _progress_renderer = ProgressRenderer()
+    if _config is not None:
+        _progress_renderer.interval = 1.0 / _config.progressRefreshRate
+    return _progress_renderer
+
+
 def generate_search_tag_url(tags,
                             page,
                             title_caption=False,
@@ -1150,6 +1400,153 @@ def convert_ugoira(ugoira_file, exportname, ffmpeg, codec, param, extension, ima
         print()
 
 
+def concurrent_map(func, items, max_workers: int = None) -> list:
+    '''Call func for each item using a thread pool, the results are returned in the items order.
+    max_workers defaults to [Network] maxConcurrentRequests, 1 runs everything in the current thread.
+    Use PixivBrowserFactory.getWorkerBrowser() inside func for the network requests.'''
+    items = list(items)
+    if max_workers is None:
+        max_workers = _config.maxConcurrentRequests if _config is not None else 1
+    if max_workers <= 1 or len(items) <= 1:
+        return [func(item) for item in items]
+    with ThreadPoolExecutor(max_workers=min(max_workers, len(items)), thread_name_prefix="fetch") as executor:
+        return list(executor.map(func, items))
+
+
+class MemoryMonitor(object):
+    '''Release memory only when the process is over the budget, a full gc.collect() after every item
+    gets slower as the heap grows.'''
+
+    def __init__(self, budget_mb: int, trim_callbacks=None):
+        self.budget_mb = budget_mb
+        self.collections = 0
+        self._limit = budget_mb * 1024 * 1024
+        self._trim_callbacks = trim_callbacks if trim_callbacks is not None else []
+
+    def check(self) -> bool:
+        '''Return True if the budget was exceeded and memory was released.'''
+        if self.budget_mb <= 0:
+            return False
+        rss = get_rss()
+        if rss is None or rss <= self._limit:
+            return False
+
+        for callback in self._trim_callbacks:
+            callback()
+        gc.collect()
+        self.collections += 1
+
+        # freed memory is not always returned to the OS, only collect again when it grows further
+        after = get_rss() or rss
+        self._limit = max(self.budget_mb * 1024 * 1024, after + self.budget_mb * 1024 * 1024 // 10)
+        get_logger().debug("Memory budget exceeded: %d MB, %d MB after collection.", rss // 1048576, after // 1048576)
+        return True
+
+
+def get_rss():
+    '''Return the resident set size in bytes, or None if not available.'''
+    try:
+        with open("/proc/self/statm", "rb") as f:
+            return int(f.read().split()[1]) * _page_size
+    except (OSError, ValueError, IndexError):
+        return None
+
+
+def register_memory_trim(callback):
+    '''Register a callback to drop caches when the memory budget is exceeded.'''
+    __memory_trim_callbacks.append(callback)
+
+
+def check_memory() -> bool:
+    '''Call after each processed item instead of gc.collect(), see [Settings] memoryBudget.'''
+    global _memory_monitor
+    budget = _config.memoryBudget if _config is not None else 0
+    if _memory_monitor is None or _memory_monitor.budget_mb != budget:
+        _memory_monitor = MemoryMonitor(budget, __memory_trim_callbacks)
+    return _memory_monitor.check()
+
+
+class DnsCache(object):
+    '''Wrap socket.getaddrinfo (or the SOCKS replacement) and keep the result for ttl seconds,
+    failed lookups are kept for negative_ttl seconds. Concurrent lookups of the same host share one query.'''
+    MAX_ENTRIES = 256
+    NEGATIVE_TTL = 10
+
+    def __init__(self, resolver, ttl=300, negative_ttl=NEGATIVE_TTL):
+        self.resolver = resolver
+        self.ttl = ttl
+        self.negative_ttl = negative_ttl
+        self.lookups = 0
+        self._cache = dict()
+        self._pending = dict()
+        self._lock = threading.Lock()
+
+    def __call__(self, host, port, family=0, type=0, proto=0, flags=0):
+        if self.ttl <= 0:
+            return self.resolver(host, port, family, type, proto, flags)
+        key = (host, port, family, type, proto, flags)
+        while True:
+            with self._lock:
+                entry = self._cache.get(key)
+                if entry is not None and entry[0] > time.monotonic():
+                    (_, result, error) = entry
+                    break
+                event = self._pending.get(key)
+                if event is None:
+                    event = self._pending[key] = threading.Event()
+                    self.lookups += 1
+                    owner = True
+                else:
+                    owner = False
+            if not owner:
+                # other thread is resolving the same host
+                event.wait()
+                continue
+
+            (result, error) = (None, None)
+            try:
+                result = self.resolver(host, port, family, type, proto, flags)
+                expiry = time.monotonic() + self.ttl
+            except socket.gaierror as ex:
+                error = ex
+                expiry = time.monotonic() + self.negative_ttl
+            finally:
+                with self._lock:
+                    if result is not None or error is not None:
+                        self._put(key, (expiry, result, error))
+                    del self._pending[key]
+                event.set()
+            break
+
+        if error is not None:
+            raise socket.gaierror(*error.args)
+        return list(result)
+
+    def _put(self, key, entry):
+        if len(self._cache) >= self.MAX_ENTRIES:
+            now = time.monotonic()
+            for expired in [k for (k, v) in self._cache.items() if v[0] <= now]:
+                del self._cache[expired]
+            if len(self._cache) >= self.MAX_ENTRIES:
+                del self._cache[min(self._cache, key=lambda k: self._cache[k][0])]
+        self._cache[key] = entry
+
+    def clear(self):
+        with self._lock:
+            self._cache.clear()
+
+
+def install_dns_cache(ttl: int):
+    '''Cache the name resolution of socket.getaddrinfo for [Network] dnsCacheTTL seconds.
+    Must be called after the SOCKS proxy replaced socket.getaddrinfo.'''
+    if isinstance(socket.getaddrinfo, DnsCache):
+        socket.getaddrinfo.ttl = ttl
+        socket.getaddrinfo.negative_ttl = min(ttl, DnsCache.NEGATIVE_TTL)
+        return socket.getaddrinfo
+    socket.getaddrinfo = DnsCache(socket.getaddrinfo, ttl, min(ttl, DnsCache.NEGATIVE_TTL))
+    return socket.getaddrinfo
+
+
 def create_temp_dir(prefix: str = None) -> str:
     d = tempfile.mkdtemp(prefix=prefix)
 
@@ -1165,6 +1562,86 @@ def create_temp_dir(prefix: str = None) -> str:
     return d
 
 
+XMP_NAMESPACES = {"dc": "http://purl.org/dc/elements/1.1/",
+                  "pixiv": "http://pixiv.com/"}
+# value types from the exiv2 schema table, other lists are rdf:Seq and other values are simple text
+XMP_PROPERTY_TYPES = {"dc:subject": "Bag",
+                      "dc:creator": "Seq",
+                      "dc:date": "Seq",
+                      "dc:title": "LangAlt",
+                      "dc:description": "LangAlt"}
+# same escaping as exiv2, other control characters are replaced with space
+__xmp_text_escape = {i: " " for i in range(0x20)}
+__xmp_text_escape.update({ord("&"): "&amp;", ord("<"): "&lt;", ord(">"): "&gt;",
+                          ord("\n"): "&#xA;", ord("\r"): "&#xD;", ord("\t"): "&#x9;"})
+__xmp_attr_escape = dict(__xmp_text_escape)
+__xmp_attr_escape[ord('"')] = "&quot;"
+
+
+def create_xmp_packet(properties) -> str:
+    '''Serialize a list of (name, value) pairs, e.g. ("dc:title", "title"), to an XMP packet.
+    Each property is written with the type from XMP_PROPERTY_TYPES (rdf:Bag, rdf:Seq or
+    Lang Alt with x-default), other lists as rdf:Seq and None values are skipped.
+    The layout follows what exiv2 writes.'''
+    properties = [(k, v) for (k, v) in properties if v is not None]
+    prefixes = list(dict.fromkeys(k.split(":", 1)[0] for (k, _) in properties))
+    # exiv2 groups the properties by namespace
+    properties.sort(key=lambda p: prefixes.index(p[0].split(":", 1)[0]))
+
+    def xmp_type(key, value):
+        return XMP_PROPERTY_TYPES.get(key, "Seq" if isinstance(value, list) else "Text")
+
+    lines = ['<?xpacket begin="\ufeff" id="W5M0MpCehiHzreSzNTczkc9d"?>',
+             '<x:xmpmeta xmlns:x="adobe:ns:meta/" x:xmptk="XMP Core 4.4.0-Exiv2">',
+             ' <rdf:RDF xmlns:rdf="http://www.w3.org/1999/02/22-rdf-syntax-ns#">',
+             '  <rdf:Description rdf:about=""']
+    for prefix in prefixes:
+        lines.append(f'    xmlns:{prefix}="{XMP_NAMESPACES[prefix]}"')
+    for (key, value) in properties:
+        if xmp_type(key, value) == "Text":
+            lines.append(f'   {key}="{str(value).translate(__xmp_attr_escape)}"')
+
+    elements = [(k, v) for (k, v) in properties if xmp_type(k, v) != "Text"]
+    if len(elements) == 0:
+        lines[-1] += "/>"
+    else:
+        lines[-1] += ">"
+        for (key, value) in elements:
+            lines.append(f"   <{key}>")
+            if xmp_type(key, value) == "LangAlt":
+                lines.append("    <rdf:Alt>")
+                lines.append(f'     <rdf:li xml:lang="x-default">{str(value).translate(__xmp_text_escape)}</rdf:li>')
+                lines.append("    </rdf:Alt>")
+            else:
+                array = f"rdf:{xmp_type(key, value)}"
+                if not isinstance(value, list):
+                    value = [value]
+                if len(value) == 0:
+                    lines.append(f"    <{array}/>")
+                else:
+                    lines.append(f"    <{array}>")
+                    for item in value:
+                        lines.append(f"     <rdf:li>{str(item).translate(__xmp_text_escape)}</rdf:li>")
+                    lines.append(f"    </{array}>")
+            lines.append(f"   </{key}>")
+        lines.append("  </rdf:Description>")
+    lines.extend([' </rdf:RDF>', '</x:xmpmeta>', '<?xpacket end="w"?>'])
+    return "\n".join(lines)
+
+
+def write_file_atomic(filename: str, content: str, encoding: str = "utf-8") -> None:
+    '''Write to a temp file next to the target, then replace the target file.'''
+    temp_name = f"{filename}.tmp"
+    try:
+        with open(temp_name, "w", encoding=encoding, newline="") as f:
+            f.write(content)
+        os.replace(temp_name, filename)
+    except BaseException:
+        if os.path.exists(temp_name):
+            os.remove(temp_name)
+        raise
+
+
 def ffmpeg_progress_report(p: subprocess.Popen) -> subprocess.Popen:
     chatter = ""
     while p.stderr:
@@ -1196,43 +1673,32 @@ def check_image_encoding(directory: str) -> None:
     """
     Check if images in the temporary folder have the same amount of component of there bit depth
     """
-    nb_channel_max = 4
-    dict_of_components = dict()
-    for i in range(nb_channel_max):
-        dict_of_components[i] = list()
-
-    # Append every images to their corresponding number of bit depth in a dictionnary
-    for filename in os.listdir(directory):
-        f = os.path.join(directory + os.sep, filename)
-        # checking if it is a file
-        if ((os.path.isfile(f)) and (f.endswith((".jpg", ".png")))):
-            fp = None
+    # Group frames by number of components, only the header is parsed by Image.open()
+    dict_of_components = {1: list(), 2: list(), 3: list(), 4: list()}
+
+    with os.scandir(directory) as it:
+        for entry in it:
+            if not entry.is_file() or not entry.name.endswith((".jpg", ".png")):
+                continue
             try:
-                fp = open(f, "rb")
-                # Fix Issue #269, refer to https://stackoverflow.com/a/42682508
-                ImageFile.LOAD_TRUNCATED_IMAGES = True
-                with Image.open(fp) as im:
-                    nb_components = len(im.getbands())
-                    dict_of_components[nb_components].append(f)
-                    im.close()
+                with Image.open(entry.path) as im:
+                    nb_components = Image.getmodebands(im.mode)
+                dict_of_components[nb_components].append(entry.path)
             except BaseException:
-                if fp is not None:
-                    fp.close()
-                print_and_log('error', ' Image {f} invalid during check_image_encoding() , deleting...')
-                os.remove(f)
+                print_and_log('error', f' Image {entry.path} invalid during check_image_encoding() , deleting...')
+                os.remove(entry.path)
                 raise
 
     # Get the maximum amount of component of bit depth from the batch of images and convert thoses below it
-    re_encode = False
-    re_encode_channel = nb_channel_max
-    for i in range(nb_channel_max, 0, -1):
-        if re_encode:
-            for file in dict_of_components[i - 1]:
-                re_encode_image(re_encode_channel, file)
+    re_encode_channel = max((i for i in dict_of_components if len(dict_of_components[i]) > 0), default=0)
+    to_re_encode = [file for i in dict_of_components if i < re_encode_channel for file in dict_of_components[i]]
+    if len(to_re_encode) == 0:
+        return
 
-        if (len(dict_of_components[i - 1]) != 0) and not (re_encode):
-            re_encode = True
-            re_encode_channel = i - 1
+    print_and_log("debug", f"Re-encoding {len(to_re_encode)} image(s) to {re_encode_channel} components")
+    with ThreadPoolExecutor(max_workers=min(len(to_re_encode), os.cpu_count() or 1)) as executor:
+        # list() to propagate the first exception from the workers
+        list(executor.map(lambda file: re_encode_image(re_encode_channel, file), to_re_encode))
 
 
 def re_encode_image(nb_channel: int, im_path: str) -> None:
@@ -1241,35 +1707,26 @@ def re_encode_image(nb_channel: int, im_path: str) -> None:
     """
     print_and_log("debug", f"Procced to change {im_path} image for a pixel format with {nb_channel} components ")
 
-    # use filters with the most component of bit depth to make sure conversion run smoothly
-    pix_fmt_nb_components = {1: "grayf32be", 2: "ya16be", 3: "gbrpf32be", 4: "gbrapf32be"}
+    mode_nb_components = {1: "L", 2: "LA", 3: "RGB", 4: "RGBA"}
 
     split_tup = os.path.splitext(im_path)
     temp_name = f"{split_tup[0]}_temp{split_tup[1]}"
-    # Fix #1126
-    cmd = f"{_config.ffmpeg} -i {im_path} -pix_fmt {pix_fmt_nb_components[nb_channel]} {temp_name}"
-
-    ffmpeg_args = shlex.split(cmd, posix=False)
-    get_logger().info(f"[re_encode_image()] running with cmd: {cmd}")
-    p = subprocess.Popen(ffmpeg_args, stderr=subprocess.PIPE)
-
-    # progress report
-    print_and_log('debug', f"Start re_encoding image {im_path}")
-    p = ffmpeg_progress_report(p)
-    p.wait()
-
-    if (p.returncode != 0):
-        raise PixivException("error", f"Failed when converting image using {cmd} ==> ffmpeg return exit code={p.returncode}, expected to return 0.", errorCode=PixivException.OTHER_ERROR)
-
-    if os.path.exists(im_path) and os.path.exists(temp_name):
-        try:
-            os.remove(im_path)
-            os.rename(temp_name, im_path)
-        except Exception as ex:
-            get_logger().error("[re_encode_image()] Unknown exception: ", ex)
-            raise PixivException(f"Cannot create remove or rename the temp file => {im_path}", errorCode=PixivException.OTHER_ERROR)
-    else:
-        print_and_log("error", f"Failed to modify {im_path} because the file or its re-encoded version {temp_name} does not exist ")
+    try:
+        # Fix Issue #269, refer to https://stackoverflow.com/a/42682508
+        ImageFile.LOAD_TRUNCATED_IMAGES = True
+        with Image.open(im_path) as im:
+            fmt = im.format
+            mode = mode_nb_components[nb_channel]
+            # JPEG cannot store alpha channel, use the closest mode it support
+            if fmt == "JPEG" and mode in ("LA", "RGBA"):
+                mode = "RGB"
+            im.convert(mode).save(temp_name, format=fmt, quality=95)
+        os.replace(temp_name, im_path)
+    except Exception as ex:
+        get_logger().error(f"[re_encode_image()] Failed to re-encode {im_path}: {ex}")
+        if os.path.exists(temp_name):
+            os.remove(temp_name)
+        raise PixivException(f"Failed to re-encode image => {im_path}", errorCode=PixivException.OTHER_ERROR)
 
 
 def parse_date_time(worksDate, dateFormat):
@@ -1311,30 +1768,85 @@ def encode_tags(tags):
     return tags
 
 
-def check_version(br, config=None):
-    if br is None:
-        import common.PixivBrowserFactory as PixivBrowserFactory
-        br = PixivBrowserFactory.getBrowser(config=config)
-    result = br.open_with_retry("https://raw.githubusercontent.com/Nandaka/PixivUtil2/master/common/PixivConstant.py", retry=3)
-    page = result.read().decode('utf-8')
-    result.close()
-    latest_version_full = re.findall(r"PIXIVUTIL_VERSION = '(\d+)(.*)'", page)
+def check_version(br, config=None, cache_file=None):
+    '''Notify about new release, the latest version is saved in cache_file and
+    only checked again after [Network] checkNewVersionInterval hours.'''
+    notify_new_version(get_latest_version(br, config, cache_file), config)
+
+
+def get_latest_version(br, config=None, cache_file=None):
+    latest_version_full = None
+    if cache_file is not None:
+        latest_version_full = _read_version_cache(cache_file, config.checkNewVersionInterval * 3600)
 
-    latest_version_int = int(latest_version_full[0][0])
+    if latest_version_full is None:
+        if br is None:
+            import common.PixivBrowserFactory as PixivBrowserFactory
+            br = PixivBrowserFactory.getWorkerBrowser()
+        result = br.open_novisit(VERSION_CHECK_URL, timeout=VERSION_CHECK_TIMEOUT)
+        page = result.read().decode('utf-8')
+        result.close()
+        latest_version_full = re.findall(r"PIXIVUTIL_VERSION = '(\d+)(.*)'", page)[0]
+        if cache_file is not None:
+            with open(cache_file, "w", encoding="utf-8") as f:
+                json.dump({"checked": time.time(), "version": list(latest_version_full)}, f)
+    return latest_version_full
+
+
+def notify_new_version(latest_version_full, config):
+    latest_version_int = int(latest_version_full[0])
     curr_version_int = int(re.findall(r"(\d+)", PixivConstant.PIXIVUTIL_VERSION)[0])
-    is_beta = True if latest_version_full[0][1].find("beta") >= 0 else False
+    is_beta = True if latest_version_full[1].find("beta") >= 0 else False
     if is_beta and not config.notifyBetaVersion:
         return
     url = "https://github.com/Nandaka/PixivUtil2/releases"
     if latest_version_int > curr_version_int:
         if is_beta:
-            print_and_log("info", "New beta version available: {0}".format(latest_version_full[0]))
+            print_and_log("info", "New beta version available: {0}".format(tuple(latest_version_full)))
         else:
-            print_and_log("info", "New version available: {0}".format(latest_version_full[0]))
+            print_and_log("info", "New version available: {0}".format(tuple(latest_version_full)))
         if config.openNewVersion:
             webbrowser.open_new(url)
 
 
+def _read_version_cache(cache_file, max_age):
+    try:
+        with open(cache_file, "r", encoding="utf-8") as f:
+            cache = json.load(f)
+        if 0 <= time.time() - cache["checked"] < max_age:
+            return tuple(cache["version"])
+    except (OSError, ValueError, KeyError, TypeError):
+        pass
+    return None
+
+
+def check_version_async(config, cache_file=None):
+    '''Get the latest version in a daemon thread, the caller never waits for the result.
+    The result is shown by report_new_version() from the main thread, so it doesn't print in the middle of the menu.
+    The cache file is saved next to config.ini by default.'''
+    if cache_file is None:
+        cache_file = os.path.join(os.path.dirname(os.path.abspath(config.configFileLocation)), VERSION_CHECK_CACHE_FILE)
+
+    def run():
+        global __latest_version
+        try:
+            __latest_version = get_latest_version(None, config=config, cache_file=cache_file)
+        except BaseException:
+            get_logger().warning("Failed to check for new version: %s", sys.exc_info()[1])
+
+    thread = threading.Thread(target=run, name="check_version", daemon=True)
+    thread.start()
+    return thread
+
+
+def report_new_version(config):
+    '''Show the result of check_version_async() once it is available, call from the main thread.'''
+    global __latest_version
+    if __latest_version is not None:
+        (latest_version_full, __latest_version) = (__latest_version, None)
+        notify_new_version(latest_version_full, config)
+
+
 def decode_tags(tags):
     # decode tags.
     try:
@@ -1419,6 +1931,35 @@ def wait(result=None, config=None):
         time.sleep(delay)
 
 
+class RequestThrottle(object):
+    '''Space out the requests sent from several threads, each request starts a random delay of up to
+    [Network] downloadDelay after the previous one, same as wait() between serial requests.'''
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._next = 0
+
+    def wait(self, config=None):
+        if config is None:
+            config = _config
+        if config is None or config.downloadDelay <= 0:
+            return
+        with self._lock:
+            now = time.monotonic()
+            start = max(now, self._next)
+            self._next = start + random.random() * config.downloadDelay
+        if start > now:
+            time.sleep(start - now)
+
+
+__request_throttle = RequestThrottle()
+
+
+def throttle_request(config=None):
+    '''Call before each request sent by concurrent_map(), see RequestThrottle.'''
+    __request_throttle.wait(config)
+
+
 def dummy_notifier(type=None, message=None, **kwargs):
     pass
 
@@ -1469,6 +2010,7 @@ def parse_custom_clean_up_re(custom_clean_up_re_string):
 
 def parse_custom_sanitizer(bad_char_string):
     __custom_sanitizer_dic__.clear()
+    _sanitize_filename.cache_clear()
     default_replacement = "_"
     clean_string = ""
 
@@ -1495,7 +2037,8 @@ def parse_custom_sanitizer(bad_char_string):
     if temp_string:
         temp_string = "".join(sorted(set(temp_string)))
         clean_string = temp_string + clean_string
-        temp_string = "|".join([c if c not in r"$()*+.[]?^\{}|" else rf"\{c}" for c in temp_string])
+        # single pass over a character class
+        temp_string = "[" + "".join(re.escape(c) for c in temp_string) + "]"
         __custom_sanitizer_dic__["default"] = {"regex": re.compile(temp_string), "replace": default_replacement}
 
     for key, value in group_dic.items():
@@ -7,6 +7,8 @@ import os
 import random
 import ssl
 import sys
+import threading
+import time
 from collections import OrderedDict
 from datetime import datetime
 from typing import Dict
@@ -125,6 +127,13 @@ class PixivOAuth():
     _proxies: Dict[str, str] = None
     _tzInfo: PixivHelper.LocalUTCOffsetTimezone = None
     _validate_ssl: bool = True
+    _expires_at: float = 0
+    _token_cache_file: str = None
+
+    # seconds before expiry when the access token is refreshed
+    TOKEN_EXPIRY_MARGIN = 300
+    # wait before retrying a failed background refresh
+    TOKEN_RETRY_WAIT = 60
 
     sess = requests.Session()
     if PixivHelper.we_are_frozen():
@@ -136,7 +145,8 @@ class PixivOAuth():
         cloudscraper.create_scraper = create_scraper
     _req = cloudscraper.create_scraper(sess=sess)
 
-    def __init__(self, username, password, proxies=None, validate_ssl=True, refresh_token=None):
+    def __init__(self, username, password, proxies=None, validate_ssl=True, refresh_token=None, token_cache_file=None,
+                 refresh_token_callback=None):
         if username is None or len(username) <= 0:
             raise Exception("Username cannot empty!")
         if password is None or len(password) <= 0:
@@ -150,11 +160,121 @@ class PixivOAuth():
         else:
             self._refresh_token = None
         self._access_token = None
+        self._expires_at = 0
         self._tzInfo = PixivHelper.LocalUTCOffsetTimezone()
         self._validate_ssl = validate_ssl
+        self._token_lock = threading.RLock()
+        self._refresh_thread = None
+        self._stop_refresh = threading.Event()
         PixivOAuthBrowser.set_proxy(proxies)
         PixivOAuthBrowser.set_verify(validate_ssl)
 
+        # called with the new refresh token when the server rotates it, e.g. to update config.ini
+        self._refresh_token_callback = refresh_token_callback
+        self._token_cache_file = token_cache_file
+        if token_cache_file is not None:
+            self._load_token_cache()
+
+    def _load_token_cache(self):
+        '''Reuse the access token from previous run if it was issued for the same refresh token.'''
+        try:
+            with open(self._token_cache_file, 'r', encoding='utf-8') as f:
+                cache = json.load(f)
+            if self._refresh_token is not None and cache["refresh_token"] == self._refresh_token:
+                self._access_token = cache["access_token"]
+                self._expires_at = float(cache["expires_at"])
+        except (OSError, ValueError, KeyError, TypeError):
+            pass
+
+    def _save_token_cache(self):
+        if self._token_cache_file is None:
+            return
+        cache = {"refresh_token": self._refresh_token,
+                 "access_token": self._access_token,
+                 "expires_at": self._expires_at}
+        temp = self._token_cache_file + ".tmp"
+        try:
+            # only readable by the current user
+            fd = os.open(temp, os.O_WRONLY | os.O_CREAT | os.O_TRUNC, 0o600)
+            with os.fdopen(fd, 'w', encoding='utf-8') as f:
+                json.dump(cache, f)
+            os.chmod(temp, 0o600)
+            os.replace(temp, self._token_cache_file)
+        except OSError:
+            PixivHelper.get_logger().warning("Failed to save OAuth token to %s: %s", self._token_cache_file, sys.exc_info()[1])
+
+    def has_valid_token(self, margin=TOKEN_EXPIRY_MARGIN):
+        return self._access_token is not None and time.time() < self._expires_at - margin
+
+    def ensure_login(self):
+        '''Login only if there is no access token or it is about to expire.
+        Return the OAuth response, or None if the current access token is reused.'''
+        with self._token_lock:
+            if self.has_valid_token():
+                return None
+            return self.login()
+
+    def start_refresh_thread(self):
+        '''Refresh the access token in background shortly before it expires.
+        Only the refresh token is used, relogin is left to the foreground.'''
+        if self._refresh_token is None:
+            return
+        if self._refresh_thread is not None and self._refresh_thread.is_alive():
+            return
+        self._stop_refresh.clear()
+        self._refresh_thread = threading.Thread(target=self._refresh_loop, name="oauth_refresh", daemon=True)
+        self._refresh_thread.start()
+
+    def stop_refresh_thread(self):
+        self._stop_refresh.set()
+
+    def _refresh_loop(self):
+        while not self._stop_refresh.is_set():
+            wait = self._expires_at - self.TOKEN_EXPIRY_MARGIN - time.time()
+            if self._access_token is not None and wait > 0:
+                self._stop_refresh.wait(wait)
+                continue
+            with self._token_lock:
+                if self.has_valid_token():
+                    continue
+                refresh_token = self._refresh_token
+            # don't block ensure_login() during the request
+            try:
+                oauth_response = self._post_refresh_token(refresh_token)
+                if oauth_response.status_code == 200:
+                    with self._token_lock:
+                        # skip if the foreground already got a new token in the meantime
+                        if self._refresh_token == refresh_token:
+                            self._update_token(oauth_response)
+                    continue
+                if oauth_response.status_code in (400, 403):
+                    PixivHelper.get_logger().info("OAuth Refresh Token invalid, stop background refresh.")
+                    return
+            except BaseException:
+                PixivHelper.get_logger().warning("Failed to refresh OAuth token: %s", sys.exc_info()[1])
+            self._stop_refresh.wait(self.TOKEN_RETRY_WAIT)
+
+    def _post_refresh_token(self, refresh_token=None):
+        PixivHelper.get_logger().info("Login to OAuth using refresh token.")
+        return self._req.post(self._url,
+                              data=self._get_values_for_refresh(refresh_token),
+                              headers=self._get_default_headers(),
+                              proxies=self._proxies,
+                              verify=self._validate_ssl)
+
+    def _update_token(self, oauth_response):
+        info = json.loads(oauth_response.text)
+        old_refresh_token = self._refresh_token
+        self._refresh_token = info["response"]["refresh_token"]
+        self._access_token = info["response"]["access_token"]
+        self._expires_at = time.time() + int(info["response"].get("expires_in", 3600))
+        self._save_token_cache()
+        if self._refresh_token_callback is not None and self._refresh_token != old_refresh_token:
+            try:
+                self._refresh_token_callback(self._refresh_token)
+            except BaseException:
+                PixivHelper.get_logger().warning("Failed to save the new OAuth refresh token: %s", sys.exc_info()[1])
+
     def _get_default_values(self):
         return {'client_id': PixivOAuthBrowser.CLIENT_ID,
                 'client_secret': PixivOAuthBrowser.CLIENT_SECRET,
@@ -162,9 +282,9 @@ class PixivOAuth():
                 'get_secure_url': 'true',
                 'include_policy': 'true'}
 
-    def _get_values_for_refresh(self):
+    def _get_values_for_refresh(self, refresh_token=None):
         values = self._get_default_values()
-        values['refresh_token'] = self._refresh_token
+        values['refresh_token'] = refresh_token if refresh_token is not None else self._refresh_token
         values['grant_type'] = 'refresh_token'
         return values
 
@@ -190,8 +310,8 @@ class PixivOAuth():
                 'X-Client-Hash': time_hash.hexdigest()}
 
     def _get_headers_with_bearer(self):
-        if self._access_token is None:
-            self.login()
+        if not self.has_valid_token(margin=0):
+            self.ensure_login()
 
         headers = self._get_default_headers()
         headers["Authorization"] = "Bearer {0}".format(self._access_token)
@@ -207,15 +327,14 @@ class PixivOAuth():
         return oauth_response
 
     def login(self):
+        with self._token_lock:
+            return self._login()
+
+    def _login(self):
         oauth_response = None
         need_relogin = True
         if self._refresh_token is not None:
-            PixivHelper.get_logger().info("Login to OAuth using refresh token.")
-            oauth_response = self._req.post(self._url,
-                                            data=self._get_values_for_refresh(),
-                                            headers=self._get_default_headers(),
-                                            proxies=self._proxies,
-                                            verify=self._validate_ssl)
+            oauth_response = self._post_refresh_token()
             if oauth_response.status_code == 200:
                 need_relogin = False
             else:
@@ -227,9 +346,7 @@ class PixivOAuth():
 
         PixivHelper.get_logger().debug("%s: %s", oauth_response.status_code, oauth_response.text)
         if oauth_response.status_code == 200:
-            info = json.loads(oauth_response.text)
-            self._refresh_token = info["response"]["refresh_token"]
-            self._access_token = info["response"]["access_token"]
+            self._update_token(oauth_response)
         elif oauth_response.status_code in (400, 403):
             info = oauth_response.text
             try:
@@ -1,5 +1,6 @@
 # -*- coding: utf-8 -*-
-import gc
+import hashlib
+import os
 import sys
 import traceback
 
@@ -58,6 +59,14 @@ def process_member(caller,
         flag = True
         updated_limit_count = 0
         image_id = -1
+        # the work set is only compared when all the works are processed
+        check_work_set = (config.skipUnchangedMember and page == 1 and end_page == 0 and config.numberOfPage == 0
+                          and not bookmark and not tags and not config.r18mode
+                          and not config.overwrite and not config.alwaysCheckFileSize)
+        work_set = None
+        has_failure = False
+        stopped_early = False
+        complete_pass = False
 
         while flag:
             PixivHelper.print_and_log(None, f'Page {page} of {end_page}')
@@ -107,6 +116,13 @@ def process_member(caller,
                 flag = False
                 continue
 
+            if check_work_set and work_set is None and artist.allImageList is not None:
+                work_set = get_work_set_fingerprint(artist.allImageList)
+                if db.selectMemberWorkSet(member_id) == work_set:
+                    PixivHelper.print_and_log('info', f"No new works for Member Id: {member_id}, skipping.")
+                    db.updateLastDownloadDate(member_id)
+                    return
+
             if config.downloadAvatar and not is_avatar_downloaded:
                 is_avatar_downloaded = process_avatar_bg(caller, config, user_dir, notifier, artist)
 
@@ -166,6 +182,8 @@ def process_member(caller,
                         PixivHelper.print_delay(2)
 
                 no_of_images = no_of_images + 1
+                if result in (PixivConstant.PIXIVUTIL_NOT_OK, PixivConstant.PIXIVUTIL_KEYBOARD_INTERRUPT):
+                    has_failure = True
                 if result in (PixivConstant.PIXIVUTIL_SKIP_DUPLICATE,
                               PixivConstant.PIXIVUTIL_SKIP_LOCAL_LARGER,
                               PixivConstant.PIXIVUTIL_SKIP_DUPLICATE_NO_WAIT):
@@ -175,12 +193,13 @@ def process_member(caller,
                         db.updateLastDownloadDate(member_id)
                         PixivBrowserFactory.getBrowser(config=config).clear_history()
                         return
-                    gc.collect()
+                    PixivHelper.check_memory()
                     continue
                 if result == PixivConstant.PIXIVUTIL_KEYBOARD_INTERRUPT:
                     choice = input("Keyboard Interrupt detected, continue to next image (Y/N)").rstrip("\r")
                     if choice.upper() == 'N':
                         PixivHelper.print_and_log("info", f"Member: {member_id}, processing aborted")
+                        stopped_early = True
                         flag = False
                         break
                     else:
@@ -189,6 +208,7 @@ def process_member(caller,
                 if result == PixivConstant.PIXIVUTIL_SKIP_OLDER:
                     PixivHelper.print_and_log("info", "Reached older images, skippin to next member.")
                     db.updateLastDownloadDate(member_id)
+                    stopped_early = True
                     flag = False
                     break
 
@@ -197,6 +217,7 @@ def process_member(caller,
             if artist.isLastPage:
                 db.updateLastDownloadDate(member_id)
                 PixivHelper.print_and_log(None, "Last Page")
+                complete_pass = not stopped_early
                 flag = False
 
             page = page + 1
@@ -213,7 +234,11 @@ def process_member(caller,
             del artist
             del list_page
             PixivBrowserFactory.getBrowser(config=config).clear_history()
-            gc.collect()
+            PixivHelper.check_memory()
+
+        # only when every work was checked, otherwise the next run could skip the unchecked ones
+        if work_set is not None and complete_pass and not has_failure:
+            db.updateMemberWorkSet(member_id, *work_set)
 
         log_message = ""
         if int(image_id) > 0:
@@ -239,33 +264,62 @@ def process_member(caller,
         raise
 
 
+def get_work_set_fingerprint(image_ids):
+    '''Return (hash, count, max id) of the member's work ids.'''
+    image_ids = sorted(int(image_id) for image_id in image_ids)
+    work_set_hash = hashlib.sha1(",".join(str(image_id) for image_id in image_ids).encode("utf-8")).hexdigest()
+    return (work_set_hash, len(image_ids), image_ids[-1] if image_ids else 0)
+
+
 def process_avatar_bg(caller, config, user_dir, notifier, artist):
+    db = caller.__dbManager__
     if user_dir == '':
         target_dir = config.rootDirectory
     else:
         target_dir = user_dir
 
+    assets = dict()
+    if artist.artistAvatar.find('no_profile') == -1:
+        assets["avatar"] = artist.artistAvatar
+    # Issue #508
+    if artist.artistBackground is not None and artist.artistBackground.startswith("http"):
+        assets["background"] = artist.artistBackground
+
+    # skip without building the filenames when the files from the same urls are already saved
+    saved_assets = db.selectMemberAssets(artist.artistId)
+    if not config.overwrite and not config.alwaysCheckFileSize:
+        for (asset_type, url) in list(assets.items()):
+            saved = saved_assets.get(asset_type)
+            if saved is not None and saved[0] == url and os.path.isfile(saved[1]):
+                PixivHelper.print_and_log("info", f"Member's {asset_type} is not changed: {saved[1]}")
+                del assets[asset_type]
+    if len(assets) == 0 or caller.DEBUG_SKIP_PROCESS_IMAGE:
+        return True
+
     (filename_avatar, filename_bg) = PixivHelper.create_avabg_filename(artist, target_dir, config)
-    if not caller.DEBUG_SKIP_PROCESS_IMAGE:
-        if artist.artistAvatar.find('no_profile') == -1:
-            PixivHelper.print_and_log("info", f"Getting member's avatar from {artist.artistAvatar}.")
-            PixivDownloadHandler.download_image(caller,
-                                                artist.artistAvatar,
-                                                filename_avatar,
-                                                "https://www.pixiv.net/",
-                                                config.overwrite,
-                                                config.retry,
-                                                config.backupOldFile,
-                                                notifier=notifier)
-        # Issue #508
-        if artist.artistBackground is not None and artist.artistBackground.startswith("http"):
-            PixivHelper.print_and_log("info", f"Getting member's background from {artist.artistBackground}.")
-            PixivDownloadHandler.download_image(caller,
-                                                artist.artistBackground,
-                                                filename_bg,
-                                                "https://www.pixiv.net/",
-                                                config.overwrite,
-                                                config.retry,
-                                                config.backupOldFile,
-                                                notifier=notifier)
-    return True
\ No newline at end of file
+    filenames = {"avatar": filename_avatar, "background": filename_bg}
+    for (asset_type, url) in assets.items():
+        filename = filenames[asset_type]
+        saved = saved_assets.get(asset_type)
+        response_headers = {"ETag": None, "Last-Modified": None}
+        if saved is not None and saved[0] == url and saved[1] == filename and os.path.isfile(filename):
+            # kept if the file is not downloaded again
+            response_headers = {"ETag": saved[2], "Last-Modified": saved[3]}
+            if (saved[2] or saved[3]) and not PixivDownloadHandler.is_remote_file_modified(url, "https://www.pixiv.net/", config, saved[2], saved[3]):
+                PixivHelper.print_and_log("info", f"Member's {asset_type} is not modified: {filename}")
+                continue
+
+        PixivHelper.print_and_log("info", f"Getting member's {asset_type} from {url}.")
+        (result, filename_save) = PixivDownloadHandler.download_image(caller,
+                                                                      url,
+                                                                      filename,
+                                                                      "https://www.pixiv.net/",
+                                                                      config.overwrite,
+                                                                      config.retry,
+                                                                      config.backupOldFile,
+                                                                      notifier=notifier,
+                                                                      response_headers=response_headers)
+        if result in (PixivConstant.PIXIVUTIL_OK, PixivConstant.PIXIVUTIL_SKIP_DUPLICATE):
+            db.updateMemberAsset(artist.artistId, asset_type, url, filename_save,
+                                 response_headers["ETag"], response_headers["Last-Modified"])
+    return True
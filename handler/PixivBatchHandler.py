@@ -19,7 +19,7 @@ _default_batch_filename = "./batch_job.json"
 class JobOption(object):
     config = PixivConfig.ConfigItem
 
-    def loadConfig(self, path=None):
+    def loadConfig(self, path=None, force=True):
         # dummy method for compatibility
         PixivHelper.print_and_log("debug", "Called from JobOption, will not reloading the config...")
         pass
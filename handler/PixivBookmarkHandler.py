@@ -1,8 +1,10 @@
 import os
 import sys
+from concurrent.futures import ThreadPoolExecutor
 from datetime import time
 
 import handler.PixivArtistHandler as PixivArtistHandler
+import common.PixivBrowserFactory as PixivBrowserFactory
 import common.PixivConstant as PixivConstant
 import handler.PixivDownloadHandler as PixivDownloadHandler
 import common.PixivHelper as PixivHelper
@@ -113,17 +115,43 @@ def process_new_illust_from_bookmark(caller,
                                      bookmark_count=-1):
     br: PixivBrowser = caller.__br__
     parsed_page = None
+    prefetcher = None
     try:
         print("Processing New Illust from bookmark")
+        mode = "all"
+        if config.r18mode:
+            mode = "r18"
+
+        # the next feed pages are fetched concurrently while the images are processed,
+        # and consumed in page order.
+        # one page per worker is enough to keep ahead of the downloads,
+        # and limits the pages fetched for nothing when stopped by PIXIVUTIL_SKIP_OLDER
+        prefetched = dict()
+        prefetch_window = config.maxConcurrentRequests
+        last_page = br.getFollowedNewIllustsMaxPage()
+        if end_page_num != 0:
+            last_page = min(last_page, end_page_num)
+        if config.maxConcurrentRequests > 1:
+            prefetcher = ThreadPoolExecutor(max_workers=config.maxConcurrentRequests, thread_name_prefix="new_illust_page")
+
+        def get_page(current_page):
+            PixivHelper.throttle_request(config)
+            return PixivBrowserFactory.getWorkerBrowser().getFollowedNewIllusts(mode, current_page=current_page)
+
         i = page_num
         image_count = 1
         flag = True
         while flag:
             print(f"Page #{i}")
-            mode = "all"
-            if config.r18mode:
-                mode = "r18"
-            pb = br.getFollowedNewIllusts(mode, current_page=i)
+            future = prefetched.pop(i, None)
+            if future is not None:
+                pb = future.result()
+            else:
+                pb = br.getFollowedNewIllusts(mode, current_page=i)
+            if prefetcher is not None:
+                for next_page in range(i + 1, min(i + prefetch_window, last_page) + 1):
+                    if next_page not in prefetched:
+                        prefetched[next_page] = prefetcher.submit(get_page, next_page)
 
             for image_id in pb.imageList:
                 print(f"Image #{image_count}")
@@ -158,6 +186,10 @@ def process_new_illust_from_bookmark(caller,
             filename = "Dump for New Illust from bookmark.html"
             PixivHelper.dump_html(filename, parsed_page)
         raise
+    finally:
+        if prefetcher is not None:
+            # stop fetching ahead, e.g. on PIXIVUTIL_SKIP_OLDER
+            prefetcher.shutdown(wait=False, cancel_futures=True)
 
 
 def process_from_group(caller,
@@ -342,26 +374,16 @@ def get_bookmarks(caller, config, hide, start_page=1, end_page=0, member_id=None
     total_list = list()
     i = start_page
     limit = 48
-    offset = 0
-    is_json = False
     locale = "&lang=en"
     if br._locale is not None and len(br._locale) > 0:
         locale = f"&lang={br._locale}"
+    if not member_id:
+        # Issue #942
+        member_id = br._myId
 
-    while True:
-        if end_page != 0 and i > end_page:
-            print('Limit reached')
-            break
-        PixivHelper.print_and_log('info', f'Exporting page {i}')
-        if member_id:
-            is_json = True
-            offset = limit * (i - 1)
-            url = f'https://www.pixiv.net/ajax/user/{member_id}/following?offset={offset}&limit={limit}'
-        else:
-            # Issue #942
-            member_id = br._myId
-            is_json = True
-            url = f'https://www.pixiv.net/ajax/user/{member_id}/following?offset={offset}&limit={limit}'
+    def get_page(page_br, page_num):
+        offset = limit * (page_num - 1)
+        url = f'https://www.pixiv.net/ajax/user/{member_id}/following?offset={offset}&limit={limit}'
         if hide:
             url = url + "&rest=hide"
         else:
@@ -370,23 +392,61 @@ def get_bookmarks(caller, config, hide, start_page=1, end_page=0, member_id=None
 
         PixivHelper.print_and_log('info', f"Source URL: {url}")
 
-        page = br.open_with_retry(url)
+        page = page_br.open_with_retry(url)
         page_str = page.read().decode('utf8')
         page.close()
-
-        bookmarks = PixivBookmark.parseBookmark(page_str,
-                                                root_directory=config.rootDirectory,
-                                                db_path=config.dbPath,
-                                                locale=br._locale,
-                                                is_json=is_json)
-
-        if len(bookmarks) == 0:
-            print('No more data')
-            break
-        total_list.extend(bookmarks)
-        i = i + 1
-        print(str(len(bookmarks)), 'items')
-        PixivHelper.wait(config=config)
+        return page_str
+
+    def get_worker_page(page_num):
+        PixivHelper.throttle_request(config)
+        return get_page(PixivBrowserFactory.getWorkerBrowser(), page_num)
+
+    # once the first page tells the total, the next pages are fetched concurrently while
+    # the current page is parsed, and consumed in page order.
+    prefetched = dict()
+    prefetcher = None
+    last_page = 0
+    if config.maxConcurrentRequests > 1:
+        prefetcher = ThreadPoolExecutor(max_workers=config.maxConcurrentRequests, thread_name_prefix="bookmark_page")
+    try:
+        while True:
+            if end_page != 0 and i > end_page:
+                print('Limit reached')
+                break
+            PixivHelper.print_and_log('info', f'Exporting page {i}')
+            future = prefetched.pop(i, None)
+            if future is not None:
+                page_str = future.result()
+            else:
+                page_str = get_page(br, i)
+
+            bookmarks = PixivBookmark.parseBookmark(page_str,
+                                                    root_directory=config.rootDirectory,
+                                                    db_path=config.dbPath,
+                                                    locale=br._locale,
+                                                    is_json=True,
+                                                    db=caller.__dbManager__)
+
+            if len(bookmarks) == 0:
+                print('No more data')
+                break
+            total_list.extend(bookmarks)
+            print(str(len(bookmarks)), 'items')
+
+            if prefetcher is not None:
+                if i == start_page:
+                    last_page = (PixivBookmark.parseBookmarkTotal(page_str) + limit - 1) // limit
+                    if end_page != 0:
+                        last_page = min(last_page, end_page)
+                for page_num in range(i + 1, min(i + config.maxConcurrentRequests, last_page) + 1):
+                    if page_num not in prefetched:
+                        prefetched[page_num] = prefetcher.submit(get_worker_page, page_num)
+            else:
+                PixivHelper.wait(config=config)
+            i = i + 1
+    finally:
+        if prefetcher is not None:
+            prefetcher.shutdown(wait=False, cancel_futures=True)
     return total_list
 
 
@@ -1,13 +1,17 @@
 # -*- coding: utf-8 -*-
-import codecs
-import gc
+import atexit
+import http.client
 import os
+import queue
 import shlex
 import subprocess
 import sys
+import threading
 import time
 import traceback
 import urllib
+import zipfile
+from concurrent.futures import ThreadPoolExecutor
 
 import mechanize
 
@@ -18,6 +22,34 @@ import common.PixivHelper as PixivHelper
 from PixivDBManager import PixivDBManager
 from common.PixivException import PixivException
 
+_VERIFY_EXTENSIONS = (".jpg", ".png", ".gif", ".ugoira", ".zip")
+# leading signatures and end-of-stream markers checked by verify_image_fast()
+_VERIFY_MAGIC = {".jpg": (b"\xff\xd8\xff",),
+                 ".png": (b"\x89PNG\r\n\x1a\n",),
+                 ".gif": (b"GIF87a", b"GIF89a"),
+                 ".ugoira": (b"PK\x03\x04",),
+                 ".zip": (b"PK\x03\x04",)}
+_VERIFY_TRAILER = {".jpg": b"\xff\xd9",
+                   ".png": b"IEND\xaeB`\x82",
+                   ".gif": b"\x3b"}
+# end of central directory record + max comment length
+_ZIP_TAIL_SIZE = 22 + 65535
+# some encoders append padding or metadata after the end of image marker
+_TRAILER_SEARCH_SIZE = 4096
+# single byte trailer, found in almost any image data, so it must be the last byte before the NUL padding
+_TRAILER_AT_END = (".gif",)
+
+_verify_executor = None
+_verify_pending = []
+_verify_lock = threading.Lock()
+
+# seconds between fsync of the downloaded list
+DOWNLOAD_LIST_SYNC_INTERVAL = 5
+_download_list = None
+_download_list_synced = 0
+_download_list_lock = threading.Lock()
+_post_process_queue = None
+
 
 def download_image(caller,
                    url,
@@ -29,8 +61,10 @@ def download_image(caller,
                    image=None,
                    page=None,
                    notifier=None,
-                   download_from=PixivConstant.DOWNLOAD_PIXIV):
-    '''return download result and filename if ok'''
+                   download_from=PixivConstant.DOWNLOAD_PIXIV,
+                   response_headers=None):
+    '''return download result and filename if ok.
+    response_headers is filled with the ETag and Last-Modified of the download if given.'''
     # caller function/method
     # TODO: ideally to be removed or passed as argument
     db: PixivDBManager = caller.__dbManager__
@@ -176,7 +210,8 @@ def download_image(caller,
 
                 # actual download
                 notifier(type="DOWNLOAD", message=f"Start downloading {url} to {filename_save}")
-                (downloadedSize, filename_save) = perform_download(url, remote_file_size, filename_save, overwrite, config, referer)
+                (downloadedSize, filename_save) = perform_download(url, remote_file_size, filename_save, overwrite, config, referer,
+                                                                   response_headers=response_headers)
 
                 # double check after download, because the file might be deleted due to partial download
                 is_exists = os.path.isfile(filename_save)
@@ -216,73 +251,22 @@ def download_image(caller,
                         continue
                     return (PixivConstant.DOWNLOAD_FAILED_OTHER, filename_save)
 
-                elif config.verifyImage and filename_save.endswith((".jpg", ".png", ".gif")) and is_exists:
-                    fp = None
+                elif config.verifyImage and filename_save.endswith(_VERIFY_EXTENSIONS) and is_exists:
+                    if config.verifyImageMode == "full":
+                        # decode in the background, the result is collected by drain_image_verification()
+                        # and the file is only recorded once it is valid.
+                        PixivHelper.print_and_log('info', f' Download done ==> {filename_save}')
+                        _queue_image_verification(filename_save, lambda: _record_download(caller, config, filename_save))
+                        return (PixivConstant.PIXIVUTIL_OK, filename_save)
                     try:
-                        from PIL import Image, ImageFile
-                        fp = open(filename_save, "rb")
-                        # Fix Issue #269, refer to https://stackoverflow.com/a/42682508
-                        ImageFile.LOAD_TRUNCATED_IMAGES = True
-                        img = Image.open(fp)
-                        img.load()
-                        fp.close()
-                        PixivHelper.print_and_log('info', ' Image verified.')
+                        verify_image_fast(filename_save, downloadedSize)
                     except BaseException:
-                        if fp is not None:
-                            fp.close()
-                        PixivHelper.print_and_log('info', ' Image invalid, deleting...')
-                        os.remove(filename_save)
-                        raise
-                elif config.verifyImage and filename_save.endswith((".ugoira", ".zip")):
-                    fp = None
-                    try:
-                        import zipfile
-                        fp = open(filename_save, "rb")
-                        zf = zipfile.ZipFile(fp)
-                        check_result = None
-                        try:
-                            check_result = zf.testzip()
-                        # Issue #1165
-                        except NotImplementedError as ne:
-                            PixivHelper.print_and_log('warn', f' {ne}')
-                        except RuntimeError as e:
-                            if 'encrypted' in str(e):
-                                PixivHelper.print_and_log('info', ' archive is encrypted, cannot verify.')
-                            else:
-                                raise
-                        fp.close()
-                        if check_result is None:
-                            PixivHelper.print_and_log('info', ' Image verified.')
-                        else:
-                            PixivHelper.print_and_log('info', f' Corrupted file in archive: {check_result}.')
-                            raise PixivException(f"Incomplete Downloaded for {url}", PixivException.DOWNLOAD_FAILED_OTHER)
-                    except BaseException:
-                        if fp is not None:
-                            fp.close()
                         PixivHelper.print_and_log('info', ' Image invalid, deleting...')
                         os.remove(filename_save)
                         raise
+                    PixivHelper.print_and_log('info', ' Image verified.')
                 PixivHelper.print_and_log('info', f' Download done ==> {filename_save}')
-
-                # codecs.open is stateless, so if platform_encoding == utf-8-sig each new line starts from utf-8-sig
-                # this is bad and I feel bad
-
-                if os.path.isfile(caller.dfilename):
-                    dfile_encoding = 'utf-8'
-                else:
-                    dfile_encoding = caller.platform_encoding
-
-                # write to downloaded lists
-                if caller.start_iv or config.createDownloadLists:
-                    dfile = codecs.open(caller.dfilename, 'a+', encoding=dfile_encoding)
-                    dfile.write(filename_save + "\n")
-                    dfile.close()
-
-                # Issue #970
-                if config.enablePostProcessing and len(config.postProcessingCmd) > 0:
-                    cmd = config.postProcessingCmd.replace("%filename%", filename_save)
-                    PixivHelper.print_and_log('info', f'Running post processing command: {cmd}')
-                    subprocess.Popen(shlex.split(cmd), startupinfo=None)
+                _record_download(caller, config, filename_save)
 
                 return (PixivConstant.PIXIVUTIL_OK, filename_save)
 
@@ -328,7 +312,7 @@ def download_image(caller,
                 raise
 
 
-def perform_download(url, file_size, filename, overwrite, config, referer=None, notifier=None):
+def perform_download(url, file_size, filename, overwrite, config, referer=None, notifier=None, response_headers=None):
     if notifier is None:
         notifier = PixivHelper.dummy_notifier
 
@@ -340,6 +324,9 @@ def perform_download(url, file_size, filename, overwrite, config, referer=None,
     req = PixivHelper.create_custom_request(url, config, referer)
     br = PixivBrowserFactory.getBrowser(config=config)
     res = br.open_novisit(req)
+    if response_headers is not None:
+        response_headers["ETag"] = res.info().get("ETag")
+        response_headers["Last-Modified"] = res.info().get("Last-Modified")
     if file_size < 0:  # final check before download for download progress bar.
         try:
             content_length = res.info()['Content-Length']
@@ -350,10 +337,202 @@ def perform_download(url, file_size, filename, overwrite, config, referer=None,
             PixivHelper.print_and_log('info', "\tNo file size information!")
     (downloadedSize, filename) = PixivHelper.download_image(url, filename, res, file_size, overwrite)
     res.close()
-    gc.collect()
+    PixivHelper.check_memory()
     return (downloadedSize, filename)
 
 
+def _record_download(caller, config, filename):
+    # write to downloaded lists
+    if caller.start_iv or config.createDownloadLists:
+        write_download_list(caller.dfilename, filename, caller.platform_encoding)
+
+    # Issue #970
+    if config.enablePostProcessing and len(config.postProcessingCmd) > 0:
+        _queue_post_processing(config, filename)
+
+
+def verify_image_fast(filename, expected_size=-1):
+    '''Cheap integrity check without decoding: file size, magic bytes and end-of-stream marker.
+    Raise PixivException if the file is truncated or not what the extension says.'''
+    ext = os.path.splitext(filename)[1].lower()
+    size = os.path.getsize(filename)
+    if expected_size > 0 and size != expected_size:
+        raise PixivException(f"File size mismatch for {filename}: expected {expected_size}, got {size}",
+                             errorCode=PixivException.DOWNLOAD_FAILED_OTHER)
+
+    with open(filename, "rb") as fp:
+        header = fp.read(8)
+        if ext in (".ugoira", ".zip"):
+            fp.seek(max(0, size - _ZIP_TAIL_SIZE))
+            tail = fp.read()
+        else:
+            fp.seek(max(0, size - _TRAILER_SEARCH_SIZE))
+            tail = fp.read()
+
+    if not header.startswith(_VERIFY_MAGIC.get(ext, (b"",))):
+        raise PixivException(f"Unknown file signature for {filename}: {header!r}",
+                             errorCode=PixivException.DOWNLOAD_FAILED_OTHER)
+    if ext in (".ugoira", ".zip"):
+        if tail.rfind(b"PK\x05\x06") < 0:
+            raise PixivException(f"Missing zip end of central directory in {filename}",
+                                 errorCode=PixivException.DOWNLOAD_FAILED_OTHER)
+    elif ext in _TRAILER_AT_END and not tail.rstrip(b"\x00").endswith(_VERIFY_TRAILER[ext]):
+        raise PixivException(f"Missing end of image marker in {filename}",
+                             errorCode=PixivException.DOWNLOAD_FAILED_OTHER)
+    elif ext in _VERIFY_TRAILER and tail.rfind(_VERIFY_TRAILER[ext]) < 0:
+        raise PixivException(f"Missing end of image marker in {filename}",
+                             errorCode=PixivException.DOWNLOAD_FAILED_OTHER)
+
+
+def verify_image_full(filename):
+    '''Fully decode the image or test the archive members, raise on invalid file.'''
+    if filename.endswith((".ugoira", ".zip")):
+        with zipfile.ZipFile(filename) as zf:
+            check_result = None
+            try:
+                check_result = zf.testzip()
+            # Issue #1165
+            except NotImplementedError as ne:
+                PixivHelper.print_and_log('warn', f' {ne}')
+            except RuntimeError as e:
+                if 'encrypted' in str(e):
+                    PixivHelper.print_and_log('info', ' archive is encrypted, cannot verify.')
+                else:
+                    raise
+        if check_result is not None:
+            raise PixivException(f"Corrupted file in archive {filename}: {check_result}",
+                                 errorCode=PixivException.DOWNLOAD_FAILED_OTHER)
+    else:
+        from PIL import Image, ImageFile
+        # Fix Issue #269, refer to https://stackoverflow.com/a/42682508
+        ImageFile.LOAD_TRUNCATED_IMAGES = True
+        with open(filename, "rb") as fp:
+            img = Image.open(fp)
+            img.load()
+
+
+def _queue_image_verification(filename, on_valid=None):
+    global _verify_executor
+    with _verify_lock:
+        if _verify_executor is None:
+            _verify_executor = ThreadPoolExecutor(max_workers=min(4, os.cpu_count() or 1),
+                                                  thread_name_prefix="verify_image")
+        _verify_pending.append((filename, _verify_executor.submit(verify_image_full, filename), on_valid))
+
+
+def drain_image_verification():
+    '''Wait for the queued background verification, delete the invalid files
+    and return their filenames. The valid files are added to the downloaded list and post processing.'''
+    with _verify_lock:
+        pending = list(_verify_pending)
+        _verify_pending.clear()
+    invalid = list()
+    for (filename, future, on_valid) in pending:
+        try:
+            future.result()
+        except BaseException as ex:
+            PixivHelper.print_and_log('error', f' Image invalid, deleting {filename} ==> {ex}')
+            if os.path.exists(filename):
+                os.remove(filename)
+            invalid.append(filename)
+            continue
+        if on_valid is not None:
+            on_valid()
+    return invalid
+
+
+def write_download_list(dfilename, filename, encoding='utf-8'):
+    '''Append filename to the downloaded list, the file is kept open until close_download_list().'''
+    global _download_list
+    with _download_list_lock:
+        if _download_list is not None and _download_list.name != dfilename:
+            _close_download_list()
+        if _download_list is None:
+            # only new file get the BOM from utf-8-sig
+            if os.path.isfile(dfilename):
+                encoding = 'utf-8'
+            # no newline translation, the lines end with \n on Windows too, same as codecs.open()
+            _download_list = open(dfilename, 'a', encoding=encoding, newline='')
+        _download_list.write(filename + "\n")
+        if time.time() - _download_list_synced >= DOWNLOAD_LIST_SYNC_INTERVAL:
+            _sync_download_list()
+
+
+def close_download_list():
+    '''Flush and close the downloaded list, must be called before reading it e.g. by IrfanView.'''
+    with _download_list_lock:
+        _close_download_list()
+
+
+def _sync_download_list():
+    global _download_list_synced
+    _download_list.flush()
+    os.fsync(_download_list.fileno())
+    _download_list_synced = time.time()
+
+
+def _close_download_list():
+    global _download_list
+    if _download_list is not None:
+        _sync_download_list()
+        _download_list.close()
+        _download_list = None
+
+
+def _queue_post_processing(config, filename):
+    '''Run the post processing command in the background, at most [DownloadControl] postProcessingMaxProcesses
+    commands at a time. Block when the queue is full.'''
+    global _post_process_queue
+    if _post_process_queue is None:
+        workers = max(1, config.postProcessingMaxProcesses)
+        _post_process_queue = queue.Queue(maxsize=workers * max(1, config.postProcessingBatchSize) * 4)
+        for i in range(workers):
+            threading.Thread(target=_post_processing_worker,
+                             args=(_post_process_queue, config.postProcessingCmd, config.postProcessingBatchSize),
+                             name=f"post_processing_{i}",
+                             daemon=True).start()
+    _post_process_queue.put(filename)
+
+
+def _post_processing_worker(task_queue, cmd, batch_size):
+    # batching only possible if %filename% is a separate argument
+    args = shlex.split(cmd)
+    if "%filename%" not in args:
+        batch_size = 1
+    while True:
+        filenames = [task_queue.get()]
+        while len(filenames) < batch_size:
+            try:
+                filenames.append(task_queue.get_nowait())
+            except queue.Empty:
+                break
+        try:
+            if batch_size > 1:
+                index = args.index("%filename%")
+                command = args[:index] + filenames + args[index + 1:]
+            else:
+                command = shlex.split(cmd.replace("%filename%", filenames[0]))
+            PixivHelper.print_and_log('info', f'Running post processing command: {command}')
+            return_code = subprocess.Popen(command, startupinfo=None).wait()
+            if return_code != 0:
+                PixivHelper.print_and_log('warn', f'Post processing command exited with {return_code}: {command}')
+        except BaseException as ex:
+            PixivHelper.print_and_log('error', f'Failed to run post processing command for {filenames}: {ex}')
+        finally:
+            for _ in filenames:
+                task_queue.task_done()
+
+
+def drain_post_processing():
+    '''Wait for the queued post processing commands to finish.'''
+    if _post_process_queue is not None:
+        _post_process_queue.join()
+
+
+atexit.register(drain_post_processing)
+atexit.register(close_download_list)
+
+
 # issue #299
 def get_remote_filesize(url, referer, config, notifier=None):
     if notifier is None:
@@ -387,6 +566,39 @@ def get_remote_filesize(url, referer, config, notifier=None):
     return file_size
 
 
+def is_remote_file_modified(url, referer, config, etag=None, last_modified=None):
+    '''Send a conditional HEAD request, return False if the server replies 304 Not Modified.
+    Network errors are retried like download_image(), any failure is logged and reported as modified,
+    so the caller falls back to download_image().'''
+    retry_count = 0
+    while True:
+        req = PixivHelper.create_custom_request(url, config, referer, head=True)
+        if etag:
+            req.add_header("If-None-Match", etag)
+        if last_modified:
+            req.add_header("If-Modified-Since", last_modified)
+
+        try:
+            br = PixivBrowserFactory.getBrowser(config=config)
+            res = br.open_novisit(req)
+            res.close()
+            return True
+        except mechanize.HTTPError as e:
+            if int(e.code) == 304:
+                return False
+            PixivHelper.print_and_log('warn', f'[is_remote_file_modified()] HTTP Error: {e} at {url}')
+            if int(e.code) < 500:
+                return True
+        except (urllib.error.URLError, http.client.HTTPException, OSError) as e:
+            PixivHelper.print_and_log('warn', f'[is_remote_file_modified()] Error: {e} at {url}')
+
+        if retry_count >= config.retry:
+            return True
+        retry_count = retry_count + 1
+        PixivHelper.print_and_log(None, f"\rRetrying [{retry_count}]...", newline=False)
+        PixivHelper.print_delay(config.retryWait)
+
+
 def handle_ugoira(image, zip_filename, config, notifier):
     if image and not hasattr(image, 'create_ugoira'):  # for fanbox zips that can't resolve remote file size
         return
@@ -1,5 +1,5 @@
 # -*- coding: utf-8 -*-
-import os
+from concurrent.futures import ThreadPoolExecutor
 
 import common.datetime_z as datetime_z
 import common.PixivBrowserFactory as PixivBrowserFactory
@@ -12,7 +12,7 @@ import handler.PixivArtistHandler as PixivArtistHandler
 
 
 def process_fanbox_artist_by_id(caller, config, artist_id, end_page, title_prefix=""):
-    config.loadConfig(path=caller.configfile)
+    config.loadConfig(path=caller.configfile, force=False)
     br: PixivBrowserFactory.PixivBrowser = PixivBrowserFactory.getBrowser()
 
     caller.set_console_title(title_prefix)
@@ -43,49 +43,95 @@ def process_fanbox_artist_by_id(caller, config, artist_id, end_page, title_prefi
     current_page = 1
     next_url = None
     image_count = 1
-    while True:
-        PixivHelper.print_and_log("info", "Processing {0}, page {1}".format(artist, current_page))
-        caller.set_console_title(f"{title_prefix} {artist}, page {current_page}")
+    next_page = None
+    # the next page is fetched while the posts of the current page are downloaded
+    with ThreadPoolExecutor(max_workers=1, thread_name_prefix="fanbox_page") as prefetcher:
+        while True:
+            PixivHelper.print_and_log("info", "Processing {0}, page {1}".format(artist, current_page))
+            caller.set_console_title(f"{title_prefix} {artist}, page {current_page}")
+            try:
+                if next_page is not None:
+                    posts = artist.parsePosts(next_page.result())
+                else:
+                    posts = br.fanboxGetPostsFromArtist(artist, next_url)
+            except PixivException as pex:
+                PixivHelper.print_and_log("error", "Error getting FANBOX posts of artist: {0} ==> {1}".format(artist, pex.message))
+                break
+
+            next_page = None
+            if artist.hasNextPage and artist.nextUrl and not 0 < end_page <= current_page:
+                next_page = prefetcher.submit(_get_posts_page, artist, artist.nextUrl)
+
+            post_details = _get_post_details(config, caller.__dbManager__, posts)
+            for post in posts:
+                print("#{0}".format(image_count))
+                post.printPost()
+
+                # images
+                if post.type in PixivModelFanbox.FanboxPost._supportedType:
+                    try:
+                        process_fanbox_post(caller, config, post, artist, post_details.get(post.imageId))
+                    except KeyboardInterrupt:
+                        choice = input("Keyboard Interrupt detected, continue to next post? (Y/N)").rstrip("\r")
+                        if choice.upper() == 'N':
+                            PixivHelper.print_and_log("info", f"FANBOX artist: {artist}, processing aborted")
+                            return
+                        else:
+                            continue
+                else:
+                    PixivHelper.print_and_log("info", f"Unsupported post type: {post.imageId} => {post.type}")
+                image_count += 1
+                PixivHelper.wait(config=config)
+
+            if not artist.hasNextPage:
+                PixivHelper.print_and_log("info", "No more post for {0}".format(artist))
+                break
+            current_page += 1
+            if 0 < end_page < current_page:
+                PixivHelper.print_and_log("info", "Reaching page limit for {0}, limit {1}".format(artist, end_page))
+                break
+            next_url = artist.nextUrl
+            if next_url is None:
+                PixivHelper.print_and_log("info", "No more next page for {0}".format(artist))
+                break
+
+
+def _get_posts_page(artist, next_url):
+    return PixivBrowserFactory.getWorkerBrowser().fanboxGetPostsPageFromArtist(artist, next_url)
+
+
+def _is_post_processed(config, db, post: PixivModelFanbox.FanboxPost):
+    if config.checkDBProcessHistory:
+        result = db.selectPostByPostId(post.imageId)
+        if result:
+            updated_date = result[5]
+            if updated_date is not None and post.updatedDateDatetime <= datetime_z.parse_datetime(updated_date):
+                return True
+    return False
+
+
+def _get_post_details(config, db, posts):
+    ''' Get the details of the posts to be downloaded, up to [Network] maxConcurrentRequests at a time
+    and spaced by [Network] downloadDelay.
+    Return dict of post id => post json or the exception raised when getting it. '''
+    pending = [post for post in posts
+               if post.type in PixivModelFanbox.FanboxPost._supportedType
+               and not post.is_restricted
+               and not _is_post_processed(config, db, post)]
+
+    def get_post_json(post):
         try:
-            posts = br.fanboxGetPostsFromArtist(artist, next_url)
-        except PixivException as pex:
-            PixivHelper.print_and_log("error", "Error getting FANBOX posts of artist: {0} ==> {1}".format(artist, pex.message))
-            break
-
-        for post in posts:
-            print("#{0}".format(image_count))
-            post.printPost()
-
-            # images
-            if post.type in PixivModelFanbox.FanboxPost._supportedType:
-                try:
-                    process_fanbox_post(caller, config, post, artist)
-                except KeyboardInterrupt:
-                    choice = input("Keyboard Interrupt detected, continue to next post? (Y/N)").rstrip("\r")
-                    if choice.upper() == 'N':
-                        PixivHelper.print_and_log("info", f"FANBOX artist: {artist}, processing aborted")
-                        return
-                    else:
-                        continue
-            else:
-                PixivHelper.print_and_log("info", f"Unsupported post type: {post.imageId} => {post.type}")
-            image_count += 1
-            PixivHelper.wait(config=config)
-
-        if not artist.hasNextPage:
-            PixivHelper.print_and_log("info", "No more post for {0}".format(artist))
-            break
-        current_page += 1
-        if 0 < end_page < current_page:
-            PixivHelper.print_and_log("info", "Reaching page limit for {0}, limit {1}".format(artist, end_page))
-            break
-        next_url = artist.nextUrl
-        if next_url is None:
-            PixivHelper.print_and_log("info", "No more next page for {0}".format(artist))
-            break
-
-
-def process_fanbox_post(caller, config, post: PixivModelFanbox.FanboxPost, artist):
+            PixivHelper.throttle_request(config)
+            return PixivBrowserFactory.getWorkerBrowser().fanboxGetPostJsonById(post.imageId, post.parent)
+        # PixivException is a BaseException, not an Exception
+        except (Exception, PixivException) as ex:
+            return ex
+
+    results = PixivHelper.concurrent_map(get_post_json, pending)
+    return {post.imageId: result for (post, result) in zip(pending, results)}
+
+
+def process_fanbox_post(caller, config, post: PixivModelFanbox.FanboxPost, artist, post_json=None):
     # caller function/method
     # TODO: ideally to be removed or passed as argument
     db = caller.__dbManager__
@@ -95,17 +141,14 @@ def process_fanbox_post(caller, config, post: PixivModelFanbox.FanboxPost, artis
 
     post_files = []
 
-    flag_processed = False
-    if config.checkDBProcessHistory:
-        result = db.selectPostByPostId(post.imageId)
-        if result:
-            updated_date = result[5]
-            if updated_date is not None and post.updatedDateDatetime <= datetime_z.parse_datetime(updated_date):
-                flag_processed = True
+    flag_processed = _is_post_processed(config, db, post)
 
     try:
         if not post.is_restricted and not flag_processed:
-            br.fanboxUpdatePost(post)
+            # post_json is prefetched by process_fanbox_artist_by_id()
+            if isinstance(post_json, BaseException):
+                raise post_json
+            br.fanboxUpdatePost(post, post_json)
 
         if ((not post.is_restricted) or config.downloadCoverWhenRestricted) and (not flag_processed) and config.downloadCover:
             # cover image
@@ -221,15 +264,17 @@ def process_fanbox_post(caller, config, post: PixivModelFanbox.FanboxPost, artis
             post.WriteInfo(filename + ".txt")
         if config.writeHtml:
             if post.type == "article" or (len(post.images) >= config.minImageCountForNonArticle and len(post.body_text) > config.minTextLengthForNonArticle):
-                html_template = PixivConstant.HTML_TEMPLATE
-                if os.path.isfile("template.html"):
-                    reader = PixivHelper.open_text_file("template.html")
-                    html_template = reader.read()
-                    reader.close()
+                html_template = PixivHelper.read_text_file_cached("template.html", PixivConstant.HTML_TEMPLATE)
                 post.WriteHtml(html_template, config.useAbsolutePathsInHtml, filename + ".html")
 
         if config.writeUrlInDescription:
             PixivHelper.write_url_in_description(post, config.urlBlacklistRegex, config.urlDumpFilename)
+
+        # don't mark the post as processed, so the invalid files are downloaded again
+        invalid_files = PixivDownloadHandler.drain_image_verification()
+        if len(invalid_files) > 0:
+            post_files = [f for f in post_files if f[2] not in invalid_files]
+            return
     finally:
         if len(post_files) > 0:
             db.insertPostImages(post_files)
@@ -239,7 +284,7 @@ def process_fanbox_post(caller, config, post: PixivModelFanbox.FanboxPost, artis
 
 def process_pixiv_by_fanbox_id(caller, config, artist_id, start_page=1, end_page=0, tags=None, title_prefix=""):
     # Implement #1005
-    config.loadConfig(path=caller.configfile)
+    config.loadConfig(path=caller.configfile, force=False)
     br = PixivBrowserFactory.getBrowser()
 
     caller.set_console_title(title_prefix)
@@ -1,6 +1,5 @@
 # -*- coding: utf-8 -*-
 import datetime
-import gc
 import os
 import re
 import sys
@@ -8,7 +7,7 @@ import shutil
 import tempfile
 import time
 import traceback
-import pathlib
+from concurrent.futures import ProcessPoolExecutor
 from typing import Dict
 from urllib.error import URLError
 import zipfile
@@ -117,7 +116,7 @@ def process_image(caller,
         # skip if already recorded in db and alwaysCheckFileSize is disabled and overwrite is disabled.
         if in_db and not config.alwaysCheckFileSize and not config.overwrite and not reencoding:
             PixivHelper.print_and_log(None, f'Already downloaded in DB: {image_id}')
-            gc.collect()
+            PixivHelper.check_memory()
             return PixivConstant.PIXIVUTIL_SKIP_DUPLICATE_NO_WAIT
 
         # get the medium page
@@ -560,10 +559,15 @@ def process_image(caller,
                         # trim _pXXX for manga
                         json_filename = re.sub(r'_p?\d+$', '', json_filename)
                     json_filename = PixivHelper.sanitize_filename(json_filename + ".json", target_dir)
-                    image.WriteSeriesData(image.seriesNavData['seriesId'], caller.__seriesDownloaded, json_filename)
+                    image.WriteSeriesData(image.seriesNavData['seriesId'], caller.__seriesDownloaded, json_filename, db)
                 if config.writeImageXMP and not config.writeImageXMPPerImage:
                     image.WriteXMP(info_filename[:-8] + ".xmp", config.useTranslatedTag, config.tagTranslationLocale)
 
+            # collect the background verification before the files are used or recorded
+            invalid_files = [os.path.basename(f) for f in PixivDownloadHandler.drain_image_verification()]
+            if any(os.path.basename(f[2]) in invalid_files for f in manga_files):
+                result = PixivConstant.PIXIVUTIL_NOT_OK
+
             if image.imageMode == 'ugoira_view':
                 if config.writeUgoiraInfo:
                     image.WriteUgoiraData(filename + ".js")
@@ -682,7 +686,7 @@ def process_image(caller,
             del image
         if parse_medium_page is not None:
             del parse_medium_page
-        gc.collect()
+        PixivHelper.check_memory()
 
         return result
     except Exception as ex:
@@ -767,116 +771,204 @@ def process_manga_series(caller,
         raise
 
 
+def _scan_ugoira_local(directory):
+    ''' Walk the directory once and return the .ugoira and .zip files, ugoira first then zip.'''
+    found = {"ugoira": list(), "zip": list()}
+    stack = [directory]
+    while stack:
+        current = stack.pop()
+        try:
+            with os.scandir(current) as it:
+                for entry in it:
+                    if entry.is_dir(follow_symlinks=False):
+                        stack.append(entry.path)
+                    elif entry.name.endswith(".ugoira"):
+                        found["ugoira"].append(entry.path)
+                    elif entry.name.endswith(".zip"):
+                        found["zip"].append(entry.path)
+        except OSError as ex:
+            PixivHelper.print_and_log('warn', f"Cannot scan {current}: {ex}")
+    return [(path, extension) for extension in ["ugoira", "zip"] for path in sorted(found[extension])]
+
+
+def _prepare_ugoira_reencode(zip_name, zip_dir, config):
+    ''' Move the old animated files to a temp folder, return the temp folder.'''
+    PixivHelper.print_and_log("info", "Deleting old animated files ...", newline=False)
+    d = PixivHelper.create_temp_dir(prefix="reencoding")
+
+    # List and move all files related to the image_id
+    for file in os.listdir(zip_dir):
+        if os.path.isfile(os.path.join(zip_dir, file)) and zip_name in file:
+            file_basename = os.path.basename(file)
+            file_ext = os.path.splitext(file_basename)[1]
+            if ((("gif" in file_ext) and (config.createGif))
+               or (("mkv" in file_ext) and (config.createMkv))
+               or (("png" in file_ext) and (config.createApng))
+               or (("avif" in file_ext) and (config.createAvif))
+               or (("webm" in file_ext) and (config.createWebm))
+               or (("webp" in file_ext) and (config.createWebp))
+               or (("ugoira" in file_ext) and (config.createUgoira))
+               or ("zip" in file_ext)):
+                abs_file_path = os.path.abspath(os.path.join(zip_dir, file))
+                PixivHelper.print_and_log("debug", f"Moving {abs_file_path} to {d}")
+                if ("zip" in file_ext) or ("ugoira" in file_ext):
+                    shutil.copy2(abs_file_path, os.path.join(d, file_basename))
+                else:
+                    shutil.move(abs_file_path, os.path.join(d, file_basename))
+    PixivHelper.print_and_log(None, " done.")
+    return d
+
+
+def _reencode_ugoira_local(zip, zip_name, zip_dir, image_id, config):
+    ''' Re-encode the .ugoira without online infos, return the temp folder and the result.
+        Executed in the worker process when reencodeWorkers > 1.'''
+    d = _prepare_ugoira_reencode(zip_name, zip_dir, config)
+    res = None
+    try:
+        msg = Fore.YELLOW + Style.NORMAL + f'Processing Image Id: {image_id}' + Style.RESET_ALL
+        PixivHelper.print_and_log(None, msg)
+        PixivDownloadHandler.handle_ugoira(None, zip, config, None)
+        res = PixivConstant.PIXIVUTIL_OK
+    except PixivException as ex:
+        PixivHelper.print_and_log('error', f'PixivException for Image ID ({image_id}): {ex}')
+        PixivHelper.print_and_log('error', f'Stack Trace: {sys.exc_info()}')
+        res = PixivConstant.PIXIVUTIL_NOT_OK
+    except Exception as ex:
+        PixivHelper.print_and_log('error', f'Exception for Image ID ({image_id}): {ex}')
+        PixivHelper.print_and_log('error', f'Stack Trace: {sys.exc_info()}')
+        exc_type, exc_value, exc_traceback = sys.exc_info()
+        traceback.print_exception(exc_type, exc_value, exc_traceback)
+        res = PixivConstant.PIXIVUTIL_NOT_OK
+    finally:
+        if res == PixivConstant.PIXIVUTIL_NOT_OK:
+            PixivHelper.print_and_log('warn', f'Failed to process Image ID {image_id} locally: will retry with online infos')
+            PixivHelper.print_and_log('debug', f'Removing corrupted ugoira {zip}')
+            os.remove(zip)
+    return (d, res)
+
+
+def _finish_ugoira_reencode(caller, config, zip_dir, image_id, extension, res, d):
+    ''' Process with online infos if needed, then restore the old animated files which are not re-encoded.'''
+    # Process artwork with online infos
+    if "zip" in extension or res == PixivConstant.PIXIVUTIL_NOT_OK or ("ugoira" in extension and config.overwrite):
+        res = process_image(caller,
+                            config,
+                            artist=None,
+                            image_id=image_id,
+                            useblacklist=False,
+                            reencoding=True)
+        if res == PixivConstant.PIXIVUTIL_NOT_OK:
+            PixivHelper.print_and_log("warn", f"Cannot process Image Id: {image_id}, restoring old animated files...", newline=False)
+            for file_name in os.listdir(d):
+                PixivHelper.print_and_log("debug", f"Moving back {os.path.join(d, file_name)} to {os.path.join(zip_dir, file_name)}")
+                shutil.move(os.path.join(d, file_name), os.path.join(zip_dir, file_name))  # overwrite corrupted file generated
+            PixivHelper.print_and_log(None, " done.")
+            print('')
+
+    # Checking result
+    list_file_zipdir = os.listdir(zip_dir)
+    for file_name in os.listdir(d):
+        file_ext = os.path.splitext(file_name)[1]
+        if file_name not in list_file_zipdir and config.backupOldFile:
+            if ((config.createUgoira and not config.deleteUgoira and "ugoira" in file_ext)
+                 or (not config.deleteZipFile and "zip" in file_ext)
+                 or (config.createGif and "gif" in file_ext)
+                 or (config.createApng and "png" in file_ext)
+                 or (config.createAvif and "avif" in file_ext)
+                 or (config.createWebm and "webm" in file_ext)
+                 or (config.createWebp and "webp" in file_ext)):
+                split_name = file_name.rsplit(".", 1)
+                new_name = file_name + "." + str(int(time.time()))
+                if len(split_name) == 2:
+                    new_name = split_name[0] + "." + str(int(time.time())) + "." + split_name[1]
+                PixivHelper.print_and_log('warn', f"Could not found the animated file re-encoded ==> {file_name}, backing up to: {new_name}")
+                PixivHelper.print_and_log('warn', "The new encoded file may have another name or the artist may have change its name.")
+                PixivHelper.print_and_log("debug", f"Rename and move {os.path.join(d, file_name)} to {os.path.join(zip_dir, new_name)}")
+                shutil.move(os.path.join(d, file_name), os.path.join(zip_dir, new_name))
+    print('')
+
+    # Delete temp path
+    if os.path.exists(d) and d != "":
+        PixivHelper.print_and_log("debug", f"Deleting path {d}")
+        shutil.rmtree(d)
+
+
+def _restore_ugoira_reencode(zip_dir, d):
+    ''' Move back the old animated files of an interrupted re-encoding, then delete the temp folder.'''
+    for file_name in os.listdir(d):
+        if not os.path.exists(os.path.join(zip_dir, file_name)):
+            PixivHelper.print_and_log("debug", f"Moving back {os.path.join(d, file_name)} to {os.path.join(zip_dir, file_name)}")
+            shutil.move(os.path.join(d, file_name), os.path.join(zip_dir, file_name))
+    PixivHelper.print_and_log("debug", f"Deleting path {d} in finally")
+    shutil.rmtree(d)
+
+
 def process_ugoira_local(caller, config):
     directory = config.rootDirectory
     counter = 0
     d = ""
-    res = None
-    counter = 0
-    list_done = list()
+    checkpoint_file = os.path.join(directory, PixivConstant.PIXIVUTIL_UGOIRA_CHECKPOINT)
+    executor = None
+    pending = list()
+    jobs = dict()
+    d_zip_dir = ""
 
     try:
         print('')
-        for extension in ["ugoira", "zip"]:  # always ugoira then zip
-            for zip in pathlib.Path(directory).rglob(f'*.{extension}'):
-                zip_name = os.path.splitext(os.path.basename(zip))[0]
-                zip_dir = os.path.dirname(zip)
-                image_id = zip_name.partition("_")[0]
-                if 'ugoira' in zip_name and image_id not in list_done:
-                    counter += 1
-                    PixivHelper.print_and_log(None, f"# Ugoira {counter}")
-                    PixivHelper.print_and_log("info", "Deleting old animated files ...", newline=False)
-                    d = PixivHelper.create_temp_dir(prefix="reencoding")
-
-                    # List and move all files related to the image_id
-                    for file in os.listdir(zip_dir):
-                        if os.path.isfile(os.path.join(zip_dir, file)) and zip_name in file:
-                            file_basename = os.path.basename(file)
-                            file_ext = os.path.splitext(file_basename)[1]
-                            if ((("gif" in file_ext) and (config.createGif))
-                               or (("mkv" in file_ext) and (config.createMkv))
-                               or (("png" in file_ext) and (config.createApng))
-                               or (("avif" in file_ext) and (config.createAvif))
-                               or (("webm" in file_ext) and (config.createWebm))
-                               or (("webp" in file_ext) and (config.createWebp))
-                               or (("ugoira" in file_ext) and (config.createUgoira))
-                               or ("zip" in file_ext)):
-                                abs_file_path = os.path.abspath(os.path.join(zip_dir, file))
-                                PixivHelper.print_and_log("debug", f"Moving {abs_file_path} to {d}")
-                                if ("zip" in file_ext) or ("ugoira" in file_ext):
-                                    shutil.copy2(abs_file_path, os.path.join(d, file_basename))
-                                else:
-                                    shutil.move(abs_file_path, os.path.join(d, file_basename))
-                    PixivHelper.print_and_log(None, " done.")
-
-                    # Process artwork locally
-                    if "ugoira" in extension and not config.overwrite:
-                        try:
-                            msg = Fore.YELLOW + Style.NORMAL + f'Processing Image Id: {image_id}' + Style.RESET_ALL
-                            PixivHelper.print_and_log(None, msg)
-                            PixivDownloadHandler.handle_ugoira(None, str(zip), config, None)
-                            res = PixivConstant.PIXIVUTIL_OK
-                        except PixivException as ex:
-                            PixivHelper.print_and_log('error', f'PixivException for Image ID ({image_id}): {ex}')
-                            PixivHelper.print_and_log('error', f'Stack Trace: {sys.exc_info()}')
-                            res = PixivConstant.PIXIVUTIL_NOT_OK
-                        except Exception as ex:
-                            PixivHelper.print_and_log('error', f'Exception for Image ID ({image_id}): {ex}')
-                            PixivHelper.print_and_log('error', f'Stack Trace: {sys.exc_info()}')
-                            exc_type, exc_value, exc_traceback = sys.exc_info()
-                            traceback.print_exception(exc_type, exc_value, exc_traceback)
-                            res = PixivConstant.PIXIVUTIL_NOT_OK
-                        finally:
-                            if res == PixivConstant.PIXIVUTIL_NOT_OK:
-                                PixivHelper.print_and_log('warn', f'Failed to process Image ID {image_id} locally: will retry with online infos')
-                                PixivHelper.print_and_log('debug', f'Removing corrupted ugoira {zip}')
-                                os.remove(zip)
-
-                    # Process artwork with online infos
-                    if "zip" in extension or res == PixivConstant.PIXIVUTIL_NOT_OK or ("ugoira" in extension and config.overwrite):
-                        res = process_image(caller,
-                                            config,
-                                            artist=None,
-                                            image_id=image_id,
-                                            useblacklist=False,
-                                            reencoding=True)
-                        if res == PixivConstant.PIXIVUTIL_NOT_OK:
-                            PixivHelper.print_and_log("warn", f"Cannot process Image Id: {image_id}, restoring old animated files...", newline=False)
-                            for file_name in os.listdir(d):
-                                PixivHelper.print_and_log("debug", f"Moving back {os.path.join(d, file_name)} to {os.path.join(zip_dir, file_name)}")
-                                shutil.move(os.path.join(d, file_name), os.path.join(zip_dir, file_name))  # overwrite corrupted file generated
-                            PixivHelper.print_and_log(None, " done.")
-                            print('')
-
-                    # Checking result
-                    list_file_zipdir = os.listdir(zip_dir)
-                    for file_name in os.listdir(d):
-                        file_ext = os.path.splitext(file_name)[1]
-                        if file_name not in list_file_zipdir and config.backupOldFile:
-                            if ((config.createUgoira and not config.deleteUgoira and "ugoira" in file_ext)
-                                 or (not config.deleteZipFile and "zip" in file_ext)
-                                 or (config.createGif and "gif" in file_ext)
-                                 or (config.createApng and "png" in file_ext)
-                                 or (config.createAvif and "avif" in file_ext)
-                                 or (config.createWebm and "webm" in file_ext)
-                                 or (config.createWebp and "webp" in file_ext)):
-                                split_name = file_name.rsplit(".", 1)
-                                new_name = file_name + "." + str(int(time.time()))
-                                if len(split_name) == 2:
-                                    new_name = split_name[0] + "." + str(int(time.time())) + "." + split_name[1]
-                                PixivHelper.print_and_log('warn', f"Could not found the animated file re-encoded ==> {file_name}, backing up to: {new_name}")
-                                PixivHelper.print_and_log('warn', "The new encoded file may have another name or the artist may have change its name.")
-                                PixivHelper.print_and_log("debug", f"Rename and move {os.path.join(d, file_name)} to {os.path.join(zip_dir, new_name)}")
-                                shutil.move(os.path.join(d, file_name), os.path.join(zip_dir, new_name))
-                    print('')
-
-                    # Delete temp path
-                    if os.path.exists(d) and d != "":
-                        PixivHelper.print_and_log("debug", f"Deleting path {d}")
-                        shutil.rmtree(d)
-                    list_done.append(image_id)
+        # resume the previous interrupted run
+        set_done = set()
+        if os.path.isfile(checkpoint_file):
+            with open(checkpoint_file, "r", encoding="utf-8") as reader:
+                set_done = set(line.strip() for line in reader if len(line.strip()) > 0)
+            PixivHelper.print_and_log("info", f"Resuming from {checkpoint_file}, skipping {len(set_done)} processed image(s).")
+
+        workers = config.reencodeWorkers if config.reencodeWorkers > 0 else (os.cpu_count() or 1)
+        if workers > 1:
+            executor = ProcessPoolExecutor(max_workers=workers, initializer=PixivHelper.set_config, initargs=(config,))
+
+        for (zip, extension) in _scan_ugoira_local(directory):
+            zip_name = os.path.splitext(os.path.basename(zip))[0]
+            zip_dir = os.path.dirname(zip)
+            image_id = zip_name.partition("_")[0]
+            if 'ugoira' in zip_name and image_id not in set_done:
+                set_done.add(image_id)
+                pending.append((zip, zip_name, zip_dir, image_id, extension))
+
+        def can_run_in_worker(index):
+            return executor is not None and "ugoira" in pending[index][4] and not config.overwrite
+
+        # queue the local re-encoding to the worker pool, the online processing stay in the main process.
+        # each job moves the old animated files away, so only keep about one job per worker ahead.
+        submitted = 0
+        with open(checkpoint_file, "a", encoding="utf-8") as checkpoint:
+            for (index, (zip, zip_name, zip_dir, image_id, extension)) in enumerate(pending):
+                while submitted < len(pending) and submitted < index + workers:
+                    if can_run_in_worker(submitted):
+                        jobs[submitted] = executor.submit(_reencode_ugoira_local, *pending[submitted][:4], config)
+                    submitted += 1
+
+                counter += 1
+                PixivHelper.print_and_log(None, f"# Ugoira {counter}")
+                res = None
+                d_zip_dir = zip_dir
+                job = jobs.pop(index, None)
+                if job is not None:
+                    (d, res) = job.result()
+                elif "ugoira" in extension and not config.overwrite:
+                    (d, res) = _reencode_ugoira_local(zip, zip_name, zip_dir, image_id, config)
+                else:
+                    d = _prepare_ugoira_reencode(zip_name, zip_dir, config)
+
+                _finish_ugoira_reencode(caller, config, zip_dir, image_id, extension, res, d)
+                d = ""
+                checkpoint.write(f"{image_id}\n")
+                checkpoint.flush()
+
         if counter == 0:
             PixivHelper.print_and_log('info', "No zip file or ugoira found to re-encode animated files.")
+        # all done, next run will start from the beginning
+        if os.path.exists(checkpoint_file):
+            os.remove(checkpoint_file)
 
     except Exception as ex:
         if isinstance(ex, KeyboardInterrupt):
@@ -885,6 +977,11 @@ def process_ugoira_local(caller, config):
         PixivHelper.print_and_log('error', 'failed')
         raise
     finally:
-        if os.path.exists(d) and d != "":
-            PixivHelper.print_and_log("debug", f"Deleting path {d} in finally")
-            shutil.rmtree(d)
+        if executor is not None:
+            executor.shutdown(wait=True, cancel_futures=True)
+            # put back the old animated files moved by the jobs which are not processed further
+            for (index, job) in jobs.items():
+                if not job.cancelled() and job.exception() is None:
+                    _restore_ugoira_reencode(pending[index][2], job.result()[0])
+        if d != "" and os.path.exists(d):
+            _restore_ugoira_reencode(d_zip_dir, d)
@@ -5,7 +5,7 @@ import handler.PixivArtistHandler as PixivArtistHandler
 import common.PixivHelper as PixivHelper
 import handler.PixivSketchHandler as PixivSketchHandler
 import handler.PixivTagsHandler as PixivTagsHandler
-from model.PixivListItem import PixivListItem
+from model.PixivListItem import PixivListItem, member_ignore_list
 from model.PixivTags import PixivTags
 
 
@@ -27,15 +27,9 @@ def process_list(caller, config, list_file_name=None, tags=None, include_sketch=
             PixivHelper.print_and_log('info', f'Processing from list file: {list_file_name}')
             result = PixivListItem.parseList(list_file_name, config.rootDirectory)
 
-        ignore_file_list = "ignore_list.txt"
-        if os.path.exists(ignore_file_list):
-            PixivHelper.print_and_log('info', f'Processing ignore list for member: {ignore_file_list}')
-            ignore_list = PixivListItem.parseList(ignore_file_list, config.rootDirectory)
-            for ignore in ignore_list:
-                for item in result:
-                    if item.memberId == ignore.memberId:
-                        result.remove(item)
-                        break
+        if os.path.exists(member_ignore_list.filename):
+            PixivHelper.print_and_log('info', f'Processing ignore list for member: {member_ignore_list.filename}')
+            result = member_ignore_list.filter(result, rootDir=config.rootDirectory)
 
         PixivHelper.print_and_log('info', f"Found {len(result)} items.")
         current_member = 1
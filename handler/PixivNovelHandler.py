@@ -1,8 +1,10 @@
+import math
 import os
 import time
 
 from colorama.ansi import Fore, Style
 
+import common.PixivBrowserFactory as PixivBrowserFactory
 import common.PixivConstant as PixivConstant
 import common.PixivHelper as PixivHelper
 import model.PixivNovel as PixivNovel
@@ -26,6 +28,14 @@ def process_novel(caller,
         return
 
     novel = caller.__br__.getNovelPage(novel_id)
+    filename = _get_novel_filename(config, novel)
+    if _write_novel(config, novel, filename):
+        caller.__dbManager__.insertNovelPost(novel, filename)
+
+    print()
+
+
+def _get_novel_filename(config, novel):
     PixivHelper.print_and_log(None, f"Title : {novel.imageTitle}")
     PixivHelper.print_and_log(None, f'Member Name  : {novel.artist.artistName}')
     PixivHelper.print_and_log(None, f'Member Avatar: {novel.artist.artistAvatar}')
@@ -38,7 +48,7 @@ def process_novel(caller,
     PixivHelper.print_and_log(None, f"Bookmark Count : {novel.bookmark_count}")
 
     # fake the fileUrl
-    fileUrl = f"https://www.pixiv.net/ajax/novel/{novel_id}.html"
+    fileUrl = f"https://www.pixiv.net/ajax/novel/{novel.novel_id}.html"
     filename = PixivHelper.make_filename(config.filenameFormatNovel,
                                          novel,
                                          tagsSeparator=config.tagsSeparator,
@@ -50,7 +60,11 @@ def process_novel(caller,
                                          tagTranslationLocale=config.tagTranslationLocale)
     filename = PixivHelper.sanitize_filename(filename, config.rootDirectory)
     PixivHelper.print_and_log(None, f"Filename : {filename}")
+    return filename
 
+
+def _write_novel(config, novel, filename):
+    ''' Save the novel to filename, return False if the local file is already up to date. '''
     # checking logic
     if os.path.exists(filename):
         if config.checkLastModified:
@@ -58,7 +72,7 @@ def process_novel(caller,
             remote_timestamp = time.mktime(novel.worksDateDateTime.timetuple())
             if local_timestamp == remote_timestamp:
                 PixivHelper.print_and_log('warn', f"\rLocal file timestamp match with remote: {filename} => {novel.worksDateDateTime}")
-                return
+                return False
         if config.alwaysCheckFileSize:
             temp_filename = filename + ".!tmp"
             novel.write_content(temp_filename)
@@ -75,10 +89,7 @@ def process_novel(caller,
     if config.setLastModified and filename is not None and os.path.isfile(filename):
         ts = time.mktime(novel.worksDateDateTime.timetuple())
         os.utime(filename, (ts, ts))
-
-    caller.__dbManager__.insertNovelPost(novel, filename)
-
-    print()
+    return True
 
 
 def process_novel_series(caller,
@@ -96,23 +107,61 @@ def process_novel_series(caller,
     PixivHelper.print_and_log(None, f'Series Name : {novel_series.series_name}')
     PixivHelper.print_and_log(None, f'Total Novel : {novel_series.total}')
 
-    page = start_page
-    flag = True
-    while (flag):
-        PixivHelper.print_and_log(None, f"Getting page = {page}")
-        novel_series = caller.__br__.getNovelSeriesContent(novel_series, current_page=page)
-        if end_page > 0 and page > end_page:
-            PixivHelper.print_and_log(None, f"Page limit reached = {end_page}.")
-            flag = False
-        if (page * PixivNovel.MAX_LIMIT) >= novel_series.total:
-            PixivHelper.print_and_log(None, "No more novel.")
-            flag = False
-        page = page + 1
-
-    for novel in novel_series.series_list:
-        process_novel(caller,
-                      config,
-                      novel_id=novel["id"],
-                      notifier=notifier)
+    # the series pages are independent, get them up to [Network] maxConcurrentRequests at a time
+    # and spaced by [Network] downloadDelay
+    last_page = math.ceil(novel_series.total / PixivNovel.MAX_LIMIT)
+    if end_page > 0:
+        last_page = min(last_page, end_page + 1)
+    pages = list(range(start_page, max(start_page, last_page) + 1))
+    PixivHelper.print_and_log(None, f"Getting page = {pages[0]} to {pages[-1]}")
+    def get_page(page):
+        PixivHelper.throttle_request(config)
+        return PixivBrowserFactory.getWorkerBrowser().getNovelSeriesContentPage(novel_series.series_id, current_page=page)
+    responses = PixivHelper.concurrent_map(get_page, pages)
+    for (page, response) in zip(pages, responses):
+        novel_series.parse_series_content(response, page)
+
+    novel_ids = [novel["id"] for novel in novel_series.series_list]
+    downloaded = dict()
+    if not config.overwrite and not config.checkLastModified and not config.alwaysCheckFileSize:
+        downloaded = caller.__dbManager__.selectNovelSaveNamesByPostIds(novel_ids)
+    pending = [novel_id for novel_id in novel_ids if int(novel_id) not in downloaded]
+
+    def get_novel(novel_id):
+        try:
+            PixivHelper.throttle_request(config)
+            return PixivBrowserFactory.getWorkerBrowser().getNovelPage(novel_id)
+        except BaseException as ex:
+            return ex
+    novels = dict(zip(pending, PixivHelper.concurrent_map(get_novel, pending)))
+
+    to_write = list()
+    error = None
+    for novel_id in novel_ids:
+        msg = Fore.YELLOW + Style.BRIGHT + f'Processing Novel details: {novel_id}' + Style.RESET_ALL
+        PixivHelper.print_and_log('info', msg)
+        if int(novel_id) in downloaded:
+            PixivHelper.print_and_log('warn', f"Novel already downloaded : {downloaded[int(novel_id)]}")
+            continue
+        novel = novels[novel_id]
+        if isinstance(novel, BaseException):
+            # same as the serial version, stop at the first failure after saving the previous novels
+            error = novel
+            break
+        to_write.append((novel, _get_novel_filename(config, novel)))
+        print()
+
+    # novels with the same filename (e.g. filenameFormatNovel without %image_id%) are written one after another
+    same_filename = dict()
+    for (index, (novel, filename)) in enumerate(to_write):
+        same_filename.setdefault(filename, list()).append(index)
+    written = set()
+    for indexes in PixivHelper.concurrent_map(lambda group: [index for index in group if _write_novel(config, *to_write[index])],
+                                              list(same_filename.values())):
+        written.update(indexes)
+    caller.__dbManager__.insertNovelPosts([item for (index, item) in enumerate(to_write) if index in written])
+
+    if error is not None:
+        raise error
 
     print()
@@ -9,7 +9,7 @@ import common.PixivException as PixivException
 import common.PixivHelper as PixivHelper
 import handler.PixivImageHandler as PixivImageHandler
 from common.PixivBrowserFactory import PixivBrowser
-from model.PixivListItem import PixivListItem
+from model.PixivListItem import member_ignore_list
 
 
 def process_ranking(caller, config, mode, content, start_page=1, end_page=0, date="", filter=None, notifier=None):
@@ -32,15 +32,9 @@ def process_ranking(caller, config, mode, content, start_page=1, end_page=0, dat
             print(f"Next Page: {ranks.next_page}")
             print(f"Next Date: {ranks.next_date}")
 
-            ignore_file_list = "ignore_list.txt"
-            if os.path.exists(ignore_file_list):
-                PixivHelper.print_and_log('info', f'Using ignore list for member: {ignore_file_list}')
-                ignore_list = PixivListItem.parseList(ignore_file_list, config.rootDirectory)
-                for ignore in ignore_list:
-                    for item in ranks.contents:
-                        if item["user_id"] == ignore.memberId:
-                            ranks.remove(item)
-                            break
+            if os.path.exists(member_ignore_list.filename):
+                PixivHelper.print_and_log('info', f'Using ignore list for member: {member_ignore_list.filename}')
+                ranks.contents = member_ignore_list.filter(ranks.contents, lambda item: item["user_id"], config.rootDirectory)
 
             for post in ranks.contents:
                 try:
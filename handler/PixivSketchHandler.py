@@ -1,5 +1,4 @@
 # -*- coding: utf-8 -*-
-import gc
 import sys
 import traceback
 
@@ -13,7 +12,7 @@ from common.PixivException import PixivException
 
 
 def process_sketch_post(caller, config, post_id):
-    config.loadConfig(path=caller.configfile)
+    config.loadConfig(path=caller.configfile, force=False)
     br = PixivBrowserFactory.getBrowser()
 
     msg = Fore.YELLOW + Style.NORMAL + f'Processing Post Id: {post_id}' + Style.RESET_ALL
@@ -33,7 +32,7 @@ def process_sketch_post(caller, config, post_id):
 
 
 def process_sketch_artists(caller, config, artist_id, start_page=1, end_page=0, title_prefix=None):
-    config.loadConfig(path=caller.configfile)
+    config.loadConfig(path=caller.configfile, force=False)
     br = PixivBrowserFactory.getBrowser()
     if title_prefix is None:
         title_prefix = f"Pixiv Sketch - Processing Artist Id: {artist_id}"
@@ -44,31 +43,40 @@ def process_sketch_artists(caller, config, artist_id, start_page=1, end_page=0,
     PixivHelper.print_and_log(None, msg)
 
     try:
-        artist = br.sketch_get_posts_by_artist_id(artist_id, end_page)
+        artist = br.sketch_get_artist_by_artist_id(artist_id)
 
-        # check if have posts
-        if len(artist.posts) == 0:
-            PixivHelper.print_and_log('warn', f'No images for Artist Id: {artist_id}')
-            return
+        # posts are sorted from the newest, so stop at the first downloaded post (post ids are not sequential)
+        downloaded_post_ids = None
+        if not config.overwrite:
+            downloaded_post_ids = caller.__dbManager__.selectSketchPostIdsByMemberId(artist.artistId)
 
         POST_PER_PAGE = 10
         start_idx = POST_PER_PAGE * (start_page - 1)
         end_idx = POST_PER_PAGE * (end_page)
-        if end_page == 0 or end_idx > len(artist.posts):
-            end_idx = len(artist.posts)
-        msg = Fore.YELLOW + Style.NORMAL + f'Processing from post #{start_idx} to #{end_idx}' + Style.RESET_ALL
-        PixivHelper.print_and_log(None, msg)
-        post_to_process = artist.posts[start_idx:end_idx]
+        msg = f'Processing from post #{start_idx}'
+        if end_page != 0:
+            msg = f'{msg} to #{end_idx}'
+        PixivHelper.print_and_log(None, Fore.YELLOW + Style.NORMAL + msg + Style.RESET_ALL)
 
         current_post = 1
-        for item in post_to_process:
-            caller.set_console_title(f"{title_prefix} - Post {current_post} of {len(post_to_process)}")
+        for (idx, item) in enumerate(br.sketch_get_posts_by_artist(artist_id, artist, end_page, downloaded_post_ids)):
+            if idx < start_idx:
+                continue
+            if end_page != 0 and idx >= end_idx:
+                break
+            caller.set_console_title(f"{title_prefix} - Post {current_post}")
             PixivHelper.print_and_log(None, f'Post #: {current_post}')
             PixivHelper.print_and_log('info', f'Post ID   : {item.imageId}')
             tags_str = ', '.join(item.imageTags)
             PixivHelper.print_and_log('info', f'Tags   : {tags_str}')
             download_post(caller, config, item)
             current_post = current_post + 1
+
+        # check if have posts
+        if len(artist.posts) == 0:
+            PixivHelper.print_and_log('warn', f'No images for Artist Id: {artist_id}')
+        elif current_post == 1:
+            PixivHelper.print_and_log('info', f'No new posts for Artist Id: {artist_id}')
     except PixivException as pex:
         PixivHelper.print_and_log("error", f"Failed to process PixivSketch for {artist_id}, maybe doesn't have PixivSketch? ==> {pex.message}")
     except Exception as ex:
@@ -89,11 +97,12 @@ def download_post(caller, config, post):
         if result:
             msg = Fore.YELLOW + Style.NORMAL + f'Skipping Post: {post.imageId} because already exists in DB and overwrite and alwaysCheckFileSize are disabled.' + Style.RESET_ALL
             PixivHelper.print_and_log(None, msg)
-            gc.collect()
+            PixivHelper.check_memory()
             return PixivConstant.PIXIVUTIL_SKIP_DUPLICATE_NO_WAIT
 
     referer = f"https://sketch.pixiv.net/items/{post.imageId}"
     current_page = 0
+    downloaded = list()
     for url in post.imageUrls:
         filename = PixivHelper.make_filename(config.filenameFormatSketch,
                                              post,
@@ -119,11 +128,17 @@ def download_post(caller, config, post):
                                                                  image=post,
                                                                  download_from=PixivConstant.DOWNLOAD_SKETCH)
         if result == PixivConstant.PIXIVUTIL_OK:
-            db.insertSketchPost(post)
-            db.insertSketchPostImages(post.imageId,
-                                      current_page,
-                                      filename,
-                                      post.worksDateDateTime,
-                                      post.worksUpdateDateTime)
+            downloaded.append((current_page, filename))
 
         current_page = current_page + 1
+
+    invalid_files = PixivDownloadHandler.drain_image_verification()
+    for (page, filename) in downloaded:
+        if filename in invalid_files:
+            continue
+        db.insertSketchPost(post)
+        db.insertSketchPostImages(post.imageId,
+                                  page,
+                                  filename,
+                                  post.worksDateDateTime,
+                                  post.worksUpdateDateTime)
@@ -1,9 +1,10 @@
 # -*- coding: utf-8 -*-
-import gc
 import http.client
+import math
 import os
 import sys
 import time
+from concurrent.futures import ThreadPoolExecutor
 
 import common.PixivBrowserFactory as PixivBrowserFactory
 import common.PixivConstant as PixivConstant
@@ -11,6 +12,9 @@ import common.PixivHelper as PixivHelper
 import handler.PixivImageHandler as PixivImageHandler
 from model.PixivTags import PixivTags
 
+# the search result is limited to 1000 pages
+MAX_SEARCH_PAGE = 1000
+
 
 def process_tags(caller,
                  config,
@@ -35,6 +39,7 @@ def process_tags(caller,
     i = page
     updated_limit_count = 0
     empty_page_retry = 0
+    prefetcher = None
 
     try:
         search_tags = PixivHelper.decode_tags(tags)
@@ -58,24 +63,51 @@ def process_tags(caller,
         start_offset = (page - 1) * offset
         stop_offset = end_page * offset
 
+        def get_page(page_num, page_end_date):
+            # spaced by downloadDelay with the other prefetched pages
+            PixivHelper.throttle_request(config)
+            return PixivBrowserFactory.getWorkerBrowser().getSearchTagPage(tags,
+                                                                           page_num,
+                                                                           wild_card=wild_card,
+                                                                           title_caption=title_caption,
+                                                                           start_date=start_date,
+                                                                           end_date=page_end_date,
+                                                                           member_id=member_id,
+                                                                           sort_order=sort_order,
+                                                                           start_page=page,
+                                                                           use_bookmark_data=use_bookmark_data,
+                                                                           bookmark_count=bookmark_count,
+                                                                           type_mode=type_mode,
+                                                                           r18mode=config.r18mode)
+
+        # once the first page gives the total, the next result pages are fetched concurrently
+        # while the images are processed, and consumed in page order.
+        prefetched = dict()
+        prefetch_window = config.maxConcurrentRequests * 2
+        last_page = 0
+        if config.maxConcurrentRequests > 1 and member_id is None:
+            prefetcher = ThreadPoolExecutor(max_workers=config.maxConcurrentRequests, thread_name_prefix="tags_page")
+        seen_image_ids = set()
+
         PixivHelper.print_and_log('info', f'Searching for: ({search_tags}) {tags} with partial match = {wild_card} and title/caption = {title_caption}')
         flag = True
         while flag:
-            (t, search_page) = PixivBrowserFactory.getBrowser().getSearchTagPage(tags,
-                                                                                 i,
-                                                                                 wild_card=wild_card,
-                                                                                 title_caption=title_caption,
-                                                                                 start_date=start_date,
-                                                                                 end_date=end_date,
-                                                                                 member_id=member_id,
-                                                                                 sort_order=sort_order,
-                                                                                 start_page=page,
-                                                                                 use_bookmark_data=use_bookmark_data,
-                                                                                 bookmark_count=bookmark_count,
-                                                                                 type_mode=type_mode,
-                                                                                 r18mode=config.r18mode)
+            future = prefetched.pop(i, None)
+            if future is not None:
+                (t, search_page) = future.result()
+            else:
+                (t, search_page) = get_page(i, end_date)
+                if prefetcher is not None and last_page == 0 and t.availableImages > 0:
+                    last_page = min(math.ceil(t.availableImages / PixivTags.POSTS_PER_PAGE), MAX_SEARCH_PAGE)
+                    if end_page != 0:
+                        last_page = min(last_page, end_page)
+            if prefetcher is not None:
+                for page_num in range(i + 1, min(i + prefetch_window, last_page) + 1):
+                    if page_num not in prefetched:
+                        prefetched[page_num] = prefetcher.submit(get_page, page_num, end_date)
 
             PixivHelper.print_and_log("info", f'Found {len(t.itemList)} images for page {i}.')
+            new_items = [x for x in t.itemList if x.imageId not in seen_image_ids]
             if len(t.itemList) == 0:
                 # Issue #1090
                 # check if the available images matching with current page * PixivTags.POSTS_PER_PAGE
@@ -90,22 +122,25 @@ def process_tags(caller,
                     PixivHelper.print_delay(delay)
                     empty_page_retry = empty_page_retry + 1
                     PixivBrowserFactory.getBrowser().addheaders = [('User-agent', f'{config.useragent}{int(time.time())}')]
+                    # the pages fetched ahead are as stale as this one, get them again after the wait
+                    for future in prefetched.values():
+                        future.cancel()
+                    prefetched.clear()
+                    PixivBrowserFactory.PixivBrowser.trim_cache()
                     continue
                 else:
                     PixivHelper.print_and_log("warn", 'No more images.')
                     flag = False
-            elif _last_search_result is not None:
-                set1 = set((x.imageId) for x in _last_search_result.itemList)
-                difference = [x for x in t.itemList if (x.imageId) not in set1]
-                if len(difference) == 0:
-                    PixivHelper.print_and_log("warn", 'Getting duplicated result set, no more new images.')
-                    flag = False
+            elif len(new_items) == 0:
+                PixivHelper.print_and_log("warn", 'Getting duplicated result set, no more new images.')
+                flag = False
 
             if flag:
                 # Issue #1090 reset retry flag on succesfull load
                 empty_page_retry = 0
+                seen_image_ids.update(x.imageId for x in new_items)
 
-                for item in t.itemList:
+                for item in new_items:
                     last_image_id = item.imageId
                     PixivHelper.print_and_log(None, f'Image #{images}')
                     PixivHelper.print_and_log(None, f'Image Id: {item.imageId}')
@@ -170,7 +205,7 @@ def process_tags(caller,
                             PixivHelper.print_and_log(None, f"Skipping tags: {tags}")
                             PixivBrowserFactory.getBrowser().clear_history()
                             return
-                        gc.collect()
+                        PixivHelper.check_memory()
                         continue
                     elif result == PixivConstant.PIXIVUTIL_KEYBOARD_INTERRUPT:
                         choice = input("Keyboard Interrupt detected, continue to next image (Y/N)").rstrip("\r")
@@ -202,6 +237,11 @@ def process_tags(caller,
                     # _start_date = image.worksDateDateTime + datetime.timedelta(365)
                     # hit the last page
                     i = 1
+                    # the prefetched pages are for the previous end date
+                    for future in prefetched.values():
+                        future.cancel()
+                    prefetched.clear()
+                    last_page = 0
                     end_date = _last_date.strftime("%Y-%m-%d")
                     PixivHelper.print_and_log('info', f"Hit page 1000, looping back to page 1 with ecd: {end_date}.")
                     flag = True
@@ -225,3 +265,6 @@ def process_tags(caller,
         except BaseException:
             PixivHelper.print_and_log('error', f'Cannot dump page for search tags: {search_tags}')
         raise
+    finally:
+        if prefetcher is not None:
+            prefetcher.shutdown(wait=False, cancel_futures=True)
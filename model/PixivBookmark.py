@@ -17,12 +17,12 @@ class PixivBookmark(object):
     # __re_imageULItemsClass = re.compile(r".*\b_image-items\b.*")
 
     @staticmethod
-    def parseBookmark(page, root_directory, db_path, locale='', is_json=False):
-        '''Parse favorite artist page'''
-        from PixivDBManager import PixivDBManager
-        bookmarks = list()
+    def parseBookmark(page, root_directory, db_path, locale='', is_json=False, db=None):
+        '''Parse favorite artist page, db is opened from db_path if not given'''
         result2 = list()
-        db = PixivDBManager(root_directory=root_directory, target=db_path)
+        if db is None:
+            from PixivDBManager import PixivDBManager
+            db = PixivDBManager(root_directory=root_directory, target=db_path)
 
         if is_json:
             parsed = json.loads(page)
@@ -49,12 +49,15 @@ class PixivBookmark(object):
             parse_page.decompose()
             del parse_page
 
-        for r in result2:
-            item = db.selectMemberByMemberId2(r)
-            bookmarks.append(item)
-
+        bookmarks = db.selectMembersByMemberIds(result2)
         return bookmarks
 
+    @staticmethod
+    def parseBookmarkTotal(page):
+        '''Return the total of followed users from the json page, 0 if not available'''
+        parsed = json.loads(page)
+        return int(parsed["body"].get("total", 0))
+
     @staticmethod
     def parseImageBookmark(page, image_tags_filter=None):
         total_images = 0
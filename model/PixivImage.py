@@ -4,7 +4,6 @@ import codecs
 import collections
 import json
 import os
-import re
 import shutil
 import zipfile
 from urllib.parse import unquote
@@ -21,13 +20,12 @@ from common.PixivException import PixivException
 
 
 class PixivTagData(object):
-    tag = ""
-    romaji = None
-    translation_data = None
+    __slots__ = ("tag", "romaji", "translation_data")
 
     def __init__(self, tag, tag_node):
         super().__init__()
         self.tag = tag
+        self.translation_data = None
         if tag_node is not None:
             if "romaji" in tag_node:
                 self.romaji = tag_node["romaji"]
@@ -47,45 +45,20 @@ class PixivTagData(object):
 
 class PixivImage (object):
     '''Class for parsing image page, including manga page and big image.'''
-    artist = None
-    originalArtist = None
-    imageId = 0
-    imageTitle = ""
-    imageCaption = ""
-    imageTags = []
-    imageMode = ""
-    imageUrls = []
-    imageResizedUrls = []
-    worksDate = ""
-    worksResolution = ""
-    seriesNavData = {}
-    rawJSON = {}
-    jd_rtv = 0
-    jd_rtc = 0
-    # jd_rtt = 0
-    imageCount = 0
-    fromBookmark = False
-    worksDateDateTime = datetime.fromordinal(1)
-    js_createDate = None
-    bookmark_count = -1
-    image_response_count = -1
-    ugoira_data = ""
-    dateFormat = None
-    descriptionUrlList = []
-    __re_caption = re.compile("caption")
-    _tzInfo = None
+    # one instance per processed image, keep it small and without shared mutable defaults
+    __slots__ = ("artist", "originalArtist", "imageId", "imageTitle", "imageCaption", "imageTags", "imageMode",
+                 "imageUrls", "imageResizedUrls", "worksDate", "worksResolution", "worksTools", "seriesNavData",
+                 "rawJSON", "jd_rtv", "jd_rtc", "jd_rtt", "imageCount", "fromBookmark", "worksDateDateTime",
+                 "js_createDate", "bookmark_count", "image_response_count", "ugoira_data", "dateFormat",
+                 "descriptionUrlList", "_tzInfo", "tags", "stripHTMLTagsFromCaption",
+                 "manga_series_order", "manga_series_parent",
+                 "translated_work_title", "translated_work_caption", "ai_type")
+
     tags: list[PixivTagData]
 
     # only applicable for manga series
-    manga_series_order: int = -1
-    manga_series_parent = None
-
-    # Issue #1064 titleCaptionTranslation
-    translated_work_title = ""
-    translated_work_caption = ""
-
-    # Issue #1189
-    ai_type = -1
+    manga_series_order: int
+    manga_series_parent: PixivMangaSeries
 
     def __init__(self,
                  iid=0,
@@ -101,11 +74,29 @@ class PixivImage (object):
                  writeRawJSON=False,
                  stripHTMLTagsFromCaption=False):
         self.artist = parent
+        self.originalArtist = None
         self.fromBookmark = fromBookmark
         self.bookmark_count = bookmark_count
+        self.image_response_count = -1
         self.imageId = iid
+        self.imageTitle = ""
+        self.imageCaption = ""
+        self.imageTags = []
+        self.imageMode = ""
         self.imageUrls = []
         self.imageResizedUrls = []
+        self.worksDate = ""
+        self.worksResolution = ""
+        self.worksTools = ""
+        self.seriesNavData = {}
+        self.rawJSON = {}
+        self.jd_rtv = 0
+        self.jd_rtc = 0
+        self.jd_rtt = 0
+        self.imageCount = 0
+        self.worksDateDateTime = datetime.fromordinal(1)
+        self.js_createDate = None
+        self.ugoira_data = ""
         self.dateFormat = dateFormat
         self.descriptionUrlList = []
         self._tzInfo = tzInfo
@@ -115,9 +106,13 @@ class PixivImage (object):
         self.manga_series_order = manga_series_order
         self.manga_series_parent = manga_series_parent
 
+        # Issue #1064 titleCaptionTranslation
         self.translated_work_title = ""
         self.translated_work_caption = ""
 
+        # Issue #1189
+        self.ai_type = -1
+
         if page is not None:
             payload = json.loads(page)  # https://www.pixiv.net/ajax/illust/{image_id}?lang=en
             # check error
@@ -274,6 +269,9 @@ class PixivImage (object):
                 self.imageTags.insert(0, "AI-generated")
 
     def parse_url_from_caption(self, caption_to_parse):
+        # most captions have no links, no need to build the html tree for them
+        if "<a" not in caption_to_parse and "<A" not in caption_to_parse:
+            return
         parsed = BeautifulSoup(caption_to_parse, features="html5lib")
         links = parsed.find_all('a')
         if links is not None and len(links) > 0:
@@ -488,78 +486,58 @@ class PixivImage (object):
             info.close()
 
     def WriteXMP(self, filename, use_translated_tag, locale):
-        import pyexiv2
-        # import tempfile
-
-        # need to use temp file due to bad unicode support for pyexiv2 in windows
-        d = PixivHelper.create_temp_dir(prefix="xmp")
-        tempname = f"{d}/{self.imageId}.xmp"
-
-        info = codecs.open(tempname, 'wb', encoding='utf-8')
-
-        # Create the XMP file template.
-        info.write('<?xpacket begin="" id=""?>\n<x:xmpmeta xmlns:x="adobe:ns:meta/" x:xmptk="XMP Core 4.4.0-Exiv2">\n</x:xmpmeta>\n<?xpacket end="w"?>\n')
-        info.close()
-
-        # Reopen file using pyexiv2
-        # newer version e.g. pyexiv2-2.7.0
-        info = pyexiv2.Image(tempname)
-        info_dict = info.read_xmp()
         assert (self.artist is not None)
-        info_dict['Xmp.dc.creator'] = [self.artist.artistName]
+        info = [("dc:creator", [self.artist.artistName])]
         # Check array isn't empty.
         if self.imageTitle:
-            info_dict['Xmp.dc.title'] = self.imageTitle
+            info.append(("dc:title", self.imageTitle))
         # Check array isn't empty.
         if self.imageCaption:
-            info_dict['Xmp.dc.description'] = self.imageCaption
+            info.append(("dc:description", self.imageCaption))
         # Check array isn't empty.
         if self.imageTags:
             # Feature #1216
             if use_translated_tag:
-                info_dict['Xmp.dc.subject'] = self.get_translated_tags(locale)
+                info.append(("dc:subject", self.get_translated_tags(locale)))
             else:
-                info_dict['Xmp.dc.subject'] = self.imageTags
-        info_dict['Xmp.dc.date'] = [self.worksDateDateTime]
-        info_dict['Xmp.dc.source'] = f"http://www.pixiv.net/en/artworks/{self.imageId}"
-        info_dict['Xmp.dc.identifier'] = self.imageId
+                info.append(("dc:subject", self.imageTags))
+        info.append(("dc:date", [self.worksDateDateTime]))
+        info.append(("dc:source", f"http://www.pixiv.net/en/artworks/{self.imageId}"))
+        info.append(("dc:identifier", self.imageId))
 
         # Custom 'pixiv' namespace for non-standard details.
-        pyexiv2.registerNs('http://pixiv.com/', 'pixiv')
-
-        info_dict['Xmp.pixiv.artist_id'] = self.artist.artistId
-        info_dict['Xmp.pixiv.image_mode'] = self.imageMode
-        info_dict['Xmp.pixiv.pages'] = self.imageCount
-        info_dict['Xmp.pixiv.resolution'] = self.worksResolution
-        info_dict['Xmp.pixiv.bookmark_count'] = self.bookmark_count
+        info.append(("pixiv:artist_id", self.artist.artistId))
+        info.append(("pixiv:image_mode", self.imageMode))
+        info.append(("pixiv:pages", self.imageCount))
+        info.append(("pixiv:resolution", self.worksResolution))
+        info.append(("pixiv:bookmark_count", self.bookmark_count))
 
         if self.seriesNavData:
-            info_dict['Xmp.pixiv.series_title'] = self.seriesNavData['title']
-            info_dict['Xmp.pixiv.series_order'] = self.seriesNavData['order']
-            info_dict['Xmp.pixiv.series_id'] = self.seriesNavData['seriesId']
+            info.append(("pixiv:series_title", self.seriesNavData['title']))
+            info.append(("pixiv:series_order", self.seriesNavData['order']))
+            info.append(("pixiv:series_id", self.seriesNavData['seriesId']))
         if self.ugoira_data:
-            info_dict['Xmp.pixiv.ugoira_data'] = self.ugoira_data
+            info.append(("pixiv:ugoira_data", self.ugoira_data))
         if len(self.descriptionUrlList) > 0:
-            info_dict['Xmp.pixiv.urls'] = ", ".join(self.descriptionUrlList)
+            info.append(("pixiv:urls", ", ".join(self.descriptionUrlList)))
         # Issue #1064
         if len(self.translated_work_title) > 0:
-            info_dict['Xmp.pixiv.translated_work_title'] = self.translated_work_title
+            info.append(("pixiv:translated_work_title", self.translated_work_title))
         if len(self.translated_work_caption) > 0:
-            info_dict['Xmp.pixiv.translated_work_caption'] = self.translated_work_caption
-        info.modify_xmp(info_dict)
-        info.close()
+            info.append(("pixiv:translated_work_caption", self.translated_work_caption))
 
-        # rename to actual file
+        # the packet is serialized in memory, no need for pyexiv2 and a temp dir.
+        packet = PixivHelper.create_xmp_packet(info)
         try:
             # Issue #421 ensure subdir exists.
             PixivHelper.makeSubdirs(filename)
-            shutil.move(tempname, filename)
+            PixivHelper.write_file_atomic(filename, packet)
         except IOError:
-            shutil.move(tempname, f"{self.imageId}.xmp")
+            PixivHelper.write_file_atomic(f"{self.imageId}.xmp", packet)
             PixivHelper.get_logger().exception("Error when saving image info: %s, file is saved to: %s.xmp", filename, str(self.imageId))
 
-    def WriteSeriesData(self, seriesId, seriesDownloaded, filename):
-        from common.PixivBrowserFactory import getBrowser
+    def WriteSeriesData(self, seriesId, seriesDownloaded, filename, db=None):
+        from common.PixivBrowserFactory import getBrowser, getWorkerBrowser
         br = getBrowser()
         try:
             # Issue #421 ensure subdir exists.
@@ -569,14 +547,30 @@ class PixivImage (object):
             outfile = codecs.open("Series " + str(seriesId) + ".json", 'w', encoding='utf-8')
             PixivHelper.get_logger().exception("Error when saving image info: %s, file is saved to: %s.json", filename, "Series " + str(seriesId) + ".json")
         receivedJSON = json.loads(br.getMangaSeriesJson(seriesId, 1))
-        jsondata = receivedJSON["body"]["illustSeries"][0]
-        jsondata.update(receivedJSON["body"]["page"])
-        pages = jsondata["total"] // 12 + 2
-        for x in range(2, pages):
-            receivedJSON = json.loads(br.getMangaSeriesJson(seriesId, x))
-            jsondata["series"].extend(receivedJSON["body"]["page"]["series"])
-        for x in ["recentUpdatedWorkIds", "otherSeriesId", "seriesId", "isSetCover", "firstIllustId", "coverImageSl", "url"]:
-            del jsondata[x]
+        update_date = receivedJSON["body"]["illustSeries"][0].get("updateDate")
+
+        # reuse the merged series from the previous run if the series is not updated
+        jsondata = None
+        if db is not None and update_date is not None:
+            jsondata = db.selectSeriesJson(seriesId, update_date)
+            if jsondata is not None and jsondata.get("total") != receivedJSON["body"]["page"]["total"]:
+                jsondata = None
+
+        if jsondata is None:
+            jsondata = receivedJSON["body"]["illustSeries"][0]
+            jsondata.update(receivedJSON["body"]["page"])
+            pages = jsondata["total"] // 12 + 2
+            # the remaining pages are fetched concurrently, but merged in page order
+            def get_page(x):
+                PixivHelper.throttle_request()
+                return json.loads(getWorkerBrowser().getMangaSeriesJson(seriesId, x))
+
+            for page_json in PixivHelper.concurrent_map(get_page, range(2, pages)):
+                jsondata["series"].extend(page_json["body"]["page"]["series"])
+            for x in ["recentUpdatedWorkIds", "otherSeriesId", "seriesId", "isSetCover", "firstIllustId", "coverImageSl", "url"]:
+                del jsondata[x]
+            if db is not None and update_date is not None:
+                db.updateSeriesJson(seriesId, jsondata.get("title"), jsondata, update_date)
         outfile.write(json.dumps(jsondata, ensure_ascii=False))
         outfile.close()
         seriesDownloaded.append(seriesId)
@@ -643,6 +637,8 @@ class PixivMangaSeries:
     def __init__(self, manga_series_id: int, current_page: int, payload: str):
         self.manga_series_id = manga_series_id
         self.current_page = current_page
+        self.pages_with_order = []
+        self.images = []
 
         if payload is not None:
             js = json.loads(payload)
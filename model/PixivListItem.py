@@ -106,3 +106,41 @@ class PixivListItem(object):
 
         reader.close()
         return members
+
+
+class MemberFilter(object):
+    '''Set of member ids to skip, read from a list file (e.g. ignore_list.txt).
+    The file is parsed again only when it is modified.'''
+    filename = ""
+    memberIds = frozenset()
+
+    def __init__(self, filename):
+        self.filename = filename
+        self.memberIds = frozenset()
+        self.__file_stat = None
+
+    def load(self, rootDir=None):
+        '''Return the member ids, empty if the file doesn't exist.'''
+        try:
+            st = os.stat(self.filename)
+            file_stat = (st.st_mtime_ns, st.st_size)
+        except OSError:
+            self.memberIds = frozenset()
+            self.__file_stat = None
+            return self.memberIds
+
+        if file_stat != self.__file_stat:
+            self.memberIds = frozenset(item.memberId for item in PixivListItem.parseList(self.filename, rootDir))
+            self.__file_stat = file_stat
+        return self.memberIds
+
+    def filter(self, items, get_member_id=lambda item: item.memberId, rootDir=None):
+        '''Return the items whose member id is not in the list.'''
+        member_ids = self.load(rootDir)
+        if len(member_ids) == 0:
+            return list(items)
+        return [item for item in items if get_member_id(item) not in member_ids]
+
+
+# shared by the member list and ranking processing
+member_ignore_list = MemberFilter("ignore_list.txt")
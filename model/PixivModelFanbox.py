@@ -18,48 +18,46 @@ _url_pattern = re.compile("(https?|ftp|file)://[-A-Za-z0-9+&@#/%?=~_|!:,.;]+[-A-
 
 
 class FanboxPost(object):
-    imageId = 0
-    imageTitle = ""
-    coverImageUrl = ""
-    worksDate = ""
-    worksDateDateTime = None
-    updatedDate = ""
-    updatedDateDatetime = None
+    __slots__ = ("imageId", "imageTitle", "coverImageUrl", "worksDate", "worksDateDateTime",
+                 "updatedDate", "updatedDateDatetime", "type", "body_text", "images", "likeCount",
+                 "parent", "is_restricted", "feeRequired", "imageMode", "imageCount", "_tzInfo",
+                 "linkToFile", "worksResolution", "worksTools", "searchTags", "imageTags",
+                 "bookmark_count", "image_response_count", "embeddedFiles", "provider",
+                 "descriptionUrlList")
+
     # image|text|file|article|video|entry
     _supportedType = ["image", "text", "file", "article", "video", "entry"]
-    type = ""
-    body_text = ""
-    images = None
-    likeCount = 0
-    parent = None
-    is_restricted = False
-    feeRequired = 0
-    # compatibility
-    imageMode = ""
-    imageCount = 0
-    _tzInfo = None
-
-    linkToFile = None
-
-    # not implemented
-    worksResolution = ""
-    worksTools = ""
-    searchTags = ""
-    imageTags = list()
-    bookmark_count = 0
-    image_response_count = 0
-
-    embeddedFiles = None
-    provider = None
-    # 949
-    descriptionUrlList = None
 
     def __init__(self, post_id, parent, page, tzInfo=None):
         self.images = list()
         self.embeddedFiles = list()
         self.imageId = int(post_id)
+        self.imageTitle = ""
+        self.coverImageUrl = ""
+        self.worksDate = ""
+        self.worksDateDateTime = None
+        self.updatedDate = ""
+        self.updatedDateDatetime = None
+        self.type = ""
+        self.body_text = ""
+        self.likeCount = 0
         self.parent = parent
+        self.is_restricted = False
+        self.feeRequired = 0
+        # compatibility
+        self.imageMode = ""
+        self.imageCount = 0
         self._tzInfo = tzInfo
+
+        # not implemented
+        self.worksResolution = ""
+        self.worksTools = ""
+        self.searchTags = ""
+        self.imageTags = list()
+        self.bookmark_count = 0
+        self.image_response_count = 0
+
+        self.provider = None
         # 949
         self.descriptionUrlList = list()
         self.linkToFile = dict()
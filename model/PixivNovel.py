@@ -1,4 +1,5 @@
 import codecs
+import functools
 import json
 from datetime import datetime
 import common.datetime_z as datetime_z
@@ -10,6 +11,12 @@ from model.PixivImage import PixivTagData
 MAX_LIMIT = 10
 
 
+@functools.lru_cache(maxsize=1)
+def _read_novel_template():
+    with open("novel_template.html") as ft:
+        return ft.read()
+
+
 class PixivNovel:
     novel_id = 0
     novel_json_str = ""
@@ -112,9 +119,7 @@ class PixivNovel:
             self.tags.append(PixivTagData(tag["tag"], tag))
 
     def write_content(self, filename):
-        ft = open("novel_template.html")
-        template_str = ft.read()
-        ft.close()
+        template_str = _read_novel_template()
 
         fh = None
         try:
@@ -142,6 +147,8 @@ class NovelSeries:
     def __init__(self, series_id, series_json) -> None:
         self.series_id = series_id
         self.series_str = series_json
+        self.series_list = list()
+        self.series_list_str = dict()
 
         self.parse()
 
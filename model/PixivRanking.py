@@ -32,11 +32,8 @@ class PixivRanking:
             self.filter_contents()
 
     def filter_contents(self):
-        for content in self.contents:
-            for filter_str in self.filters:
-                if content["illust_content_type"][filter_str]:
-                    self.contents.remove(content)
-                    break
+        self.contents = [content for content in self.contents
+                         if not any(content["illust_content_type"][filter_str] for filter_str in self.filters)]
 
 
 class PixivNewIllust:
@@ -10,10 +10,12 @@ from common.PixivException import PixivException
 
 
 class PixivTagsItem:
-    imageId: int = 0
-    bookmarkCount: int = 0
-    imageResponse: int = 0
-    ai_type: int = -1
+    __slots__ = ("imageId", "bookmarkCount", "imageResponse", "ai_type")
+
+    imageId: int
+    bookmarkCount: int
+    imageResponse: int
+    ai_type: int
 
     def __init__(self, image_id, bookmark_count, image_response_count, ai_type=-1):
         self.imageId = image_id
@@ -2,6 +2,9 @@
 # -*- coding: UTF-8 -*-
 
 import unittest
+from datetime import datetime
+from types import SimpleNamespace
+
 import common.PixivConstant as PixivConstant
 from PixivDBManager import PixivDBManager
 from model.PixivListItem import PixivListItem
@@ -38,6 +41,19 @@ class TestPixivDBManager(unittest.TestCase):
         for item in result:
             print(item.memberId, item.path)
 
+    def test_NovelPosts(self):
+        DB = PixivDBManager(root_directory=".", target=":memory:")
+        DB.createDatabase()
+        artist = SimpleNamespace(artistId=1)
+        posts = [(SimpleNamespace(imageId=str(post_id), artist=artist, worksDateDateTime=datetime(2024, 1, 1),
+                                  uploadDate=None, isOriginal=False, isBungei=False, language="ja",
+                                  xRestrict=0, seriesId=5, seriesOrder=post_id),
+                  f"novel_{post_id}.html")
+                 for post_id in range(1, 1001)]
+        DB.insertNovelPosts(posts)
+        result = DB.selectNovelSaveNamesByPostIds(["2", 999, 5000])
+        self.assertEqual({2: "novel_2.html", 999: "novel_999.html"}, result)
+        self.assertEqual("novel_3.html", DB.selectNovelPostByPostId(3)[2])
 
 # if __name__ == '__main__':
 #     suite = unittest.TestLoader().loadTestsFromTestCase(TestPixivDBManager)
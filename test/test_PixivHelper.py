@@ -1,11 +1,21 @@
 #!C:/Python37-32/python
 # -*- coding: UTF-8 -*-
 
+import io
 import json
+import logging
+import logging.handlers
 import os
 import platform
+import shutil
+import tempfile
+import threading
+import time
 from typing import Tuple
 import unittest
+import zipfile
+from contextlib import redirect_stdout
+from unittest.mock import patch
 
 from bs4 import BeautifulSoup
 
@@ -67,6 +77,44 @@ class TestPixivHelper(unittest.TestCase):
         self.assertEqual(result, expected)
         self.assertTrue(len(result) < 255)
 
+    def testTrimUtf8Filename(self):
+        # reference: remove one character at a time before the extension
+        def trim(name, max_bytes):
+            while len(name.encode('utf-8')) > max_bytes:
+                filename, extname = os.path.splitext(name)
+                name = filename[:len(filename) - 1] + extname
+            return name
+
+        names = ["12345.jpg",
+                 "アラクネのいる日常" * 40 + ".jpg",
+                 "a" + "日本語" * 30 + "😀" * 40 + ".png",
+                 "😀" * 100,
+                 "Vol.1 " + "漫画" * 100,
+                 "..." + "あ" * 100 + ".zip",
+                 "あ" * 50 + os.sep + "い" * 90 + ".jpg",
+                 "あ" * 100 + os.sep + "い.jpg",
+                 "ab." + "い" * 100,
+                 "x" * 300]
+        for name in names:
+            for max_bytes in (1, 5, 8, 100, 249, 1000):
+                self.assertEqual(PixivHelper.trim_utf8_filename(name, max_bytes), trim(name, max_bytes), (name, max_bytes))
+
+    def testSanitizeFilenameCustomBadChars(self):
+        import unicodedata
+        rootDir = os.path.abspath('.')
+        try:
+            PixivHelper.parse_custom_sanitizer("@[]^-\\")
+            self.assertEqual(PixivHelper.sanitize_filename("a@b[c]d^e-f\\g h", rootDir), rootDir + os.sep + "a_b_c_d_e_f_g h")
+            # the cached result is dropped when the rules are changed
+            PixivHelper.parse_custom_sanitizer("@%replace<default>(+)%%pattern<1>(maze)%%replace<1>(labyrinth)%%pattern<2>(labyrinth)%%replace<2>(x)%")
+            self.assertEqual(PixivHelper.sanitize_filename("a@maze", rootDir), rootDir + os.sep + "a+x")
+        finally:
+            PixivHelper.parse_custom_sanitizer("")
+
+        # control characters are removed
+        control_chars = "".join(chr(c) for c in range(0x3000) if unicodedata.category(chr(c)) == "Cc")
+        self.assertEqual(PixivHelper.sanitize_filename("a" + control_chars + "b", rootDir), rootDir + os.sep + "ab")
+
     def testCreateMangaFilename(self):
         with open(r'./test_data/test-image-manga-28820443.json', 'r', encoding='utf-8') as p:
             page = p.read()
@@ -317,6 +365,459 @@ class TestPixivHelper(unittest.TestCase):
         filename = PixivHelper.create_avabg_filename(artist, targetDir, _config)
         self.assertEqual(filename[0], targetDir + os.sep + 'p199451 (14095911)' + os.sep + 'folder.png')
 
+    def testCheckImageEncodingMixedFrames(self):
+        from PIL import Image
+        d = tempfile.mkdtemp(prefix="test_check_image_encoding")
+        try:
+            Image.new("L", (8, 8)).save(os.path.join(d, "000000.jpg"))
+            Image.new("RGB", (8, 8)).save(os.path.join(d, "000001.jpg"))
+            Image.new("L", (8, 8)).save(os.path.join(d, "000002.jpg"))
+            with open(os.path.join(d, "animation.json"), "w") as f:
+                f.write("{}")
+
+            # conversion is done in-process, no ffmpeg call.
+            with patch("subprocess.Popen", side_effect=AssertionError("ffmpeg should not be called")):
+                PixivHelper.check_image_encoding(d)
+
+            for name in ("000000.jpg", "000001.jpg", "000002.jpg"):
+                with Image.open(os.path.join(d, name)) as im:
+                    self.assertEqual(im.mode, "RGB")
+                    self.assertEqual(im.size, (8, 8))
+            self.assertEqual(sorted(os.listdir(d)), ["000000.jpg", "000001.jpg", "000002.jpg", "animation.json"])
+        finally:
+            shutil.rmtree(d)
+
+    def testVerifyImageFast(self):
+        from PIL import Image
+        import handler.PixivDownloadHandler as PixivDownloadHandler
+        from common.PixivException import PixivException
+        d = tempfile.mkdtemp(prefix="test_verify_image")
+        try:
+            for ext, fmt in ((".jpg", "JPEG"), (".png", "PNG"), (".gif", "GIF")):
+                path = os.path.join(d, "valid" + ext)
+                Image.new("RGB", (64, 64), (255, 0, 0)).save(path, fmt)
+                size = os.path.getsize(path)
+                PixivDownloadHandler.verify_image_fast(path, size)
+                PixivDownloadHandler.verify_image_full(path)
+
+                # wrong Content-Length
+                self.assertRaises(PixivException, PixivDownloadHandler.verify_image_fast, path, size + 1)
+
+                # data after the end of image marker, only NUL padding for GIF
+                padded = os.path.join(d, "padded" + ext)
+                with open(path, "rb") as src, open(padded, "wb") as dst:
+                    dst.write(src.read() + b"\x00" * 100 + (b"" if ext == ".gif" else b"extra metadata"))
+                PixivDownloadHandler.verify_image_fast(padded)
+
+                truncated = os.path.join(d, "truncated" + ext)
+                with open(path, "rb") as src, open(truncated, "wb") as dst:
+                    dst.write(src.read()[:size // 2])
+                self.assertRaises(PixivException, PixivDownloadHandler.verify_image_fast, truncated)
+
+            # the GIF trailer byte also appears in the image data
+            noise = os.path.join(d, "noise.gif")
+            Image.frombytes("L", (256, 256), bytes(range(256)) * 256).transpose(Image.Transpose.TRANSPOSE).save(noise, "GIF")
+            with open(noise, "rb") as f:
+                data = f.read()
+            for cut in (len(data) - 1, len(data) - 100, len(data) // 2):
+                self.assertIn(b"\x3b", data[max(0, cut - 4096):cut])
+                truncated = os.path.join(d, "truncated.gif")
+                with open(truncated, "wb") as dst:
+                    dst.write(data[:cut])
+                self.assertRaises(PixivException, PixivDownloadHandler.verify_image_fast, truncated)
+            with open(os.path.join(d, "junk.gif"), "wb") as dst:
+                dst.write(data + b"extra metadata")
+            self.assertRaises(PixivException, PixivDownloadHandler.verify_image_fast, os.path.join(d, "junk.gif"))
+
+            not_image = os.path.join(d, "error.jpg")
+            with open(not_image, "wb") as f:
+                f.write(b"<html>403 Forbidden</html>")
+            self.assertRaises(PixivException, PixivDownloadHandler.verify_image_fast, not_image)
+
+            archive = os.path.join(d, "valid.zip")
+            shutil.copy(os.path.join(d, "valid.jpg"), os.path.join(d, "000000.jpg"))
+            with zipfile.ZipFile(archive, "w") as zf:
+                zf.write(os.path.join(d, "000000.jpg"), "000000.jpg")
+            PixivDownloadHandler.verify_image_fast(archive)
+            with open(archive, "rb") as src, open(os.path.join(d, "truncated.zip"), "wb") as dst:
+                dst.write(src.read()[:-30])
+            self.assertRaises(PixivException, PixivDownloadHandler.verify_image_fast, os.path.join(d, "truncated.zip"))
+        finally:
+            shutil.rmtree(d)
+
+    def testDrainImageVerification(self):
+        from PIL import Image
+        import handler.PixivDownloadHandler as PixivDownloadHandler
+        d = tempfile.mkdtemp(prefix="test_verify_image")
+        try:
+            valid = os.path.join(d, "valid.png")
+            Image.new("RGB", (64, 64), (255, 0, 0)).save(valid, "PNG")
+            invalid = os.path.join(d, "invalid.png")
+            with open(invalid, "wb") as f:
+                f.write(b"<html>403 Forbidden</html>")
+            recorded = []
+            for filename in (valid, invalid):
+                PixivDownloadHandler._queue_image_verification(filename, lambda f=filename: recorded.append(f))
+            self.assertEqual([invalid], PixivDownloadHandler.drain_image_verification())
+            self.assertEqual([valid], recorded)
+            self.assertFalse(os.path.exists(invalid))
+            self.assertEqual([], PixivDownloadHandler.drain_image_verification())
+        finally:
+            shutil.rmtree(d)
+
+    def testIsRemoteFileModified(self):
+        import socket
+        import urllib.error
+        import handler.PixivDownloadHandler as PixivDownloadHandler
+
+        class StubBrowser():
+            def __init__(self, *results):
+                self.results = list(results)
+                self.requests = []
+
+            def open_novisit(self, req):
+                self.requests.append(req)
+                result = self.results.pop(0)
+                if isinstance(result, BaseException):
+                    raise result
+                return io.BytesIO()
+
+        def http_error(code):
+            return urllib.error.HTTPError("https://i.pximg.net/a.jpg", code, "error", {}, None)
+
+        config = PixivConfig.PixivConfig()
+        config.retry = 2
+        config.retryWait = 0
+        cases = [((http_error(304),), False, 1),
+                 ((None,), True, 1),
+                 ((http_error(404),), True, 1),
+                 ((socket.timeout("timed out"), http_error(304)), False, 2),
+                 ((http_error(503), urllib.error.URLError("reset"), http_error(503)), True, 3)]
+        for (results, expected, request_count) in cases:
+            br = StubBrowser(*results)
+            with patch("common.PixivBrowserFactory.getBrowser", return_value=br), redirect_stdout(io.StringIO()):
+                self.assertEqual(expected, PixivDownloadHandler.is_remote_file_modified("https://i.pximg.net/a.jpg", "https://www.pixiv.net/", config, '"v1"'))
+            self.assertEqual(request_count, len(br.requests))
+            self.assertEqual('"v1"', br.requests[0].get_header("If-none-match"))
+
+    def testDownloadList(self):
+        import handler.PixivDownloadHandler as PixivDownloadHandler
+        d = tempfile.mkdtemp(prefix="test_download_list")
+        try:
+            dfilename = os.path.join(d, "Downloaded.txt")
+            for i in range(3):
+                PixivDownloadHandler.write_download_list(dfilename, f"{i}.jpg", "utf-8-sig")
+            PixivDownloadHandler.close_download_list()
+            PixivDownloadHandler.write_download_list(dfilename, "3.jpg", "utf-8-sig")
+            PixivDownloadHandler.close_download_list()
+            with open(dfilename, "rb") as f:
+                self.assertEqual(b"\xef\xbb\xbf0.jpg\n1.jpg\n2.jpg\n3.jpg\n", f.read())
+        finally:
+            shutil.rmtree(d)
+
+    @unittest.skipIf(platform.system() == "Windows", "shlex.split() does not handle Windows path")
+    def testPostProcessingQueue(self):
+        import sys
+        from types import SimpleNamespace
+        import handler.PixivDownloadHandler as PixivDownloadHandler
+        d = tempfile.mkdtemp(prefix="test_post_processing")
+        try:
+            script = os.path.join(d, "post.py")
+            with open(script, "w") as f:
+                f.write("import sys\nopen(sys.argv[1], 'a').write(' '.join(sys.argv[2:]) + '\\n')\n")
+            output = os.path.join(d, "output.txt")
+            config = SimpleNamespace(postProcessingCmd=f"{sys.executable} {script} {output} %filename%",
+                                     postProcessingMaxProcesses=1,
+                                     postProcessingBatchSize=4)
+            PixivDownloadHandler._post_process_queue = None
+            for i in range(10):
+                PixivDownloadHandler._queue_post_processing(config, f"{i}.jpg")
+            PixivDownloadHandler.drain_post_processing()
+            with open(output) as f:
+                lines = f.read().splitlines()
+            self.assertEqual([f"{i}.jpg" for i in range(10)], " ".join(lines).split())
+            self.assertTrue(all(len(line.split()) <= 4 for line in lines))
+        finally:
+            PixivDownloadHandler._post_process_queue = None
+            shutil.rmtree(d)
+
+    def testRequestThrottle(self):
+        from types import SimpleNamespace
+        from concurrent.futures import ThreadPoolExecutor
+        throttle = PixivHelper.RequestThrottle()
+        config = SimpleNamespace(downloadDelay=0.05)
+        started = []
+        with patch("common.PixivHelper.random.random", return_value=1.0):
+            with ThreadPoolExecutor(max_workers=4) as executor:
+                list(executor.map(lambda _: started.append(throttle.wait(config) or time.monotonic()), range(5)))
+        started.sort()
+        self.assertTrue(all(b - a >= 0.045 for (a, b) in zip(started, started[1:])))
+
+    def testDnsCache(self):
+        import socket
+        from concurrent.futures import ThreadPoolExecutor
+        lookups = []
+
+        def resolver(host, port, family=0, type=0, proto=0, flags=0):
+            lookups.append(host)
+            time.sleep(0.01)
+            if host == "unknown.invalid":
+                raise socket.gaierror(socket.EAI_NONAME, "Name or service not known")
+            return [(socket.AF_INET, socket.SOCK_STREAM, 6, '', ("127.0.0.1", port))]
+
+        cache = PixivHelper.DnsCache(resolver, ttl=300, negative_ttl=0.2)
+        hosts = ["www.pixiv.net", "i.pximg.net", "api.fanbox.cc"]
+        with ThreadPoolExecutor(max_workers=8) as executor:
+            results = list(executor.map(lambda i: cache(hosts[i % 3], 443), range(1000)))
+        self.assertEqual(1000, len(results))
+        self.assertEqual(sorted(hosts), sorted(lookups))
+        self.assertEqual(3, cache.lookups)
+
+        # negative cache
+        for _ in range(3):
+            self.assertRaises(socket.gaierror, cache, "unknown.invalid", 443)
+        self.assertEqual(1, lookups.count("unknown.invalid"))
+        time.sleep(0.3)
+        self.assertRaises(socket.gaierror, cache, "unknown.invalid", 443)
+        self.assertEqual(2, lookups.count("unknown.invalid"))
+
+        # wrap the current resolver, e.g. from SOCKS proxy
+        orig = socket.getaddrinfo
+        try:
+            socket.getaddrinfo = resolver
+            installed = PixivHelper.install_dns_cache(60)
+            self.assertIs(installed, socket.getaddrinfo)
+            self.assertIs(resolver, installed.resolver)
+            self.assertIs(installed, PixivHelper.install_dns_cache(30))
+            self.assertEqual(30, installed.ttl)
+        finally:
+            socket.getaddrinfo = orig
+
+    def testSocksProxyKeepsDnsCache(self):
+        import socket
+        orig = (socket.socket, socket.getaddrinfo)
+        try:
+            config = PixivConfig.PixivConfig()
+            config.useProxy = True
+            config.proxyAddress = "socks5://127.0.0.1:1080"
+            PixivBrowser(config, None)
+            installed = socket.getaddrinfo
+            self.assertIsInstance(installed, PixivHelper.DnsCache)
+            # e.g. new worker browser
+            PixivBrowser(config, None)
+            self.assertIs(installed, socket.getaddrinfo)
+            self.assertNotIsInstance(installed.resolver, PixivHelper.DnsCache)
+        finally:
+            (socket.socket, socket.getaddrinfo) = orig
+
+    def testProgressRendererRateLimit(self):
+        renderer = PixivHelper.ProgressRenderer(max_refresh=10, is_tty=True)
+        out = io.StringIO()
+        with redirect_stdout(out):
+            renderer.start("a", 100000)
+            for i in range(1, 100001):
+                renderer.update("a", i)
+            renderer.finish("a")
+        # first draw, at most 10 per second, and the final state
+        self.assertLessEqual(renderer.redraw_count, 2 + 10 * 5)
+        self.assertIn("97.66 KiB", out.getvalue().split("\r")[-1])
+
+    def testProgressRendererConcurrentAndNoTTY(self):
+        renderer = PixivHelper.ProgressRenderer(max_refresh=10, is_tty=True)
+        out = io.StringIO()
+        with redirect_stdout(out):
+            renderer.start("a", 1024)
+            renderer.start("b", 1024)
+            renderer.update("a", 512)
+            renderer.update("b", 512)
+        # the second update is within the refresh interval
+        self.assertEqual(renderer.redraw_count, 1)
+        self.assertIn("512 B of 2.00 KiB (2 files)", out.getvalue())
+
+        renderer = PixivHelper.ProgressRenderer(summary_interval=0, is_tty=False)
+        out = io.StringIO()
+        with redirect_stdout(out):
+            renderer.start("a", 2048)
+            renderer.update("a", 1024)
+            renderer.finish("a")
+        self.assertNotIn("\r", out.getvalue())
+        self.assertIn("Downloading 1 file(s): 1.00 KiB of 2.00 KiB (50%)", out.getvalue())
+
+    def testDownloadImageBuffer(self):
+        from common.PixivException import PixivException
+
+        class ReadOnlyResponse():
+            def __init__(self, data):
+                self._data = io.BytesIO(data)
+
+            def read(self, size):
+                return self._data.read(size)
+
+        d = tempfile.mkdtemp(prefix="test_download")
+        try:
+            _config = PixivConfig.PixivConfig()
+            _config.downloadBuffer = 1
+            _config.preallocateFile = True
+            PixivHelper.set_config(_config)
+            data = os.urandom(5000)
+            filename = os.path.join(d, "image.jpg")
+            with redirect_stdout(io.StringIO()):
+                for res, file_size in ((io.BytesIO(data), len(data)),
+                                       (ReadOnlyResponse(data), len(data)),
+                                       (ReadOnlyResponse(data), -1)):
+                    self.assertEqual(PixivHelper.download_image("url", filename, res, file_size, True),
+                                     (len(data), filename))
+                    with open(filename, "rb") as f:
+                        self.assertEqual(f.read(), data)
+                with self.assertRaises(PixivException):
+                    PixivHelper.download_image("url", filename, io.BytesIO(data[:100]), len(data), True)
+            self.assertFalse(os.path.exists(filename + ".pixiv"))
+        finally:
+            shutil.rmtree(d)
+            PixivHelper.set_config(PixivConfig.PixivConfig())
+
+    def testReadTextFileCached(self):
+        d = tempfile.mkdtemp(prefix="test_template")
+        try:
+            filename = os.path.join(d, "template.html")
+            self.assertEqual(PixivHelper.read_text_file_cached(filename, "default"), "default")
+            with open(filename, "w", encoding="utf-8") as f:
+                f.write("<html>%imageTitle%</html>")
+            self.assertEqual(PixivHelper.read_text_file_cached(filename), "<html>%imageTitle%</html>")
+            with patch("common.PixivHelper.open_text_file") as mock_open:
+                self.assertEqual(PixivHelper.read_text_file_cached(filename), "<html>%imageTitle%</html>")
+                mock_open.assert_not_called()
+            with open(filename, "w", encoding="utf-8") as f:
+                f.write("<html>%body_text(article)%</html>")
+            os.utime(filename, ns=(0, 0))
+            self.assertEqual(PixivHelper.read_text_file_cached(filename), "<html>%body_text(article)%</html>")
+        finally:
+            shutil.rmtree(d)
+
+    def testLoadConfigNotModified(self):
+        d = tempfile.mkdtemp(prefix="test_config")
+        try:
+            path = os.path.join(d, "config.ini")
+            with redirect_stdout(io.StringIO()):
+                config = PixivConfig.PixivConfig()
+                config.loadConfig(path=path)
+                config.loadConfig(path=path)
+                config.downloadDelay = 99
+                config.loadConfig(path=path, force=False)
+                self.assertEqual(config.downloadDelay, 99)
+
+                with open(path, "r", encoding="utf-8") as f:
+                    content = f.read()
+                self.assertIn("downloadDelay = 5", content)
+                with open(path, "w", encoding="utf-8") as f:
+                    f.write(content.replace("downloadDelay = 5", "downloadDelay = 7"))
+                os.utime(path, ns=(0, 0))
+                config.loadConfig(path=path, force=False)
+                self.assertEqual(config.downloadDelay, 7)
+
+                config.downloadDelay = 99
+                config.loadConfig(path=path)
+                self.assertEqual(config.downloadDelay, 7)
+        finally:
+            shutil.rmtree(d)
+
+    def testLogPayload(self):
+        d = tempfile.mkdtemp(prefix="test_payload")
+        try:
+            _config = PixivConfig.PixivConfig()
+            _config.logLevel = "DEBUG"
+            _config.logPayloadLimit = 16
+            _config.payloadDumpDirectory = d
+            PixivHelper.set_config(_config)
+            logger = PixivHelper.get_logger(reload=True)
+            self.assertIsInstance(logger.handlers[0], logging.handlers.QueueHandler)
+
+            with self.assertLogs(logger, level="DEBUG") as logs:
+                PixivHelper.log_payload("small", b'{"a": 1}')
+                PixivHelper.log_payload("large", "x" * 1000)
+            self.assertEqual(logs.records[0].getMessage(), 'small: {"a": 1}')
+            large = logs.records[1].getMessage()
+            self.assertTrue(large.startswith("large: 1000 bytes, sha1="))
+            self.assertIn(d, large)
+            self.assertTrue(large.endswith(": " + "x" * 16 + "..."))
+
+            dumps = os.listdir(d)
+            self.assertEqual(len(dumps), 1)
+            with open(os.path.join(d, dumps[0]), "rb") as f:
+                self.assertEqual(f.read(), b"x" * 1000)
+        finally:
+            PixivHelper.stop_log_listener()
+            shutil.rmtree(d)
+
+    def testCheckVersionAsync(self):
+        hang = threading.Event()
+        calls = []
+
+        class HangingBrowser:
+            def open_novisit(self, url, timeout=None):
+                calls.append(url)
+                hang.wait(60)
+                return io.BytesIO(b"PIXIVUTIL_VERSION = '20991231'")
+
+        config = PixivConfig.PixivConfig()
+        config.checkNewVersionInterval = 24
+        config.openNewVersion = False
+        tmp = tempfile.mkdtemp()
+        cache_file = os.path.join(tmp, "version.json")
+        try:
+            with patch("common.PixivBrowserFactory.getWorkerBrowser", return_value=HangingBrowser()):
+                start = time.perf_counter()
+                thread = PixivHelper.check_version_async(config, cache_file=cache_file)
+                self.assertLess(time.perf_counter() - start, 0.5)
+                self.assertTrue(thread.is_alive())
+                hang.set()
+                thread.join(5)
+                self.assertFalse(thread.is_alive())
+                with open(cache_file, encoding="utf-8") as f:
+                    self.assertEqual(["20991231", ""], json.load(f)["version"])
+
+                # within the interval, the cached result is used
+                PixivHelper.check_version_async(config, cache_file=cache_file).join(5)
+                self.assertEqual(1, len(calls))
+
+                # only reported from the main thread, once
+                out = io.StringIO()
+                with redirect_stdout(out):
+                    PixivHelper.report_new_version(config)
+                    PixivHelper.report_new_version(config)
+                self.assertEqual(1, out.getvalue().count("New version available"))
+
+                # saved next to config.ini by default
+                config.configFileLocation = os.path.join(tmp, "config.ini")
+                PixivHelper.check_version_async(config).join(5)
+                self.assertTrue(os.path.isfile(os.path.join(tmp, PixivHelper.VERSION_CHECK_CACHE_FILE)))
+                with redirect_stdout(io.StringIO()):
+                    PixivHelper.report_new_version(config)
+        finally:
+            shutil.rmtree(tmp)
+
+    def testMemoryMonitor(self):
+        trimmed = []
+        monitor = PixivHelper.MemoryMonitor(100, [lambda: trimmed.append(1)])
+        rss = [50 * 1024 * 1024]
+        with patch("common.PixivHelper.get_rss", side_effect=lambda: rss[0]), \
+                patch("common.PixivHelper.gc.collect") as mock_collect:
+            self.assertFalse(monitor.check())
+            rss[0] = 150 * 1024 * 1024
+            self.assertTrue(monitor.check())
+            self.assertEqual(1, mock_collect.call_count)
+            self.assertEqual([1], trimmed)
+            # still over the budget but not growing, no collection for every item
+            for _ in range(100):
+                self.assertFalse(monitor.check())
+            rss[0] = 200 * 1024 * 1024
+            self.assertTrue(monitor.check())
+            self.assertEqual(2, mock_collect.call_count)
+
+            mock_collect.reset_mock()
+            self.assertFalse(PixivHelper.MemoryMonitor(0).check())
+            mock_collect.assert_not_called()
+
     def testParseLoginError(self):
         with open('./test_data/test-login-error.htm', 'r', encoding='utf-8') as p:
             page = BeautifulSoup(p.read(), features="html5lib")
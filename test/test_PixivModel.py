@@ -1,8 +1,15 @@
 #!C:/Python37-32/python
 # -*- coding: UTF-8 -*-
 
+import gc
+import os
+import shutil
+import tempfile
+import tracemalloc
 from typing import Tuple
 import unittest
+from unittest.mock import patch
+from xml.etree import ElementTree
 
 import common.PixivConstant as PixivConstant
 # import PixivHelper
@@ -46,6 +53,20 @@ def mock_getMemberPage(self, member_id, page=1, bookmark=False, tags=None, r18mo
 #             return page
 
 
+def read_xmp_values(filename):
+    '''Read the properties of an XMP sidecar, arrays as list and Lang Alt as the x-default text.'''
+    rdf = "{http://www.w3.org/1999/02/22-rdf-syntax-ns#}"
+    desc = ElementTree.parse(filename).getroot().find(f"{rdf}RDF/{rdf}Description")
+    values = {k: v for (k, v) in desc.attrib.items() if not k.startswith(rdf)}
+    for prop in desc:
+        array = prop[0]
+        if array.tag == f"{rdf}Alt":
+            values[prop.tag] = array[0].text
+        else:
+            values[prop.tag] = [li.text for li in array]
+    return values
+
+
 class TestPixivArtist(unittest.TestCase):
     # def testPixivArtistNoImage(self):
     #     # print('\nTesting member page - no image')
@@ -62,6 +83,87 @@ class TestPixivArtist(unittest.TestCase):
         with self.assertRaises(PixivException):
             PixivArtist(1, page)
 
+    def testProcessMemberSkipUnchanged(self):
+        import json
+        from types import SimpleNamespace
+        import common.PixivBrowserFactory as PixivBrowserFactory
+        import common.PixivConfig as PixivConfig
+        import common.PixivHelper as PixivHelper
+        import handler.PixivArtistHandler as PixivArtistHandler
+        import handler.PixivImageHandler as PixivImageHandler
+        from PixivDBManager import PixivDBManager
+
+        image_ids = [101, 102, 103]
+        processed = []
+        results = {}
+
+        # profile/all response with every work, sliced per page of 2 works
+        def stub_getMemberPage(self, member_id, page=1, bookmark=False, tags=None, r18mode=False, throw_empty_error=False):
+            ids = {str(image_id): None for image_id in image_ids}
+            response = json.dumps({"error": False, "body": {"illusts": ids, "manga": []}})
+            artist = PixivArtist(member_id, response, False, (page - 1) * 2, 2)
+            artist.artistName = "member"
+            artist.artistToken = "member"
+            artist.totalImages = len(image_ids)
+            artist.isLastPage = page * 2 >= len(image_ids)
+            artist.allImageList = artist.imageList
+            artist.imageList = artist.imageList[(page - 1) * 2:page * 2]
+            return (artist, response)
+
+        def stub_process_image(caller, config, artist, image_id, *args, **kwargs):
+            processed.append(int(image_id))
+            return results.get(int(image_id), PixivConstant.PIXIVUTIL_SKIP_DUPLICATE)
+
+        d = tempfile.mkdtemp(prefix="test_member")
+        config = PixivConfig.PixivConfig()
+        config.rootDirectory = d
+        config.skipUnchangedMember = True
+        config.downloadAvatar = False
+        config.downloadDelay = 0
+        PixivHelper.set_config(config)
+        db = PixivDBManager(root_directory=d, target=os.path.join(d, "db.sqlite"))
+        try:
+            db.createDatabase()
+            db.insertNewMember(1234)
+            br = PixivBrowserFactory.getBrowser(config=config)
+            caller = SimpleNamespace(set_console_title=lambda title: None, ERROR_CODE=0,
+                                     DEBUG_SKIP_PROCESS_IMAGE=False, **{"__dbManager__": db, "__br__": br})
+
+            def run():
+                processed.clear()
+                PixivArtistHandler.process_member(caller, config, 1234)
+                return list(processed)
+
+            with patch.object(PixivBrowser, "getMemberPage", stub_getMemberPage), \
+                 patch.object(PixivImageHandler, "process_image", stub_process_image):
+                # stopped by checkUpdatedLimit before checking every work, the fingerprint is not stored
+                config.checkUpdatedLimit = 1
+                self.assertEqual(len(run()), 1)
+                self.assertIsNone(db.selectMemberWorkSet(1234))
+                config.checkUpdatedLimit = 0
+
+                # failed download, the fingerprint is not stored
+                results[102] = PixivConstant.PIXIVUTIL_NOT_OK
+                self.assertEqual(sorted(run()), image_ids)
+                self.assertIsNone(db.selectMemberWorkSet(1234))
+
+                del results[102]
+                self.assertEqual(sorted(run()), image_ids)
+                self.assertEqual(db.selectMemberWorkSet(1234)[1:], (3, 103))
+                # unchanged works, nothing to process
+                self.assertEqual(run(), [])
+
+                image_ids.append(104)
+                self.assertEqual(sorted(run()), image_ids)
+                self.assertEqual(db.selectMemberWorkSet(1234)[1:], (4, 104))
+        finally:
+            db.close()
+            shutil.rmtree(d)
+            PixivHelper.set_config(PixivConfig.PixivConfig())
+
+        self.assertEqual(PixivArtistHandler.get_work_set_fingerprint([3, 1, 2]),
+                         PixivArtistHandler.get_work_set_fingerprint(["1", "2", "3"]))
+
     # def testPixivArtistSuspended(self):
     #     # print('\nTesting member page - suspended member')
     #     p = open('./test_data/test-member-suspended.htm', 'r', encoding="utf-8")
@@ -107,6 +209,74 @@ class TestPixivArtist(unittest.TestCase):
     #     self.assertGreaterEqual(artist.totalImages, 1)
     #     self.assertIn(65079382, artist.imageList)
 
+    def testProcessAvatarBgRevalidate(self):
+        from types import SimpleNamespace
+        import common.PixivConfig as PixivConfig
+        import common.PixivHelper as PixivHelper
+        import handler.PixivArtistHandler as PixivArtistHandler
+        import handler.PixivDownloadHandler as PixivDownloadHandler
+        from PixivDBManager import PixivDBManager
+
+        downloaded = []
+        revalidated = []
+
+        def stub_download_image(caller, url, filename, referer, overwrite, max_retry, backup_old_file=False, notifier=None, response_headers=None):
+            if os.path.isfile(filename) and not overwrite:
+                return (PixivConstant.PIXIVUTIL_SKIP_DUPLICATE, filename)
+            downloaded.append(url)
+            PixivHelper.makeSubdirs(filename)
+            with open(filename, "wb") as f:
+                f.write(b"image")
+            response_headers["ETag"] = '"v1"'
+            response_headers["Last-Modified"] = None
+            return (PixivConstant.PIXIVUTIL_OK, filename)
+
+        def stub_is_remote_file_modified(url, referer, config, etag=None, last_modified=None):
+            revalidated.append((url, etag))
+            return False
+
+        d = tempfile.mkdtemp(prefix="test_avatar")
+        config = PixivConfig.PixivConfig()
+        config.rootDirectory = d
+        PixivHelper.set_config(config)
+        db = PixivDBManager(root_directory=d, target=os.path.join(d, "db.sqlite"))
+        try:
+            db.createDatabase()
+            caller = SimpleNamespace(DEBUG_SKIP_PROCESS_IMAGE=False, **{"__dbManager__": db})
+            artist = PixivArtist(1234)
+            artist.artistName = "member"
+            artist.artistToken = "member"
+            artist.artistAvatar = "https://i.pximg.net/user-profile/img/1234_170.jpg"
+            artist.artistBackground = "https://i.pximg.net/background/img/1234.jpg"
+
+            with patch.object(PixivDownloadHandler, "download_image", stub_download_image), \
+                 patch.object(PixivDownloadHandler, "is_remote_file_modified", stub_is_remote_file_modified), \
+                 patch.object(PixivHelper, "create_avabg_filename", wraps=PixivHelper.create_avabg_filename) as create_avabg_filename:
+                PixivArtistHandler.process_avatar_bg(caller, config, "", None, artist)
+                self.assertEqual(downloaded, [artist.artistAvatar, artist.artistBackground])
+                self.assertEqual(db.selectMemberAssets(1234)["avatar"][2], '"v1"')
+
+                # same urls, nothing to do
+                PixivArtistHandler.process_avatar_bg(caller, config, "", None, artist)
+                self.assertEqual(create_avabg_filename.call_count, 1)
+
+                # overwrite, revalidated with the saved etag
+                config.overwrite = True
+                PixivArtistHandler.process_avatar_bg(caller, config, "", None, artist)
+                self.assertEqual(revalidated, [(artist.artistAvatar, '"v1"'), (artist.artistBackground, '"v1"')])
+                self.assertEqual(len(downloaded), 2)
+
+                # new avatar, checked again by download_image
+                config.overwrite = False
+                artist.artistAvatar = "https://i.pximg.net/user-profile/img/1234_new_170.jpg"
+                PixivArtistHandler.process_avatar_bg(caller, config, "", None, artist)
+                self.assertEqual(create_avabg_filename.call_count, 3)
+                self.assertEqual(db.selectMemberAssets(1234)["avatar"][0], artist.artistAvatar)
+        finally:
+            db.close()
+            shutil.rmtree(d)
+            PixivHelper.set_config(PixivConfig.PixivConfig())
+
 
 class TestPixivImage(unittest.TestCase):
     def testPixivImageParseInfo(self):
@@ -287,6 +457,40 @@ class TestPixivImage(unittest.TestCase):
         # print(image.worksTools)
         # self.assertEqual(image.worksTools, u'Photoshop SAI つけペン')
 
+    def testPixivImageMemory(self):
+        with open('./test_data/test-image-selfimage-65079382.json', 'r', encoding="utf-8") as p:
+            page = p.read()
+        artist = PixivArtist(15092265)
+        PixivImage(65079382, page, parent=artist)
+        gc.collect()
+
+        def count_images():
+            return sum(1 for obj in gc.get_objects() if isinstance(obj, PixivImage))
+        images_before = count_images()
+
+        tracemalloc.start()
+        try:
+            (base, _) = tracemalloc.get_traced_memory()
+            for _ in range(10000):
+                image = PixivImage(65079382, page, parent=artist)
+                self.assertEqual(image.imageMode, 'big')
+            del image
+            gc.collect()
+            (current, peak) = tracemalloc.get_traced_memory()
+        finally:
+            tracemalloc.stop()
+
+        # only one image is alive at a time, and nothing is kept after it is released
+        self.assertLess(peak - base, 1024 * 1024)
+        self.assertLess(current - base, 64 * 1024)
+        self.assertEqual(images_before, count_images())
+
+        # no shared mutable defaults between instances
+        other = PixivArtist(1)
+        other.ParseMangaList({"mangaSeries": [{"id": "5"}]})
+        self.assertEqual([], PixivArtist(2).manga_series)
+        self.assertEqual([], PixivImage(1).imageTags)
+
     def testPixivImageRateCount(self):
         with open('./test_data/test-image-rate_count-28865189.json', 'r', encoding="utf-8") as p:
             page = p.read()
@@ -429,6 +633,113 @@ class TestPixivImage(unittest.TestCase):
         self.assertTrue(image.imageUrls[0].find(".zip") > -1)
         self.assertTrue(image.imageResizedUrls[0].find(".zip") > -1)
 
+    def testPixivImageWriteXMP(self):
+        with open('./test_data/test-image-info-32039274.json', 'r', encoding="utf-8") as p:
+            page = p.read()
+        PixivBrowser.getMemberInfoWhitecube = mock_getMemberInfoWhitecube
+        PixivBrowser.getMemberPage = mock_getMemberPage
+        image = PixivImage(32039274, page, dateFormat='%Y-%m-%d %H:%M')
+        image.imageTitle = 'a & b <"c">\nline'
+        image.seriesNavData = {'title': 'series', 'order': 2, 'seriesId': '123'}
+
+        d = tempfile.mkdtemp(prefix="test_xmp")
+        try:
+            filename = os.path.join(d, "sub", "32039274.xmp")
+            image.WriteXMP(filename, False, "en")
+            self.assertEqual(os.listdir(os.path.dirname(filename)), ["32039274.xmp"])
+
+            # golden file written by the old pyexiv2 code for the same image
+            self.assertEqual(read_xmp_values(filename),
+                             read_xmp_values('./test_data/test-image-info-32039274.xmp'))
+
+            rdf = "{http://www.w3.org/1999/02/22-rdf-syntax-ns#}"
+            dc = "{http://purl.org/dc/elements/1.1/}"
+            desc = ElementTree.parse(filename).getroot().find(f"{rdf}RDF/{rdf}Description")
+            title = desc.find(f"{dc}title/{rdf}Alt/{rdf}li")
+            self.assertEqual(title.text, image.imageTitle)
+            self.assertEqual(title.get("{http://www.w3.org/XML/1998/namespace}lang"), "x-default")
+            self.assertIsNotNone(desc.find(f"{dc}description/{rdf}Alt/{rdf}li"))
+            self.assertEqual([li.text for li in desc.find(f"{dc}creator/{rdf}Seq")], ["Nardack"])
+            self.assertEqual([li.text for li in desc.find(f"{dc}subject/{rdf}Bag")], image.imageTags)
+            self.assertIsNotNone(desc.find(f"{dc}date/{rdf}Seq"))
+
+            # optional cross check with exiv2
+            try:
+                import pyexiv2
+            except ImportError:
+                return
+            pyexiv2.registerNs('http://pixiv.com/', 'pixiv')
+            with pyexiv2.Image(filename) as xmp:
+                data = xmp.read_xmp()
+            with pyexiv2.Image('./test_data/test-image-info-32039274.xmp') as xmp:
+                self.assertEqual(data, xmp.read_xmp())
+            self.assertEqual(data['Xmp.dc.title'], {'lang="x-default"': image.imageTitle})
+            self.assertEqual(data['Xmp.dc.subject'], image.imageTags)
+        finally:
+            shutil.rmtree(d)
+
+    def testPixivImageWriteSeriesData(self):
+        import json
+        import threading
+        import common.PixivConfig as PixivConfig
+        import common.PixivHelper as PixivHelper
+        from PixivDBManager import PixivDBManager
+
+        requests = []
+        lock = threading.Lock()
+        update_date = ["2024-01-01T00:00:00+09:00"]
+
+        # stub for pixiv series api, 600 works in 12 per page
+        def stub_getPixivPage(self, url, referer="https://www.pixiv.net", enable_cache=True):
+            page = int(url.split("?p=")[1].split("&")[0])
+            with lock:
+                requests.append(page)
+            series = [{"workId": str(100000 + i), "order": 600 - i} for i in range((page - 1) * 12, min(page * 12, 600))]
+            return json.dumps({"error": False, "body": {
+                "illustSeries": [{"id": "6474", "title": "series", "total": 600, "updateDate": update_date[0],
+                                  "url": "", "coverImageSl": 0, "firstIllustId": "100000"}],
+                "page": {"series": series, "isSetCover": False, "seriesId": 6474, "otherSeriesId": "0",
+                         "recentUpdatedWorkIds": [], "total": 600}}})
+
+        with open('./test_data/test-image-info-32039274.json', 'r', encoding="utf-8") as p:
+            page = p.read()
+        PixivBrowser.getMemberInfoWhitecube = mock_getMemberInfoWhitecube
+        PixivBrowser.getMemberPage = mock_getMemberPage
+        image = PixivImage(32039274, page, dateFormat='%Y-%m-%d %H:%M')
+
+        config = PixivConfig.PixivConfig()
+        config.maxConcurrentRequests = 4
+        config.downloadDelay = 0
+        PixivHelper.set_config(config)
+        d = tempfile.mkdtemp(prefix="test_series")
+        db = PixivDBManager(root_directory=d, target=os.path.join(d, "db.sqlite"))
+        try:
+            db.createDatabase()
+            with patch.object(PixivBrowser, "getPixivPage", stub_getPixivPage):
+                image.WriteSeriesData("6474", [], os.path.join(d, "run1.json"), db)
+                self.assertEqual(sorted(requests), list(range(1, 52)))
+                with open(os.path.join(d, "run1.json"), encoding="utf-8") as f:
+                    run1 = json.load(f)
+                self.assertEqual([w["order"] for w in run1["series"]], list(range(600, 0, -1)))
+
+                # next run reuse the saved series, only the first page is requested
+                requests.clear()
+                PixivBrowser._cache.clear()
+                image.WriteSeriesData("6474", [], os.path.join(d, "run2.json"), db)
+                self.assertEqual(requests, [1])
+                with open(os.path.join(d, "run2.json"), encoding="utf-8") as f:
+                    self.assertEqual(json.load(f), run1)
+
+                # updated series is fetched again
+                requests.clear()
+                PixivBrowser._cache.clear()
+                update_date[0] = "2024-02-01T00:00:00+09:00"
+                image.WriteSeriesData("6474", [], os.path.join(d, "run3.json"), db)
+                self.assertEqual(len(requests), 51)
+        finally:
+            db.close()
+            shutil.rmtree(d)
+
     def testPixivImageParseInfoSelf(self):
         # assuming being accessed via manage page for your own artwork.
         with open('./test_data/test-image-selfimage-65079382.json', 'r', encoding="utf-8") as p:
@@ -470,6 +781,59 @@ class TestPixivBookmark(unittest.TestCase):
         self.assertTrue(27249307 in result)
         self.assertTrue(30119925 in result)
 
+    def testGetBookmarksFollowing(self):
+        import io
+        import json
+        import threading
+        from types import SimpleNamespace
+        import common.PixivConfig as PixivConfig
+        import common.PixivHelper as PixivHelper
+        import handler.PixivBookmarkHandler as PixivBookmarkHandler
+        from PixivDBManager import PixivDBManager
+
+        offsets = []
+        lock = threading.Lock()
+
+        # stub for following api, 130 users in 48 per page
+        class StubBrowser():
+            _locale = "en"
+            _myId = 1234
+
+            def open_with_retry(self, url):
+                offset = int(url.split("offset=")[1].split("&")[0])
+                with lock:
+                    offsets.append(offset)
+                users = [{"userId": str(100000 + i)} for i in range(offset, min(offset + 48, 130))]
+                if offset == 0:
+                    users.insert(1, {"userId": "1", "isAdContainer": True})
+                return io.BytesIO(json.dumps({"error": False, "body": {"users": users, "total": 130}}).encode("utf8"))
+
+        config = PixivConfig.PixivConfig()
+        config.maxConcurrentRequests = 4
+        config.downloadDelay = 0
+        PixivHelper.set_config(config)
+        d = tempfile.mkdtemp(prefix="test_bookmark")
+        db = PixivDBManager(root_directory=d, target=os.path.join(d, "db.sqlite"))
+        try:
+            db.createDatabase()
+            db.conn.execute("INSERT INTO pixiv_master_member (member_id, save_folder) VALUES (?, ?)", (100050, "saved"))
+            br = StubBrowser()
+            caller = SimpleNamespace(**{"__br__": br, "__dbManager__": db})
+            with patch("common.PixivBrowserFactory.getWorkerBrowser", return_value=br):
+                result = PixivBookmarkHandler.get_bookmarks(caller, config, False, 1, 0, 1234)
+        finally:
+            db.close()
+            shutil.rmtree(d)
+            PixivHelper.set_config(PixivConfig.PixivConfig())
+
+        self.assertEqual([item.memberId for item in result], list(range(100000, 100130)))
+        self.assertEqual(result[50].path, "saved")
+        self.assertEqual(result[51].path, "")
+        # first page, the 2 remaining pages concurrently, then the empty page
+        self.assertEqual(offsets[0], 0)
+        self.assertEqual(sorted(offsets[1:3]), [48, 96])
+        self.assertEqual(offsets[3:], [144])
+
 #    def testPixivImageBookmarkMember(self):
 #        # print('\nTesting PixivImageBookmark')
 #        p = open('./test_data/test-image-bookmark-member.htm', 'r', encoding="utf-8")
@@ -649,6 +1013,55 @@ class TestPixivTags(unittest.TestCase):
 
         self.assertEqual(len(image.itemList), 60)
 
+    def testProcessTagsPrefetch(self):
+        import threading
+        from types import SimpleNamespace
+        import common.PixivConfig as PixivConfig
+        import common.PixivHelper as PixivHelper
+        import handler.PixivImageHandler as PixivImageHandler
+        import handler.PixivTagsHandler as PixivTagsHandler
+        from model.PixivTags import PixivTagsItem
+
+        # 5 pages, page 3 repeats the last 5 images of page 2
+        pages = {page: list(range(page * 1000, page * 1000 + 60)) for page in range(1, 5)}
+        pages[3][:5] = pages[2][-5:]
+        pages[5] = list(range(5000, 5050))
+        requested = []
+        processed = []
+        lock = threading.Lock()
+
+        def stub_getSearchTagPage(self, tags, current_page, **kwargs):
+            with lock:
+                requested.append(current_page)
+            result = PixivTags()
+            result.itemList = [PixivTagsItem(image_id, 0, 0) for image_id in pages.get(current_page, [])]
+            result.availableImages = 290
+            result.isLastPage = len(result.itemList) < PixivTags.POSTS_PER_PAGE
+            return (result, "")
+
+        def stub_process_image(caller, config, artist, image_id, *args, **kwargs):
+            # the pages are consumed in order on the main thread
+            self.assertIs(threading.current_thread(), threading.main_thread())
+            processed.append(image_id)
+            return PixivConstant.PIXIVUTIL_OK
+
+        config = PixivConfig.PixivConfig()
+        config.maxConcurrentRequests = 4
+        config.downloadDelay = 0
+        PixivHelper.set_config(config)
+        caller = SimpleNamespace(DEBUG_SKIP_PROCESS_IMAGE=False)
+        try:
+            with patch.object(PixivBrowser, "getSearchTagPage", stub_getSearchTagPage), \
+                 patch.object(PixivImageHandler, "process_image", stub_process_image):
+                PixivTagsHandler.process_tags(caller, config, "test")
+        finally:
+            PixivHelper.set_config(PixivConfig.PixivConfig())
+
+        expected = pages[1] + pages[2] + pages[3][5:] + pages[4] + pages[5]
+        self.assertEqual(processed, expected)
+        self.assertEqual(sorted(requested), [1, 2, 3, 4, 5])
+        self.assertEqual(requested[0], 1)
+
 
 class TestPixivGroup(unittest.TestCase):
     def testParseJson(self):
@@ -661,8 +1074,90 @@ class TestPixivGroup(unittest.TestCase):
         self.assertEqual(result.maxId, 920234)
 
 
+class TestPixivSketch(unittest.TestCase):
+    def testSketchGetPostsByArtist(self):
+        import json
+        import common.PixivBrowserFactory as PixivBrowserFactory
+        import common.PixivConfig as PixivConfig
+        from model.PixivModelSketch import SketchArtist
+
+        with open('./test_data/sketch_artist_posts_page1.json', 'r', encoding="utf-8") as p:
+            template = json.loads(p.read())
+        # post ids are not sequential
+        post_ids = [(i * 7919 + 13) % 100003 for i in range(50)]
+        requests = []
+
+        def stub_getPixivSketchPage(self, url, referer, x_requested_with):
+            page = int(url.split("page=")[1]) if "page=" in url else 1
+            requests.append(page)
+            items = []
+            for post_id in post_ids[(page - 1) * 10:page * 10]:
+                item = dict(template["data"]["items"][0])
+                item["id"] = str(post_id)
+                items.append(item)
+            links = {}
+            if page < 5:
+                links["next"] = {"href": f"/api/walls/@camori/posts/public.json?page={page + 1}"}
+            return json.dumps({"data": {"items": items}, "_links": links})
+
+        br = PixivBrowserFactory.getBrowser(config=PixivConfig.PixivConfig())
+        with patch.object(PixivBrowser, "getPixivSketchPage", stub_getPixivSketchPage):
+            artist = SketchArtist("camori", None)
+            result = [post.imageId for post in br.sketch_get_posts_by_artist("camori", artist)]
+            self.assertEqual(result, post_ids)
+            self.assertEqual(requests, [1, 2, 3, 4, 5])
+
+            # stop at the first downloaded post, without getting the next pages
+            requests.clear()
+            artist = SketchArtist("camori", None)
+            posts = br.sketch_get_posts_by_artist("camori", artist, stop_post_ids={post_ids[15], post_ids[30]})
+            self.assertEqual(next(posts).imageId, post_ids[0])
+            self.assertEqual(requests, [1])
+            self.assertEqual([post.imageId for post in posts], post_ids[1:15])
+            self.assertEqual(requests, [1, 2])
+
+
+class TestPixivListItem(unittest.TestCase):
+    def testMemberFilter(self):
+        from model.PixivListItem import MemberFilter, PixivListItem
+
+        d = tempfile.mkdtemp(prefix="test_ignore")
+        filename = os.path.join(d, "ignore_list.txt")
+        try:
+            member_filter = MemberFilter(filename)
+            items = [PixivListItem(member_id, "") for member_id in [1, 2, 2, 3, 4]]
+            # no ignore list
+            self.assertEqual(member_filter.filter(items), items)
+
+            with open(filename, "w", encoding="utf-8") as f:
+                f.write("# comment\n2\nhttps://www.pixiv.net/member.php?id=4\n")
+            self.assertEqual([item.memberId for item in member_filter.filter(items)], [1, 3])
+
+            # not parsed again when unchanged
+            with patch.object(PixivListItem, "parseList", side_effect=AssertionError):
+                self.assertEqual(member_filter.load(), {2, 4})
+
+            with open(filename, "a", encoding="utf-8") as f:
+                f.write("1\n")
+            ranking = [{"user_id": member_id} for member_id in [1, 2, 3, 4, 5]]
+            result = member_filter.filter(ranking, lambda item: item["user_id"])
+            self.assertEqual([item["user_id"] for item in result], [3, 5])
+        finally:
+            shutil.rmtree(d)
+
+    def testRankingFilterContents(self):
+        import json
+        from model.PixivRanking import PixivRanking
+
+        contents = [{"illust_id": i, "illust_content_type": {"sexual": i in (1, 2), "violent": i == 4}} for i in range(6)]
+        js = {"mode": "daily", "date": "20240101", "next_date": False, "prev_date": "20231231",
+              "page": 1, "next": 2, "prev": False, "rank_total": 6, "contents": contents}
+        ranks = PixivRanking(json.dumps(js), ["sexual", "violent"])
+        self.assertEqual([item["illust_id"] for item in ranks.contents], [0, 3, 5])
+
+
 def main():
-    test_classes_to_run = [TestPixivArtist, TestPixivImage, TestPixivBookmark, TestPixivTags, TestPixivGroup]
+    test_classes_to_run = [TestPixivArtist, TestPixivImage, TestPixivBookmark, TestPixivTags, TestPixivGroup, TestPixivSketch, TestPixivListItem]
     # test_classes_to_run = [TestPixivImage]
     # test_classes_to_run = [TestPixivTags]
     # test_classes_to_run = [TestPixivArtist]
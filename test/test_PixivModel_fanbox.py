@@ -4,10 +4,17 @@
 import json
 import os
 import platform
+import threading
+import time
 import unittest
+from unittest.mock import patch
 
+import common.PixivConfig as PixivConfig
 import common.PixivConstant as PixivConstant
 import common.PixivHelper as PixivHelper
+import handler.PixivFanboxHandler as PixivFanboxHandler
+from common.PixivBrowserFactory import PixivBrowser
+from common.PixivException import PixivException
 from model.PixivModelFanbox import FanboxArtist, FanboxPost
 
 temp = PixivHelper.__re_manga_index
@@ -414,6 +421,44 @@ class TestPixivModel_Fanbox(unittest.TestCase):
             temp_string[30:])
         self.assertTrue(test_string2 in result.body_text)
 
+    def testFanboxGetPostDetails(self):
+        with open('./test_data/Fanbox_post_with_multi_images.json', 'r', encoding="utf-8") as reader:
+            js = json.loads(reader.read())
+        posts = [FanboxPost(855025 + i, None, js["body"]) for i in range(8)]
+        posts[1].is_restricted = True
+        active = []
+        max_active = [0]
+        lock = threading.Lock()
+
+        def get_post_json(self, post_id, artist=None):
+            with lock:
+                active.append(post_id)
+                max_active[0] = max(max_active[0], len(active))
+            time.sleep(0.05)
+            with lock:
+                active.remove(post_id)
+            if post_id == 855027:
+                raise PixivException("Fanbox post not found!", PixivException.OTHER_ERROR)
+            return {"body": {"id": post_id}}
+
+        config = PixivConfig.PixivConfig()
+        config.maxConcurrentRequests = 3
+        config.downloadDelay = 0
+        config.checkDBProcessHistory = False
+        PixivHelper.set_config(config)
+        try:
+            with patch.object(PixivBrowser, "fanboxGetPostJsonById", get_post_json), \
+                    patch.object(PixivBrowser, "fanbox_is_logged_in", lambda self: None):
+                result = PixivFanboxHandler._get_post_details(config, None, posts)
+        finally:
+            PixivHelper.set_config(PixivConfig.PixivConfig())
+
+        self.assertEqual(len(result), 7)
+        self.assertNotIn(855026, result)
+        self.assertIsInstance(result[855027], PixivException)
+        self.assertEqual(result[855030], {"body": {"id": 855030}})
+        self.assertEqual(max_active[0], 3)
+
 
 if __name__ == '__main__':
     # unittest.main()
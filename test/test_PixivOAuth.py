@@ -0,0 +1,123 @@
+#!C:/Python37-32/python
+# -*- coding: UTF-8 -*-
+
+import http.server
+import json
+import os
+import shutil
+import stat
+import tempfile
+import threading
+import time
+import unittest
+
+import common.PixivConstant as PixivConstant
+from common.PixivOAuth import PixivOAuth
+
+PixivConstant.PIXIVUTIL_LOG_FILE = 'pixivutil.test.log'
+
+
+class OAuthStubHandler(http.server.BaseHTTPRequestHandler):
+    token_requests = 0
+    expires_in = 3600
+    refresh_token = "refresh"
+
+    def do_POST(self):
+        self.rfile.read(int(self.headers.get("Content-Length", 0)))
+        OAuthStubHandler.token_requests += 1
+        body = json.dumps({"response": {"access_token": f"access-{OAuthStubHandler.token_requests}",
+                                        "refresh_token": OAuthStubHandler.refresh_token,
+                                        "expires_in": OAuthStubHandler.expires_in}}).encode("utf-8")
+        self.send_response(200)
+        self.send_header("Content-Type", "application/json")
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def log_message(self, *args):
+        pass
+
+
+class TestPixivOAuth(unittest.TestCase):
+    def setUp(self):
+        OAuthStubHandler.token_requests = 0
+        OAuthStubHandler.expires_in = 3600
+        OAuthStubHandler.refresh_token = "refresh"
+        self.server = http.server.ThreadingHTTPServer(("127.0.0.1", 0), OAuthStubHandler)
+        threading.Thread(target=self.server.serve_forever, daemon=True).start()
+        self.tmp = tempfile.mkdtemp()
+        self.cache_file = os.path.join(self.tmp, "oauth.json")
+
+    def tearDown(self):
+        self.server.shutdown()
+        self.server.server_close()
+        shutil.rmtree(self.tmp)
+
+    def new_oauth(self):
+        ''' Same as a new run of PixivUtil2. '''
+        oauth = PixivOAuth("username", "password", refresh_token="refresh", token_cache_file=self.cache_file)
+        oauth._url = f"http://127.0.0.1:{self.server.server_address[1]}/auth/token"
+        return oauth
+
+    def testReuseCachedToken(self):
+        for _ in range(3):
+            oauth = self.new_oauth()
+            oauth.ensure_login()
+            self.assertEqual("access-1", oauth._access_token)
+        self.assertEqual(1, OAuthStubHandler.token_requests)
+        if os.name != 'nt':
+            self.assertEqual(0o600, stat.S_IMODE(os.stat(self.cache_file).st_mode))
+
+        # different refresh token, e.g. other account
+        oauth = PixivOAuth("username", "password", refresh_token="other", token_cache_file=self.cache_file)
+        self.assertIsNone(oauth._access_token)
+
+    def testRefreshBeforeExpiry(self):
+        oauth = self.new_oauth()
+        oauth.ensure_login()
+        with open(self.cache_file, encoding="utf-8") as f:
+            cache = json.load(f)
+        cache["expires_at"] = time.time() + PixivOAuth.TOKEN_EXPIRY_MARGIN - 1
+        with open(self.cache_file, "w", encoding="utf-8") as f:
+            json.dump(cache, f)
+
+        oauth = self.new_oauth()
+        self.assertFalse(oauth.has_valid_token())
+        oauth.start_refresh_thread()
+        try:
+            deadline = time.time() + 5
+            while OAuthStubHandler.token_requests < 2 and time.time() < deadline:
+                time.sleep(0.01)
+            self.assertEqual(2, OAuthStubHandler.token_requests)
+            self.assertEqual("access-2", oauth._access_token)
+            self.assertTrue(oauth.has_valid_token())
+            # already refreshed, no request from the scan
+            oauth.ensure_login()
+            self.assertEqual(2, OAuthStubHandler.token_requests)
+        finally:
+            oauth.stop_refresh_thread()
+
+    def testBackgroundRefreshRotatesToken(self):
+        OAuthStubHandler.refresh_token = "rotated"
+        saved = []
+        oauth = PixivOAuth("username", "password", refresh_token="refresh", token_cache_file=self.cache_file,
+                           refresh_token_callback=saved.append)
+        oauth._url = f"http://127.0.0.1:{self.server.server_address[1]}/auth/token"
+        oauth.start_refresh_thread()
+        try:
+            deadline = time.time() + 5
+            while len(saved) == 0 and time.time() < deadline:
+                time.sleep(0.01)
+            self.assertEqual(["rotated"], saved)
+            self.assertEqual("rotated", oauth._refresh_token)
+            # the next run starts with the new refresh token from config.ini and reuses the cache
+            next_run = PixivOAuth("username", "password", refresh_token="rotated", token_cache_file=self.cache_file)
+            self.assertTrue(next_run.has_valid_token())
+        finally:
+            oauth.stop_refresh_thread()
+
+
+if __name__ == '__main__':
+    # unittest.main()
+    suite = unittest.TestLoader().loadTestsFromTestCase(TestPixivOAuth)
+    unittest.TextTestRunner(verbosity=5).run(suite)